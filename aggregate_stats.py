@@ -0,0 +1,179 @@
+# aggregate_stats.py
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from episode_stats import EPISODES_STATS_FILE
+
+STATS_FILE = "stats.json"
+# 由本工具计算的字段；stats.json 中已有的其他字段（如 q01/q99）无法从矩合并得到，原样保留
+AGGREGATED_KEYS = ("mean", "std", "max", "min", "count")
+
+
+def combine_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """
+    Chan 等人的并行 Welford 合并：把两组 (样本数, 均值, 二阶中心矩 M2) 合并为一组。
+    所有参数都可以是按元素广播的数组，因此一次调用即可合并许多对。
+    """
+    n = n_a + n_b
+    safe_n = np.where(n > 0, n, 1)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (n_b / safe_n)
+    m2 = m2_a + m2_b + delta * delta * (n_a * n_b / safe_n)
+    return n, mean, m2
+
+
+def tree_reduce_moments(counts, means, m2s):
+    """
+    按二叉树两两合并 E 组矩（第 0 维为 episode），每一层都是一次向量化的 combine_moments，
+    共 log2(E) 层。相比逐个累加，舍入误差只随树高增长。
+    counts 形状为 (E, 1, ...)，means / m2s 形状为 (E, ...)。
+    """
+    while len(counts) > 1:
+        if len(counts) % 2:
+            # 奇数个时补一组空矩（n=0 不影响结果）
+            counts = np.concatenate([counts, np.zeros_like(counts[:1])])
+            means = np.concatenate([means, np.zeros_like(means[:1])])
+            m2s = np.concatenate([m2s, np.zeros_like(m2s[:1])])
+        counts, means, m2s = combine_moments(counts[0::2], means[0::2], m2s[0::2], counts[1::2], means[1::2], m2s[1::2])
+    return counts[0], means[0], m2s[0]
+
+
+def aggregate_feature_stats(episode_stats):
+    """
+    合并同一特征在多个 episode 上的统计值（每个都含 min/max/mean/std/count），
+    返回数据集级别的 {"mean", "std", "max", "min", "count"}。
+    """
+    means = np.asarray([s["mean"] for s in episode_stats], dtype=np.float64)
+    stds = np.asarray([s["std"] for s in episode_stats], dtype=np.float64)
+    counts = np.asarray([s["count"][0] for s in episode_stats], dtype=np.float64)
+    counts = counts.reshape((-1,) + (1,) * (means.ndim - 1))
+    # 每个 episode 的 M2 = n * 总体方差
+    total, mean, m2 = tree_reduce_moments(counts, means, counts * stds ** 2)
+    std = np.sqrt(np.maximum(m2 / max(float(total.flat[0]), 1.0), 0.0))
+    return {
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "max": np.max(np.asarray([s["max"] for s in episode_stats]), axis=0).tolist(),
+        "min": np.min(np.asarray([s["min"] for s in episode_stats]), axis=0).tolist(),
+        "count": [int(total.flat[0])],
+    }
+
+
+def aggregate_records(records):
+    """合并若干条 episodes_stats 记录（{"episode_index", "stats"}），返回 {特征名: 统计值}。"""
+    per_feature = {}
+    for record in records:
+        for name, stats in record.get("stats", {}).items():
+            if all(k in stats for k in AGGREGATED_KEYS) and stats["count"][0] > 0:
+                per_feature.setdefault(name, []).append(stats)
+    aggregated = {}
+    for name, stats_list in per_feature.items():
+        try:
+            aggregated[name] = aggregate_feature_stats(stats_list)
+        except ValueError as e:
+            # 例如部分 episode 的 action 多了终止标志维度，形状不一致
+            print(f"    - ⚠️ 警告: 特征 {name} 在各 episode 中的形状不一致，跳过: {e}")
+    return aggregated
+
+
+def aggregate_dataset_stats(dataset_path: Path):
+    """读取 meta/episodes_stats.jsonl，返回 {特征名: 数据集级统计值}；文件不存在时返回 None。"""
+    stats_path = Path(dataset_path) / "meta" / EPISODES_STATS_FILE
+    if not stats_path.exists():
+        return None
+    with open(stats_path, "r") as f:
+        return aggregate_records(json.loads(line) for line in f if line.strip())
+
+
+def combine_feature_stats(a, b):
+    """用 combine_moments 合并两组数据集级统计值（各含 mean/std/max/min/count），形状不一致时抛出 ValueError。"""
+    n_a, n_b = float(a["count"][0]), float(b["count"][0])
+    mean_a, mean_b = np.asarray(a["mean"], dtype=np.float64), np.asarray(b["mean"], dtype=np.float64)
+    std_a, std_b = np.asarray(a["std"], dtype=np.float64), np.asarray(b["std"], dtype=np.float64)
+    if mean_a.shape != mean_b.shape:
+        raise ValueError(f"{mean_a.shape} != {mean_b.shape}")
+    n, mean, m2 = combine_moments(n_a, mean_a, n_a * std_a ** 2, n_b, mean_b, n_b * std_b ** 2)
+    return {
+        "mean": mean.tolist(),
+        "std": np.sqrt(np.maximum(m2 / max(n, 1.0), 0.0)).tolist(),
+        "max": np.maximum(np.asarray(a["max"]), np.asarray(b["max"])).tolist(),
+        "min": np.minimum(np.asarray(a["min"]), np.asarray(b["min"])).tolist(),
+        "count": [int(n)],
+    }
+
+
+def _write_stats(stats_path: Path, stats):
+    tmp_path = stats_path.with_name(f".{stats_path.name}.tmp")
+    tmp_path.write_text(json.dumps(stats, indent=2))
+    tmp_path.replace(stats_path)
+
+
+def write_stats_json(dataset_path: Path):
+    """
+    由 episodes_stats.jsonl 重新生成 meta/stats.json，不读取任何 parquet。
+    已有 stats.json 中本工具不计算的字段（如 q01/q99）原样保留。返回写入的特征数。
+    """
+    dataset_path = Path(dataset_path)
+    aggregated = aggregate_dataset_stats(dataset_path)
+    if not aggregated:
+        return 0
+    stats_path = dataset_path / "meta" / STATS_FILE
+    existing = json.loads(stats_path.read_text()) if stats_path.exists() else {}
+    stats = {}
+    for name, values in aggregated.items():
+        extra = {k: v for k, v in existing.get(name, {}).items() if k not in AGGREGATED_KEYS}
+        stats[name] = {**values, **extra}
+    for name, values in existing.items():
+        stats.setdefault(name, values)
+    _write_stats(stats_path, stats)
+    return len(aggregated)
+
+
+def update_stats_json(dataset_path: Path, new_records):
+    """
+    把新追加的 episodes_stats 记录合并进已有的 meta/stats.json（combine_moments），不重读整个 episodes_stats.jsonl。
+    stats.json 不存在时退回 write_stats_json 全量生成；本工具不计算的字段（如 q01/q99）原样保留。
+    返回更新的特征数。
+    """
+    dataset_path = Path(dataset_path)
+    stats_path = dataset_path / "meta" / STATS_FILE
+    if not stats_path.exists():
+        return write_stats_json(dataset_path)
+    aggregated = aggregate_records(new_records)
+    if not aggregated:
+        return 0
+    stats = json.loads(stats_path.read_text())
+    updated = 0
+    for name, values in aggregated.items():
+        old = stats.get(name, {})
+        if not all(k in old for k in AGGREGATED_KEYS):
+            stats[name] = {**old, **values}
+        else:
+            try:
+                stats[name] = {**old, **combine_feature_stats(old, values)}
+            except ValueError as e:
+                print(f"    - ⚠️ 警告: 特征 {name} 与已有 stats.json 的形状不一致，跳过: {e}")
+                continue
+        updated += 1
+    _write_stats(stats_path, stats)
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="由 meta/episodes_stats.jsonl 合并得到数据集级别的 meta/stats.json（并行 Welford 合并，不读取 parquet）。",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--dataset_dir", type=str, nargs="+", required=True, help="一个或多个数据集根目录（包含 meta）。")
+    args = parser.parse_args()
+
+    for dataset_dir in args.dataset_dir:
+        count = write_stats_json(Path(dataset_dir))
+        if count:
+            print(f"✔️ {dataset_dir}: 已生成 meta/{STATS_FILE}（{count} 个特征）。")
+        else:
+            print(f"⚠️ {dataset_dir}: 没有可用的 meta/{EPISODES_STATS_FILE}，跳过。")
@@ -0,0 +1,180 @@
+# alignment_check.py
+
+import argparse
+import importlib.util
+import json
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from lerobot_layout import DatasetLayout, camera_video_key
+
+# 与 LeRobot 加载时使用的 tolerance_s 默认值一致
+DEFAULT_TOLERANCE_S = 1e-4
+
+
+def merge_ids_into_remove_list(remove_txt_path: Path, ids):
+    """
+    将 episode ids 合并到移除列表文件中：保留已有 id，去重后按数值排序写回。
+    """
+    existing_ids = set()
+    if remove_txt_path.exists():
+        with open(remove_txt_path, "r") as f:
+            existing_ids = set(line.strip() for line in f if line.strip())
+    all_ids = sorted(existing_ids.union(str(int(i)) for i in ids), key=int)
+    with open(remove_txt_path, "w") as f:
+        for episode_id in all_ids:
+            f.write(f"{episode_id}\n")
+
+
+def read_episode_columns(parquet_path: Path):
+    """只读取 timestamp 和 frame_index 两列，返回 (timestamps float64, frame_index int64)。"""
+    table = pq.read_table(parquet_path, columns=["timestamp", "frame_index"])
+    timestamps = table.column("timestamp").to_numpy().astype(np.float64)
+    frame_index = table.column("frame_index").to_numpy().astype(np.int64)
+    return timestamps, frame_index
+
+
+def read_video_pts(video_path: Path):
+    """
+    只解复用、不解码，返回视频每一帧相对于第一帧的显示时间（秒，升序，从 0 开始）。
+    含 B 帧且没有 edit list 的流、或被切分过的文件，第一帧的 pts 往往不是 0，
+    而 parquet 的 timestamp 每个 episode 都从 0 开始，因此以第一帧的 pts 为起点。
+    """
+    import av
+
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        pts = np.fromiter(
+            (packet.pts for packet in container.demux(stream) if packet.size and packet.pts is not None),
+            dtype=np.int64,
+        )
+        time_base = float(stream.time_base)
+    pts.sort()
+    if len(pts):
+        pts -= pts[0]
+    return pts * time_base
+
+
+def check_episode_alignment(timestamps, frame_index, video_pts, fps, tolerance_s=DEFAULT_TOLERANCE_S):
+    """
+    对单个 episode 做四项对齐检查，返回问题描述列表（为空表示对齐）。
+    - frame_index 必须等于 0..n-1
+    - timestamp 严格递增，且相邻帧间隔等于 1/fps
+    - 每个相机的视频帧数等于 parquet 行数，且视频 pts 与 timestamp 对齐
+    - 各相机之间的视频帧数一致
+    video_pts: {相机名: 视频帧时间数组}，缺失的视频以 None 表示。
+    """
+    problems = []
+    n = len(timestamps)
+    if n == 0:
+        return ["parquet 中没有任何帧"]
+
+    if len(frame_index) != n or not np.array_equal(frame_index, np.arange(n)):
+        problems.append("frame_index 不等于 0..n-1")
+
+    if n > 1:
+        diffs = np.diff(timestamps)
+        if not np.all(diffs > 0):
+            problems.append(f"timestamp 非严格递增 ({int(np.count_nonzero(diffs <= 0))} 处)")
+        elif fps:
+            bad = np.abs(diffs - 1.0 / fps) > tolerance_s
+            if bad.any():
+                problems.append(f"timestamp 间隔与 fps={fps} 不符 ({int(np.count_nonzero(bad))} 处, 最大偏差 {np.abs(diffs - 1.0 / fps).max():.6f}s)")
+
+    frame_counts = {}
+    for cam, pts in video_pts.items():
+        if pts is None:
+            problems.append(f"{cam}: 视频缺失或无法读取")
+            continue
+        frame_counts[cam] = len(pts)
+        if len(pts) != n:
+            problems.append(f"{cam}: 视频 {len(pts)} 帧 != parquet {n} 行")
+            continue
+        deviation = np.abs(pts - timestamps)
+        if deviation.max() > tolerance_s:
+            problems.append(f"{cam}: 视频 pts 与 timestamp 不对齐 ({int(np.count_nonzero(deviation > tolerance_s))} 帧, 最大偏差 {deviation.max():.6f}s)")
+
+    if len(set(frame_counts.values())) > 1:
+        problems.append("相机间视频帧数不一致: " + ", ".join(f"{cam}={count}" for cam, count in sorted(frame_counts.items())))
+    return problems
+
+
+def find_misaligned_episodes(dataset_path: Path, cams, tolerance_s=DEFAULT_TOLERANCE_S, check_videos=True):
+    """
+    检查数据集中每个 episode 的视频/parquet/元数据对齐情况，返回 {episode_index: [问题, ...]}。
+    """
+    info_path = dataset_path / "meta" / "info.json"
+    info = {}
+    if info_path.exists():
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+    fps = info.get("fps")
+    layout = DatasetLayout.from_info(dataset_path, info)
+
+    if check_videos:
+        if importlib.util.find_spec("av") is None:
+            print("    - ⚠️ 警告: 当前环境没有安装 PyAV，跳过视频帧对齐检查。")
+            check_videos = False
+
+    misaligned = {}
+    for episode_index, parquet_file in layout.iter_data_files():
+        try:
+            timestamps, frame_index = read_episode_columns(parquet_file)
+        except Exception as e:
+            misaligned[episode_index] = [f"无法读取 {parquet_file.name}: {e}"]
+            continue
+
+        video_pts = {}
+        if check_videos:
+            for cam in cams:
+                video_path = layout.video_file(episode_index, camera_video_key(cam))
+                try:
+                    video_pts[cam] = read_video_pts(video_path) if video_path.exists() else None
+                except Exception:
+                    video_pts[cam] = None
+
+        problems = check_episode_alignment(timestamps, frame_index, video_pts, fps, tolerance_s)
+        if problems:
+            misaligned[episode_index] = problems
+    return misaligned
+
+
+def validate_alignment(dataset_path: Path, remove_txt_path: Path, cams, tolerance_s=DEFAULT_TOLERANCE_S, check_videos=True):
+    """
+    运行对齐检查，并把未对齐的 episode 直接追加到移除列表中。返回未对齐的 episode id 集合。
+    """
+    print("  STEP 1.3: 校验视频 / Parquet / 元数据时间戳对齐...")
+    if not (dataset_path / "data").is_dir():
+        print(f"    - ⚠️ 警告: 找不到 Parquet 目录 {dataset_path / 'data'}，跳过对齐校验。")
+        return set()
+
+    misaligned = find_misaligned_episodes(dataset_path, cams, tolerance_s, check_videos)
+    if not misaligned:
+        print("    - ✔️ 所有 episodes 的时间戳均对齐。")
+        return set()
+
+    for episode_index, problems in sorted(misaligned.items()):
+        print(f"    - [未对齐!] Episode {episode_index}: " + "; ".join(problems))
+    print(f"    - 发现 {len(misaligned)} 个未对齐的 episodes，将其添加到移除列表。")
+    merge_ids_into_remove_list(remove_txt_path, misaligned.keys())
+    return set(misaligned)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="检查 LeRobot 数据集中视频帧、parquet 时间戳与元数据是否对齐，并将未对齐的 episode 写入移除列表。",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--dataset_dir", type=str, required=True, help="数据集根目录（包含 data/meta/videos）。")
+    parser.add_argument("--cams", type=str, default="front,wrist", help="逗号分隔的相机名称列表，默认为 'front,wrist'。")
+    parser.add_argument("--remove_txt", type=str, default=None, help="移除列表路径，默认为 <dataset_dir>/low_quality.txt。")
+    parser.add_argument("--tolerance_s", type=float, default=DEFAULT_TOLERANCE_S, help=f"时间戳允许的误差（秒）。默认: {DEFAULT_TOLERANCE_S}")
+    parser.add_argument("--skip_videos", action="store_true", help="只检查 parquet 与元数据，不读取视频。")
+    args = parser.parse_args()
+
+    dataset_dir = Path(args.dataset_dir)
+    remove_txt = Path(args.remove_txt) if args.remove_txt else dataset_dir / "low_quality.txt"
+    cam_list = [cam.strip() for cam in args.cams.split(",") if cam.strip()]
+    validate_alignment(dataset_dir, remove_txt, cam_list, args.tolerance_s, check_videos=not args.skip_videos)
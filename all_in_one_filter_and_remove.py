@@ -1,14 +1,21 @@
 # process_datasets.py
 
-import os
 import argparse
 import json
 import shutil
-import pandas as pd
 from pathlib import Path
+import importlib.util
 import subprocess
 import sys
 
+from dataset_discovery import find_datasets_in_search_dirs
+from alignment_check import DEFAULT_TOLERANCE_S, validate_alignment
+from parquet_utils import count_parquet_rows, reindex_parquet
+from lerobot_layout import DatasetLayout, camera_video_key
+from episode_stats import write_episodes_stats
+from aggregate_stats import write_stats_json
+from file_ops import DEFAULT_COPY_WORKERS, DEFAULT_LINK_MODE, LINK_MODES, LINK_MODE_HELP, BulkCopier
+
 # --- 帮助函数 (来自 clean_and_copy_lerobot.py) ---
 
 def load_jsonl(path):
@@ -24,48 +31,81 @@ def save_jsonl(path, lines):
 
 # --- 核心逻辑函数 ---
 
-def find_dataset_folders(base_path):
+_VALIDATOR_MODULES = {}
+
+def load_validator_module(validator_script_path: str):
     """
-    在指定的基础路径下递归查找所有的数据集文件夹。
-    一个“数据集文件夹”被定义为同时包含 'videos', 'meta', 和 'data' 这三个子文件夹的目录。
+    以模块方式加载视频质检脚本，要求其暴露 validate_dataset()（见 video_check/validate_videos.py）。
+    加载失败（例如当前环境缺少 torch/av，或脚本没有该接口）时返回 None，调用方回退到子进程模式。
     """
-    required_subdirs = {'videos', 'meta', 'data'}
-    dataset_paths = []
-    print(f"\n🔍 开始在 '{os.path.abspath(base_path)}' 中搜索数据集...\n")
-    for root, dirs, _ in os.walk(base_path):
-        dir_set = set(dirs)
-        if required_subdirs.issubset(dir_set):
-            dataset_paths.append(Path(root))
-            print(f"  [✅ 找到!] -> {root}")
-    return dataset_paths
-
-def run_video_validation(dataset_path: Path, validator_script_path: str):
+    script = Path(validator_script_path).resolve()
+    if script in _VALIDATOR_MODULES:
+        return _VALIDATOR_MODULES[script]
+    module = None
+    try:
+        # 质检脚本会以同目录导入的方式引用 validation_cache 等模块
+        if str(script.parent) not in sys.path:
+            sys.path.insert(0, str(script.parent))
+        spec = importlib.util.spec_from_file_location(script.stem, script)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[script.stem] = module
+        spec.loader.exec_module(module)
+        if not hasattr(module, "validate_dataset"):
+            print(f"    - ⚠️ 质检脚本 {script} 没有 validate_dataset 接口，将使用子进程模式。")
+            module = None
+    except Exception as e:
+        print(f"    - ⚠️ 无法在当前进程中加载质检脚本 {script}: {e}，将使用子进程模式。")
+        sys.modules.pop(script.stem, None)
+        module = None
+    _VALIDATOR_MODULES[script] = module
+    return module
+
+def run_video_validation(dataset_path: Path, validator_script_path: str, workers: int = 1,
+                         use_subprocess: bool = False, executor=None):
     """
-    运行外部视频验证脚本来生成 low_quality.txt。
+    运行视频质检来生成 low_quality.txt。
+    默认在当前进程中调用质检脚本的 validate_dataset()，避免每个数据集都重新启动 Python 并导入 torch/av；
+    executor 为可复用的质检进程池。无法加载或指定 use_subprocess 时，回退为启动子进程执行脚本。
     如果验证脚本路径为空，则只创建一个空的 low_quality.txt。
     """
     output_txt = dataset_path / "low_quality.txt"
     print(f"  STEP 1.1: 运行视频质检...")
-    if validator_script_path and Path(validator_script_path).exists():
-        try:
-            print(f"    - 执行脚本: python {validator_script_path} {dataset_path}")
-            # 注意：此命令会覆盖现有的 low_quality.txt
-            subprocess.run(
-                [sys.executable, validator_script_path, str(dataset_path)],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            print(f"    - 视频质检完成, 结果保存在: {output_txt}")
-        except subprocess.CalledProcessError as e:
-            print(f"    - ⚠️ 视频质检脚本执行失败: {e}")
-            print(f"    - STDOUT: {e.stdout}")
-            print(f"    - STDERR: {e.stderr}")
-            print(f"    - 将创建一个空的 low_quality.txt 文件继续执行。")
-            output_txt.touch() # 创建一个空文件以防脚本失败
-    else:
+    if not (validator_script_path and Path(validator_script_path).exists()):
         print(f"    - 未提供有效的质检脚本路径，将创建一个空的 low_quality.txt。")
         output_txt.touch() # 创建空文件
+        return output_txt
+
+    module = None if use_subprocess else load_validator_module(validator_script_path)
+    if module is not None:
+        try:
+            print(f"    - 进程内调用: {validator_script_path}::validate_dataset({dataset_path})")
+            error_ids, _ = module.validate_dataset(dataset_path, workers=workers, executor=executor)
+            print(f"    - 视频质检完成, 发现 {len(error_ids)} 个问题 episode, 结果保存在: {output_txt}")
+        except Exception as e:
+            print(f"    - ⚠️ 视频质检执行失败: {e}")
+            print(f"    - 将创建一个空的 low_quality.txt 文件继续执行。")
+            output_txt.touch() # 创建一个空文件以防质检失败
+        return output_txt
+
+    try:
+        cmd = [sys.executable, validator_script_path, str(dataset_path)]
+        if workers > 1:
+            cmd += ["--workers", str(workers)]
+        print(f"    - 执行脚本: {' '.join(cmd[1:])}")
+        # 注意：此命令会更新现有的 low_quality.txt
+        subprocess.run(
+            cmd,
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        print(f"    - 视频质检完成, 结果保存在: {output_txt}")
+    except subprocess.CalledProcessError as e:
+        print(f"    - ⚠️ 视频质检脚本执行失败: {e}")
+        print(f"    - STDOUT: {e.stdout}")
+        print(f"    - STDERR: {e.stderr}")
+        print(f"    - 将创建一个空的 low_quality.txt 文件继续执行。")
+        output_txt.touch() # 创建一个空文件以防脚本失败
     return output_txt
 
 ### 新增 ###
@@ -73,16 +113,18 @@ def validate_parquet_lengths(dataset_path: Path, remove_txt_path: Path):
     """
     校验 parquet 文件行数是否与 episodes.jsonl 中记录的 length 一致。
     如果不一致，将 episode_index 添加到 remove_txt_path 文件中。
+    行数只从 Parquet footer 中读取（并发），footer 损坏时才完整读取该文件。
     """
     print(f"  STEP 1.2: 校验 Parquet 文件帧数...")
     episodes_jsonl_path = dataset_path / "meta" / "episodes.jsonl"
-    parquet_dir = dataset_path / "data" / "chunk-000"
+    layout = DatasetLayout.from_info(dataset_path)
+    data_files = layout.iter_data_files()
 
     if not episodes_jsonl_path.exists():
         print(f"    - ⚠️ 警告: 找不到 {episodes_jsonl_path}，跳过帧数校验。")
         return
-    if not parquet_dir.is_dir():
-        print(f"    - ⚠️ 警告: 找不到 Parquet 目录 {parquet_dir}，跳过帧数校验。")
+    if not data_files:
+        print(f"    - ⚠️ 警告: 在 {dataset_path} 下找不到符合 {layout.data_path} 的 Parquet 文件，跳过帧数校验。")
         return
 
     # 1. 加载 episodes.jsonl 并创建长度映射
@@ -99,31 +141,30 @@ def validate_parquet_lengths(dataset_path: Path, remove_txt_path: Path):
         with open(remove_txt_path, "r") as f:
             existing_ids = set(line.strip() for line in f if line.strip())
 
-    # 3. 遍历 Parquet 文件并校验
+    # 3. 遍历所有 chunk 下的 Parquet 文件（episode_index 由 data_path 模板解析）
+    parquet_files = {}
+    for episode_index, parquet_file in data_files:
+        if episode_index not in expected_lengths:
+            print(f"    - ⚠️ 警告: Parquet 文件 {parquet_file.name} 在 meta 中没有对应记录。")
+            continue
+        parquet_files[parquet_file] = episode_index
+
+    # 4. 并发读取 footer 中的行数并校验
+    actual_lengths, fallbacks, errors = count_parquet_rows(parquet_files)
+    for parquet_file in fallbacks:
+        print(f"    - ⚠️ 警告: 无法解析 {parquet_file.name} 的 footer，已回退为完整读取。")
+    for parquet_file, e in errors.items():
+        print(f"    - ❌ 错误: 读取或处理 {parquet_file.name} 失败: {e}")
+
     mismatched_ids = set()
-    for parquet_file in sorted(parquet_dir.glob("episode_*.parquet")):
-        try:
-            # 从文件名 'episode_000009.parquet' 中提取 episode_index 9
-            episode_index = int(parquet_file.stem.split('_')[-1])
-            
-            if episode_index not in expected_lengths:
-                print(f"    - ⚠️ 警告: Parquet 文件 {parquet_file.name} 在 meta 中没有对应记录。")
-                continue
-
-            df = pd.read_parquet(parquet_file)
-            actual_length = len(df)
-            expected_length = expected_lengths[episode_index]
-
-            if actual_length != expected_length:
-                print(f"    - [帧数不匹配!] Episode {episode_index}: Parquet ({actual_length} 帧) != Meta ({expected_length} 帧)")
-                mismatched_ids.add(str(episode_index))
-
-        except (ValueError, IndexError) as e:
-            print(f"    - ⚠️ 警告: 无法从文件名 {parquet_file.name} 解析 episode_index: {e}")
-        except Exception as e:
-            print(f"    - ❌ 错误: 读取或处理 {parquet_file.name} 失败: {e}")
+    for parquet_file, actual_length in actual_lengths.items():
+        episode_index = parquet_files[parquet_file]
+        expected_length = expected_lengths[episode_index]
+        if actual_length != expected_length:
+            print(f"    - [帧数不匹配!] Episode {episode_index}: Parquet ({actual_length} 帧) != Meta ({expected_length} 帧)")
+            mismatched_ids.add(str(episode_index))
     
-    # 4. 如果有不匹配的，更新移除列表文件
+    # 5. 如果有不匹配的，更新移除列表文件
     if mismatched_ids:
         print(f"    - 发现 {len(mismatched_ids)} 个帧数不匹配的 episodes，将其添加到移除列表。")
         all_ids_to_remove = existing_ids.union(mismatched_ids)
@@ -164,10 +205,13 @@ def combine_manual_removals(remove_txt_path: Path, manual_ids_str: str):
     print(f"    - 成功合并移除列表到: {remove_txt_path}")
 
 
-def clean_and_copy_dataset(src_root: Path, dst_root: Path, remove_txt: Path, cams: str, modality_file_path: Path):
+def clean_and_copy_dataset(src_root: Path, dst_root: Path, remove_txt: Path, cams: str, modality_file_path: Path,
+                           link_mode: str = DEFAULT_LINK_MODE, copy_workers: int = DEFAULT_COPY_WORKERS):
     """
     清理并复制单个 LeRobot 数据集，同时更新 episode_index。
     这是 `clean_and_copy_lerobot.py` 的核心逻辑。
+    视频文件不做修改，按 link_mode 复制或链接到目标路径（见 file_ops.link_or_copy），
+    由 copy_workers 个线程在后台完成，与 parquet 改写同时进行。
     """
     print(f"  STEP 3: 开始清理和复制...")
     print(f"    - 源路径: {src_root}")
@@ -175,19 +219,14 @@ def clean_and_copy_dataset(src_root: Path, dst_root: Path, remove_txt: Path, cam
 
     cam_list = [cam.strip() for cam in cams.split(",") if cam.strip()]
 
-    # 源路径
-    src_data = src_root / "data/chunk-000"
-    src_videos = {cam: src_root / f"videos/chunk-000/observation.images.{cam}" for cam in cam_list}
+    # 源/目标路径：按 info.json 的 chunks_size 和路径模板计算，目标按新编号重新分配 chunk
+    src_layout = DatasetLayout.from_info(src_root)
+    dst_layout = src_layout.with_root(dst_root)
     src_meta = src_root / "meta"
-
-    # 目标路径
-    dst_data = dst_root / "data/chunk-000"
-    dst_videos = {cam: dst_root / f"videos/chunk-000/observation.images.{cam}" for cam in cam_list}
     dst_meta = dst_root / "meta"
 
     # 创建目标目录
-    for p in [dst_data, dst_meta] + list(dst_videos.values()):
-        p.mkdir(parents=True, exist_ok=True)
+    dst_meta.mkdir(parents=True, exist_ok=True)
 
     # 加载需要删除的 episode id 列表
     remove_ids = set()
@@ -223,31 +262,30 @@ def clean_and_copy_dataset(src_root: Path, dst_root: Path, remove_txt: Path, cam
         return
 
     # 按顺序处理剩下的 episode
-    for new_idx, (ep, st) in enumerate(filtered):
-        old_idx_str = f"{ep['episode_index']:06d}"
-        new_idx_str = f"{new_idx:06d}"
-
-        # 更新 JSON 中的 episode_index 字段
-        ep["episode_index"] = new_idx
-        st["episode_index"] = new_idx
-
-        # 修改 parquet 中的 episode_index 字段
-        old_parquet = src_data / f"episode_{old_idx_str}.parquet"
-        new_parquet = dst_data / f"episode_{new_idx_str}.parquet"
-        if old_parquet.exists():
-            df = pd.read_parquet(old_parquet)
-            if "episode_index" in df.columns:
-                df["episode_index"] = new_idx
-            else:
-                print(f"    - ⚠️ 警告: 'episode_index' not found in {old_parquet.name}")
-            df.to_parquet(new_parquet)
-
-        # 拷贝对应视频文件
-        for cam in cam_list:
-            old_mp4 = src_videos[cam] / f"episode_{old_idx_str}.mp4"
-            new_mp4 = dst_videos[cam] / f"episode_{new_idx_str}.mp4"
-            if old_mp4.exists():
-                shutil.copy2(old_mp4, new_mp4)
+    with BulkCopier(copy_workers, link_mode, desc="视频复制") as copier:
+        for new_idx, (ep, st) in enumerate(filtered):
+            old_idx = ep["episode_index"]
+
+            # 更新 JSON 中的 episode_index 字段
+            ep["episode_index"] = new_idx
+            st["episode_index"] = new_idx
+
+            # 拷贝对应视频文件（提交到后台线程池）
+            for cam in cam_list:
+                old_mp4 = src_layout.video_file(old_idx, camera_video_key(cam))
+                new_mp4 = dst_layout.video_file(new_idx, camera_video_key(cam))
+                if old_mp4.exists():
+                    new_mp4.parent.mkdir(parents=True, exist_ok=True)
+                    copier.submit(old_mp4, new_mp4)
+
+            # 修改 parquet 中的 episode_index 字段
+            old_parquet = src_layout.data_file(old_idx)
+            new_parquet = dst_layout.data_file(new_idx)
+            new_parquet.parent.mkdir(parents=True, exist_ok=True)
+            if old_parquet.exists():
+                _, missing = reindex_parquet(old_parquet, new_parquet, set_columns={"episode_index": new_idx})
+                if missing:
+                    print(f"    - ⚠️ 警告: 'episode_index' not found in {old_parquet.name}")
 
     # 保存更新后的 meta 文件
     save_jsonl(dst_meta / "episodes.jsonl", [ep for ep, _ in filtered])
@@ -268,9 +306,14 @@ def clean_and_copy_dataset(src_root: Path, dst_root: Path, remove_txt: Path, cam
         info["total_episodes"] = len(filtered)
         info["total_videos"] = len(cam_list) * len(filtered)
         info["splits"]["train"] = f"0:{len(filtered)}"
+        dst_layout.update_info(info, len(filtered))
         with open(info_path_dst, 'w') as f:
             json.dump(info, f, indent=2)
 
+    # episode_index 已重新编号，数值特征的统计值从 parquet 重新计算，并合并得到 stats.json
+    write_episodes_stats(dst_root)
+    write_stats_json(dst_root)
+
     print(f"    - ✔️ 清理和复制完成！共保留 {len(filtered)} 个 episodes。")
     print(f"    - ❗ 请再次检查 {dst_meta / 'tasks.jsonl'} 的映射是否正确。")
 
@@ -304,25 +347,38 @@ def main():
         "--validator_script", type=str, default=None,
         help="(可选) 用于视频质检的 Python 脚本路径。\n该脚本应接受一个数据集路径作为参数，并在该路径下生成 'low_quality.txt'。\n例如: video_check/validate_videos.py"
     )
+    parser.add_argument(
+        "--validator_workers", type=int, default=1,
+        help="视频质检并行解码的进程数，传给质检脚本的 --workers。默认: 1"
+    )
+    parser.add_argument(
+        "--validator_subprocess", action="store_true",
+        help="为每个数据集启动独立的子进程运行质检脚本（旧行为）。\n默认在当前进程中调用 validate_dataset()，并在所有数据集间复用同一个质检进程池。"
+    )
     parser.add_argument(
         "--manual_remove", type=json.loads, default={},
         help="一个JSON字符串，用于指定手动移除的 episode ID。\n键是相对于 src_base_path 的数据集路径，值是逗号分隔的ID字符串。\n示例: '{\"blk0/20250825_blk0\": \"10,25\", \"blk3/another_data\": \"5\"}'"
     )
+    parser.add_argument(
+        "--link_mode", type=str, choices=LINK_MODES, default=DEFAULT_LINK_MODE,
+        help=LINK_MODE_HELP
+    )
+    parser.add_argument(
+        "--copy_workers", type=int, default=DEFAULT_COPY_WORKERS,
+        help=f"并发复制视频文件的线程数。默认: {DEFAULT_COPY_WORKERS}"
+    )
+    parser.add_argument(
+        "--alignment_tolerance_s", type=float, default=DEFAULT_TOLERANCE_S,
+        help=f"时间戳对齐校验允许的误差（秒）。默认: {DEFAULT_TOLERANCE_S}"
+    )
+    parser.add_argument(
+        "--skip_alignment_check", action="store_true",
+        help="跳过视频 / Parquet / 元数据时间戳对齐校验。"
+    )
     
     args = parser.parse_args()
 
-    # 将逗号分隔的搜索目录转换为列表
-    search_dirs = [d.strip() for d in args.search_dirs.split(',')]
-
-    all_found_datasets = []
-    for directory in search_dirs:
-        search_path = Path(args.src_base_path) / directory
-        if '*' not in directory and '?' not in directory:
-             all_found_datasets.extend(find_dataset_folders(search_path))
-        else:
-            for matching_dir in Path(args.src_base_path).glob(directory):
-                if matching_dir.is_dir():
-                    all_found_datasets.extend(find_dataset_folders(matching_dir))
+    all_found_datasets = find_datasets_in_search_dirs(args.src_base_path, args.search_dirs)
     
     if not all_found_datasets:
         print("\n❌ 未找到任何符合条件的数据集文件夹。请检查 --src_base_path 和 --search_dirs 参数。")
@@ -330,6 +386,26 @@ def main():
         
     print(f"\n✨ 总共找到 {len(all_found_datasets)} 个数据集，即将开始处理...\n" + "="*80)
 
+    # 进程内质检时，所有数据集共享同一个质检进程池，只付出一次 worker 启动和 import 开销
+    validator_pool = None
+    if args.validator_script and not args.validator_subprocess and args.validator_workers > 1:
+        validator_module = load_validator_module(args.validator_script)
+        if validator_module is not None:
+            validator_pool = validator_module.make_worker_pool(args.validator_workers)
+
+    try:
+        process_all_datasets(args, all_found_datasets, validator_pool)
+    finally:
+        if validator_pool is not None:
+            validator_pool.shutdown()
+
+    print("\n" + "="*80 + f"\n🎉 全部处理完成！共处理了 {len(all_found_datasets)} 个数据集。")
+
+
+def process_all_datasets(args, all_found_datasets, validator_pool=None):
+    """
+    依次对每个数据集执行质检、合并移除列表、清理和复制。
+    """
     for i, src_path in enumerate(all_found_datasets):
         print(f"\n({i+1}/{len(all_found_datasets)}) 正在处理: {src_path}")
         print("-" * 60)
@@ -344,13 +420,21 @@ def main():
 
         # 2. 运行质检
         # 2.1 视频质检
-        remove_txt_path = run_video_validation(src_path, args.validator_script)
+        remove_txt_path = run_video_validation(
+            src_path, args.validator_script, args.validator_workers,
+            use_subprocess=args.validator_subprocess, executor=validator_pool
+        )
         
         ### 新增 ###
         # 2.2 Parquet 帧数校验
         validate_parquet_lengths(src_path, remove_txt_path)
         ### 结束新增 ###
 
+        # 2.3 视频 / Parquet / 元数据时间戳对齐校验
+        if not args.skip_alignment_check:
+            cam_list = [cam.strip() for cam in args.cams.split(",") if cam.strip()]
+            validate_alignment(src_path, remove_txt_path, cam_list, args.alignment_tolerance_s)
+
         # 3. 结合手动指定的移除列表
         manual_ids_for_this_dataset = args.manual_remove.get(relative_path_str, "")
         combine_manual_removals(remove_txt_path, manual_ids_for_this_dataset)
@@ -362,15 +446,15 @@ def main():
                 dst_root=dst_path,
                 remove_txt=remove_txt_path,
                 cams=args.cams,
-                modality_file_path=Path(args.modality_path)
+                modality_file_path=Path(args.modality_path),
+                link_mode=args.link_mode,
+                copy_workers=args.copy_workers
             )
         except Exception as e:
             print(f"    - ❌ 处理数据集 {src_path} 时发生严重错误: {e}")
             import traceback
             traceback.print_exc()
 
-    print("\n" + "="*80 + f"\n🎉 全部处理完成！共处理了 {len(all_found_datasets)} 个数据集。")
-
 
 if __name__ == "__main__":
     main()
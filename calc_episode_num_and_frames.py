@@ -1,10 +1,20 @@
 # calculate_dataset_stats.py
 
-import os
 import argparse
+import csv
 import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from dataset_discovery import DEFAULT_MAX_WORKERS, iter_datasets_in_search_dirs, iter_search_paths
+from lerobot_layout import DatasetLayout
+from parquet_utils import read_parquet_num_rows
+from virtual_dataset import is_virtual_dataset
+
+# 汇总结果中的各个维度
+BREAKDOWNS = ("by_task", "by_robot", "by_root", "by_camera")
+
 # --- 帮助函数 ---
 
 def load_jsonl(path):
@@ -16,49 +26,209 @@ def load_jsonl(path):
         print(f"    - ⚠️  读取或解析文件 {path} 时出错: {e}")
         return []
 
-# --- 核心逻辑函数 ---
 
-def find_dataset_folders(base_path):
+def read_video_frame_count(video_path: Path):
+    """优先读取容器头中记录的帧数（不解码）；头中没有时回退为只解复用计数。"""
+    import av
+
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        if stream.frames:
+            return stream.frames
+        return sum(1 for packet in container.demux(stream) if packet.size)
+
+
+def dataset_group(dataset_path: Path, src_base_path):
+    """数据集所在的顶层目录（src_base_path 下的第一级子目录），用于按根目录汇总。"""
+    try:
+        parts = Path(dataset_path).relative_to(src_base_path).parts
+    except ValueError:
+        return str(dataset_path)
+    return parts[0] if len(parts) > 1 else "."
+
+
+def is_merged_dataset(dataset_path, virtual=None):
     """
-    在指定的基础路径下递归查找所有的数据集文件夹。
-    一个“数据集文件夹”被定义为同时包含 'videos', 'meta', 和 'data' 这三个子文件夹的目录。
+    合并得到的数据集（路径中带 'merged'，或虚拟合并）与其源数据集重复，不计入统计。
+    virtual 为目录中已记录的标志；为 None 时读取 info.json 判断。
     """
-    required_subdirs = {'videos', 'meta', 'data'}
-    dataset_paths = []
-    print(f"\n🔍 开始在 '{os.path.abspath(base_path)}' 中搜索数据集...\n")
-    for root, dirs, _ in os.walk(base_path):
-        dir_set = set(dirs)
-        if required_subdirs.issubset(dir_set):
-            dataset_path = Path(root)
-            dataset_paths.append(dataset_path)
-            print(f"  [✅ 找到!] -> {dataset_path}")
-    return dataset_paths
-
-def calculate_stats_for_dataset(dataset_path: Path):
+    if 'merged' in str(dataset_path):
+        return True
+    return is_virtual_dataset(dataset_path) if virtual is None else bool(virtual)
+
+# --- 核心逻辑函数 ---
+
+def account_dataset(dataset_path: Path, src_base_path, verify=False):
     """
-    计算单个数据集的 episode 数量和总帧数。
+    统计单个数据集：episode 数、帧数，以及按任务、按相机的细分。
+    verify 为 True 时，逐个 episode 核对 episodes.jsonl 中的 length 与 parquet footer 行数、各相机视频帧数。
     """
-    episodes_path = dataset_path / "meta" / "episodes.jsonl"
-    
+    meta_dir = dataset_path / "meta"
+    record = {
+        "root": str(dataset_path), "group": dataset_group(dataset_path, src_base_path),
+        "robot_type": None, "num_episodes": 0, "num_frames": 0,
+        "tasks": {}, "cameras": {}, "mismatches": [], "error": None,
+    }
+    episodes_path = meta_dir / "episodes.jsonl"
     if not episodes_path.exists():
-        print(f"    - ❌ 错误: 找不到元数据文件 {episodes_path}。")
-        return 0, 0
+        record["error"] = f"找不到元数据文件 {episodes_path}"
+        return record
+
+    episodes = load_jsonl(episodes_path)
+    info = {}
+    if (meta_dir / "info.json").exists():
+        with open(meta_dir / "info.json", 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    task_names = [t.get("task") for t in sorted(load_jsonl(meta_dir / "tasks.jsonl"), key=lambda t: t.get("task_index", 0))] \
+        if (meta_dir / "tasks.jsonl").exists() else []
+    layout = DatasetLayout.from_info(dataset_path, info)
+    video_keys = layout.discovered_video_keys()
+
+    record["robot_type"] = info.get("robot_type")
+    record["num_episodes"] = len(episodes)
+    record["num_frames"] = sum(ep.get("length", 0) for ep in episodes)
+
+    tasks = defaultdict(lambda: {"episodes": 0, "frames": 0})
+    for ep in episodes:
+        # episodes.jsonl 中没有 tasks 字段、且 tasks.jsonl 中只有一个任务时，归到该任务
+        names = ep.get("tasks") or (task_names if len(task_names) == 1 else ["<unknown>"])
+        for name in names:
+            tasks[name]["episodes"] += 1
+            tasks[name]["frames"] += ep.get("length", 0)
+    record["tasks"] = dict(tasks)
+
+    for video_key in video_keys:
+        record["cameras"][video_key] = {"videos": len(episodes), "frames": record["num_frames"]}
+
+    if verify:
+        for video_key in video_keys:
+            record["cameras"][video_key] = {"videos": 0, "frames": 0}
+        for ep in episodes:
+            ep_idx, expected = ep.get("episode_index"), ep.get("length", 0)
+            parquet_path = layout.data_file(ep_idx)
+            try:
+                actual = read_parquet_num_rows(parquet_path)[0] if parquet_path.exists() else None
+            except Exception:
+                actual = None
+            if actual != expected:
+                record["mismatches"].append({"episode_index": ep_idx, "source": "parquet", "expected": expected, "actual": actual})
+            for video_key in video_keys:
+                video_path = layout.video_file(ep_idx, video_key)
+                try:
+                    frames = read_video_frame_count(video_path) if video_path.exists() else None
+                except Exception:
+                    frames = None
+                if frames is not None:
+                    record["cameras"][video_key]["videos"] += 1
+                    record["cameras"][video_key]["frames"] += frames
+                if frames != expected:
+                    record["mismatches"].append({"episode_index": ep_idx, "source": video_key, "expected": expected, "actual": frames})
+    return record
+
+
+def summarize_records(records):
+    """把逐数据集的统计合并为总计与各维度细分。"""
+    summary = {"totals": {"datasets": len(records), "episodes": 0, "frames": 0, "mismatches": 0}}
+    breakdowns = {name: defaultdict(lambda: {"datasets": 0, "episodes": 0, "frames": 0}) for name in BREAKDOWNS}
+    for r in records:
+        summary["totals"]["episodes"] += r["num_episodes"]
+        summary["totals"]["frames"] += r["num_frames"]
+        summary["totals"]["mismatches"] += len(r.get("mismatches", []))
+        for name, key in (("by_robot", r["robot_type"] or "<unknown>"), ("by_root", r["group"])):
+            breakdowns[name][key]["datasets"] += 1
+            breakdowns[name][key]["episodes"] += r["num_episodes"]
+            breakdowns[name][key]["frames"] += r["num_frames"]
+        for task, counts in r.get("tasks", {}).items():
+            breakdowns["by_task"][task]["datasets"] += 1
+            breakdowns["by_task"][task]["episodes"] += counts["episodes"]
+            breakdowns["by_task"][task]["frames"] += counts["frames"]
+        for camera, counts in r.get("cameras", {}).items():
+            breakdowns["by_camera"][camera]["datasets"] += 1
+            breakdowns["by_camera"][camera]["episodes"] += counts["videos"]
+            breakdowns["by_camera"][camera]["frames"] += counts["frames"]
+    for name in BREAKDOWNS:
+        summary[name] = dict(sorted(breakdowns[name].items()))
+    summary["datasets"] = sorted(records, key=lambda r: r["root"])
+    return summary
+
+
+def print_summary(summary, verify=False):
+    totals = summary["totals"]
+    print("\n" + "="*80)
+    print("🎉 统计完成！")
+    print(f"   - 总共统计数据集数量: {totals['datasets']}")
+    print(f"   - 所有数据集总 Episode 数量: {totals['episodes']}")
+    print(f"   - 所有数据集总帧数 (Total Frames): {totals['frames']}")
+    titles = {"by_task": "按任务", "by_robot": "按机器人", "by_root": "按根目录", "by_camera": "按相机"}
+    for name in BREAKDOWNS:
+        if not summary.get(name):
+            continue
+        print(f"\n   {titles[name]}:")
+        for key, counts in summary[name].items():
+            print(f"     - {key}: {counts['datasets']} 个数据集, {counts['episodes']} 个 episodes, {counts['frames']} 帧")
+    if verify:
+        print(f"\n   校验: 共 {totals['mismatches']} 处 length 与 parquet / 视频帧数不一致")
+        for r in summary["datasets"]:
+            for m in r["mismatches"]:
+                print(f"     - {r['root']} episode {m['episode_index']} [{m['source']}]: length={m['expected']}, 实际={m['actual']}")
+    print("="*80)
+
+
+def write_csv(summary, path):
+    """每行一个 (维度, 键) 的汇总；dataset 维度每行一个数据集。"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["breakdown", "key", "datasets", "episodes", "frames", "mismatches"])
+        totals = summary["totals"]
+        writer.writerow(["total", "", totals["datasets"], totals["episodes"], totals["frames"], totals["mismatches"]])
+        for name in BREAKDOWNS:
+            for key, counts in summary.get(name, {}).items():
+                writer.writerow([name, key, counts["datasets"], counts["episodes"], counts["frames"], ""])
+        for r in summary["datasets"]:
+            writer.writerow(["dataset", r["root"], 1, r["num_episodes"], r["num_frames"], len(r.get("mismatches", []))])
 
-    episodes_data = load_jsonl(episodes_path)
-    
-    num_episodes = len(episodes_data)
-    total_frames = 0
-    
-    for episode in episodes_data:
-        # 使用 .get() 方法安全地获取 'length' 键，如果不存在则默认为 0
-        total_frames += episode.get('length', 0)
-        
-    return num_episodes, total_frames
+
+def write_outputs(summary, args):
+    if args.output_json:
+        with open(args.output_json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"📄 JSON 已写入: {args.output_json}")
+    if args.output_csv:
+        write_csv(summary, args.output_csv)
+        print(f"📄 CSV 已写入: {args.output_csv}")
+
+
+def summarize_from_catalog(args):
+    """
+    基于 dataset_catalog 统计：只重新解析元数据发生变化的数据集，未变化的直接使用目录中的记录。
+    目录中没有逐 episode 的任务信息，因此不输出按任务的细分。
+    """
+    from dataset_catalog import DatasetCatalog
+
+    with DatasetCatalog(args.catalog) as catalog:
+        if not args.no_refresh:
+            catalog.refresh(args.src_base_path, args.search_dirs)
+        records = []
+        for search_path in iter_search_paths(args.src_base_path, args.search_dirs):
+            records.extend(catalog.records(prefix=search_path))
+
+    records = [r for r in records if not is_merged_dataset(r["root"], r["virtual"])]
+    if not records:
+        print("\n❌ 目录中没有符合条件的数据集。请检查 --src_base_path、--search_dirs 参数，或去掉 --no_refresh。")
+        return
+
+    for r in records:
+        r["group"] = dataset_group(Path(r["root"]), args.src_base_path)
+        r["cameras"] = {camera: {"videos": r["num_episodes"], "frames": r["num_frames"]} for camera in r["cameras"]}
+        r["tasks"], r["mismatches"] = {}, []
+    summary = summarize_records(records)
+    print_summary(summary)
+    write_outputs(summary, args)
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="自动化查找 LeRobot 数据集并统计其总 episode 数量和总帧数。",
+        description="自动化查找 LeRobot 数据集并统计其总 episode 数量和总帧数（按任务 / 机器人 / 根目录 / 相机细分）。",
         formatter_class=argparse.RawTextHelpFormatter
     )
     parser.add_argument(
@@ -69,60 +239,64 @@ def main():
         "--search_dirs", type=str, default="*",
         help="在 src_base_path 下要搜索的子目录，用逗号分隔。\n支持通配符 '*'。默认为 '*' (搜索所有子目录)。\n例如: blk0,blk3"
     )
-    
+    parser.add_argument(
+        "--catalog", type=str, default=None,
+        help="(可选) 数据集目录数据库路径 (见 dataset_catalog.py)。\n指定后只增量刷新发生变化的数据集，再从目录中汇总统计。"
+    )
+    parser.add_argument(
+        "--no_refresh", action="store_true",
+        help="配合 --catalog 使用：不访问 PFS，直接用目录中已有的记录统计。"
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="核对 episodes.jsonl 中每个 episode 的 length 与 parquet footer 行数、各相机视频帧数（读取视频需要 PyAV）。"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_MAX_WORKERS,
+        help=f"并发读取元数据的线程数。默认: {DEFAULT_MAX_WORKERS}"
+    )
+    parser.add_argument("--output_json", type=str, default=None, help="(可选) 将完整统计结果写入该 JSON 文件。")
+    parser.add_argument("--output_csv", type=str, default=None, help="(可选) 将汇总与逐数据集统计写入该 CSV 文件。")
+    parser.add_argument("--verbose", action="store_true", help="逐个打印每个数据集的统计结果。")
+
     args = parser.parse_args()
 
-    # 将逗号分隔的搜索目录转换为列表
-    search_dirs = [d.strip() for d in args.search_dirs.split(',')]
-
-    all_found_datasets = []
-    for directory in search_dirs:
-        # 使用 Path.glob 支持通配符
-        search_path_pattern = Path(args.src_base_path) / directory
-        # glob() 不会直接返回路径本身，所以如果不是通配符模式，需要单独处理
-        if '*' not in directory and '?' not in directory:
-             if search_path_pattern.is_dir():
-                all_found_datasets.extend(find_dataset_folders(search_path_pattern))
-        else:
-            # 搜索匹配通配符的目录
-            for matching_dir in Path(args.src_base_path).glob(directory):
-                if matching_dir.is_dir():
-                    all_found_datasets.extend(find_dataset_folders(matching_dir))
-    
-    if not all_found_datasets:
-        print("\n❌ 未找到任何符合条件的数据集文件夹。请检查 --src_base_path 和 --search_dirs 参数。")
+    if args.catalog:
+        if args.verify:
+            print("❌ --verify 需要读取数据文件，不能与 --catalog 同时使用。")
+            return
+        summarize_from_catalog(args)
         return
-        
-    print(f"\n✨ 总共找到 {len(all_found_datasets)} 个数据集，即将开始统计...\n" + "="*80)
 
-    grand_total_episodes = 0
-    grand_total_frames = 0
+    # 边查找边统计：发现一个数据集就立即提交到线程池读取其元数据，无需等待整个目录树遍历结束
+    num_scanned = 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for src_path in iter_datasets_in_search_dirs(args.src_base_path, args.search_dirs, verbose=False):
+            num_scanned += 1
+            if is_merged_dataset(src_path):
+                if args.verbose:
+                    print(f"({num_scanned}) 跳过合并数据集: {src_path}")
+                continue
+            futures.append(executor.submit(account_dataset, src_path, args.src_base_path, args.verify))
 
-    for i, src_path in enumerate(all_found_datasets):
-        if 'merged' in str(src_path):
-            print(f"\n({i+1}/{len(all_found_datasets)}) 跳过合并数据集: {src_path}")
-            continue
-        print(f"\n({i+1}/{len(all_found_datasets)}) 正在统计: {src_path}")
-        print("-" * 60)
-
-        num_episodes, total_frames = calculate_stats_for_dataset(src_path)
-        
-        if num_episodes > 0 or total_frames > 0:
-            print(f"    - 本数据集 Episode 数量: {num_episodes}")
-            print(f"    - 本数据集总帧数: {total_frames}")
-            grand_total_episodes += num_episodes
-            grand_total_frames += total_frames
-        else:
-            print(f"    - 未能从此数据集中统计到有效数据。")
+    if num_scanned == 0:
+        print("\n❌ 未找到任何符合条件的数据集文件夹。请检查 --src_base_path 和 --search_dirs 参数。")
+        return
 
+    records = []
+    for future in futures:
+        record = future.result()
+        if record["error"]:
+            print(f"    - ❌ 错误: {record['error']}")
+        elif args.verbose:
+            print(f"  {record['root']}: {record['num_episodes']} 个 episodes, {record['num_frames']} 帧")
+        records.append(record)
 
-    print("\n" + "="*80)
-    print("🎉 统计完成！")
-    print(f"   - 总共扫描数据集数量: {len(all_found_datasets)}")
-    print(f"   - 所有数据集总 Episode 数量: {grand_total_episodes}")
-    print(f"   - 所有数据集总帧数 (Total Frames): {grand_total_frames}")
-    print("="*80)
+    summary = summarize_records(records)
+    print_summary(summary, verify=args.verify)
+    write_outputs(summary, args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,401 @@
+# dataset_catalog.py
+
+import os
+import argparse
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from dataset_discovery import DEFAULT_MAX_WORKERS, REQUIRED_SUBDIRS, iter_search_paths
+
+DEFAULT_CATALOG_PATH = Path.home() / ".cache" / "lerobot_dataset_catalog.sqlite"
+# 每次刷新都会直接 stat 的元数据文件（原地修改文件不会改变目录的 mtime）
+META_FILES = ("info.json", "episodes.jsonl", "tasks.jsonl", "episodes_stats.jsonl")
+# 需要登记逐文件 size/mtime 的子目录，只有目录 mtime 变化时才会重新列举
+TRACKED_SUBDIRS = ("data", "videos")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    root TEXT PRIMARY KEY,
+    meta_signature TEXT NOT NULL,
+    num_episodes INTEGER NOT NULL,
+    num_frames INTEGER NOT NULL,
+    fps REAL,
+    robot_type TEXT,
+    cameras TEXT NOT NULL,
+    tasks TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    virtual INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS crawl_dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    is_dataset INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    root TEXT NOT NULL,
+    relpath TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL,
+    PRIMARY KEY (root, relpath)
+);
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    relpath TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, relpath)
+);
+CREATE INDEX IF NOT EXISTS files_by_dir ON files (root, dir);
+"""
+
+
+def load_jsonl(path):
+    """加载一个 JSONL 文件。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+
+def _meta_signature(meta_dir: Path):
+    """meta 下各元数据文件的 (size, mtime_ns)，任一变化都需要重新解析。"""
+    signature = {}
+    for name in META_FILES:
+        try:
+            st = os.stat(meta_dir / name)
+            signature[name] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            signature[name] = None
+    return json.dumps(signature, sort_keys=True)
+
+
+def _scan_crawl_dir(path):
+    """
+    列出发现阶段的一个目录，返回 (是否为数据集根目录, 需要继续下探的子目录名列表)；无法读取时抛出 OSError。
+    与 dataset_discovery 一致：符号链接指向的目录参与数据集判定，但不会沿符号链接继续下探。
+    """
+    names, descend = set(), []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if not entry.is_dir():
+                    continue
+                names.add(entry.name)
+                if not entry.is_symlink():
+                    descend.append(entry.name)
+            except OSError:
+                continue
+    if REQUIRED_SUBDIRS.issubset(names):
+        return True, []
+    return False, sorted(descend)
+
+
+def _visit_crawl_dir(path, cached):
+    """
+    线程池任务：stat 目录，mtime 与目录中登记的一致时直接沿用登记的结果，否则重新列举。
+    返回 (path, mtime_ns, 是否为数据集根目录, 子目录名列表, 是否重新列举)；目录已不存在或无法读取时 mtime_ns 为 None。
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None, False, [], False
+    if cached is not None and cached[0] == mtime_ns:
+        return path, mtime_ns, cached[1], cached[2], False
+    try:
+        is_dataset, subdirs = _scan_crawl_dir(path)
+    except OSError:
+        return path, None, False, [], False
+    return path, mtime_ns, is_dataset, subdirs, True
+
+
+def parse_dataset_meta(dataset_path: Path):
+    """
+    解析单个数据集的 meta 文件，返回目录中记录的 episode 数、帧数、相机、fps 和任务列表。
+    """
+    meta_dir = dataset_path / "meta"
+    episodes = load_jsonl(meta_dir / "episodes.jsonl") if (meta_dir / "episodes.jsonl").exists() else []
+    info = {}
+    if (meta_dir / "info.json").exists():
+        with open(meta_dir / "info.json", 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    tasks = load_jsonl(meta_dir / "tasks.jsonl") if (meta_dir / "tasks.jsonl").exists() else []
+    cameras = sorted(
+        key for key, feature in info.get("features", {}).items()
+        if isinstance(feature, dict) and feature.get("dtype") == "video"
+    )
+    return {
+        "num_episodes": len(episodes),
+        "num_frames": sum(ep.get("length", 0) for ep in episodes),
+        "fps": info.get("fps"),
+        "robot_type": info.get("robot_type"),
+        "cameras": cameras,
+        "tasks": [t.get("task") for t in sorted(tasks, key=lambda t: t.get("task_index", 0))],
+        "virtual": bool(info.get("virtual")),
+    }
+
+
+class DatasetCatalog:
+    """
+    本地 SQLite 数据集目录：记录每个数据集根目录的 episode/帧数统计以及 data、videos 下逐文件的 size/mtime，
+    以及发现阶段走过的每个目录的 mtime 和子目录。
+    刷新时只重新解析发生变化的元数据文件，并且只重新列举 mtime 发生变化的目录。
+    """
+
+    def __init__(self, db_path=DEFAULT_CATALOG_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(datasets)")}
+        if "virtual" not in columns:
+            # 旧版本建立的目录：补上 virtual 列，并清空签名让下次刷新重新解析元数据
+            self.conn.execute("ALTER TABLE datasets ADD COLUMN virtual INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE datasets SET meta_signature = ''")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 刷新 ---
+
+    def refresh_dataset(self, dataset_path: Path):
+        """增量刷新单个数据集，返回 (记录, 是否重新解析了元数据, 重新列举的目录数)。"""
+        root = str(dataset_path)
+        signature = _meta_signature(dataset_path / "meta")
+        row = self.conn.execute("SELECT meta_signature FROM datasets WHERE root = ?", (root,)).fetchone()
+        meta_changed = row is None or row[0] != signature
+        if meta_changed:
+            try:
+                meta = parse_dataset_meta(dataset_path)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"    - ⚠️  解析 {dataset_path / 'meta'} 失败: {e}")
+                meta = {
+                    "num_episodes": 0, "num_frames": 0, "fps": None, "robot_type": None, "cameras": [], "tasks": [],
+                    "virtual": False,
+                }
+            self.conn.execute(
+                "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (root, signature, meta["num_episodes"], meta["num_frames"], meta["fps"], meta["robot_type"],
+                 json.dumps(meta["cameras"]), json.dumps(meta["tasks"], ensure_ascii=False), time.time(),
+                 int(meta["virtual"])),
+            )
+        rescanned = sum(self._sync_dir(dataset_path, rel) for rel in TRACKED_SUBDIRS)
+        self.conn.commit()
+        return self.get(root), meta_changed, rescanned
+
+    def _sync_dir(self, dataset_path: Path, relpath: str):
+        """目录 mtime 未变化时沿用已登记的子目录和文件，否则重新列举。返回重新列举的目录数。"""
+        root = str(dataset_path)
+        abs_dir = dataset_path / relpath
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            self._forget_dir(root, relpath)
+            return 0
+        row = self.conn.execute(
+            "SELECT mtime_ns, subdirs FROM dirs WHERE root = ? AND relpath = ?", (root, relpath)
+        ).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            subdirs = json.loads(row[1])
+            rescanned = 0
+        else:
+            subdirs, files = [], []
+            try:
+                with os.scandir(abs_dir) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.name)
+                            else:
+                                st = entry.stat()
+                                files.append((root, f"{relpath}/{entry.name}", relpath, st.st_size, st.st_mtime_ns))
+                        except OSError:
+                            continue
+            except OSError:
+                # stat 之后目录被删除或变得不可读
+                self._forget_dir(root, relpath)
+                return 0
+            subdirs.sort()
+            old_subdirs = set(json.loads(row[1])) if row is not None else set()
+            for gone in old_subdirs - set(subdirs):
+                self._forget_dir(root, f"{relpath}/{gone}")
+            self.conn.execute("DELETE FROM files WHERE root = ? AND dir = ?", (root, relpath))
+            self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?)", files)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)", (root, relpath, mtime_ns, json.dumps(subdirs))
+            )
+            rescanned = 1
+        for name in subdirs:
+            rescanned += self._sync_dir(dataset_path, f"{relpath}/{name}")
+        return rescanned
+
+    def _forget_dir(self, root: str, relpath: str):
+        like = relpath.replace("%", r"\%").replace("_", r"\_") + "/%"
+        self.conn.execute(
+            "DELETE FROM dirs WHERE root = ? AND (relpath = ? OR relpath LIKE ? ESCAPE '\\')", (root, relpath, like)
+        )
+        self.conn.execute(
+            "DELETE FROM files WHERE root = ? AND (dir = ? OR dir LIKE ? ESCAPE '\\')", (root, relpath, like)
+        )
+
+    def forget_dataset(self, root: str):
+        for table in ("datasets", "dirs", "files"):
+            self.conn.execute(f"DELETE FROM {table} WHERE root = ?", (root,))
+        self.conn.commit()
+
+    def discover(self, search_path, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        增量发现 search_path 下的数据集根目录。每个目录只 stat 一次：mtime 与登记的一致时沿用登记的
+        子目录列表，只有 mtime 变化（有子目录增删）的目录才会重新 scandir。
+        登记的子目录仍会逐个 stat，因为深层目录的增删不会改变上层目录的 mtime。
+        返回 (数据集路径列表, 重新列举的目录数)。
+        """
+        search_path = str(search_path).rstrip("/")
+        cached = {
+            row[0]: (row[1], bool(row[2]), json.loads(row[3]))
+            for row in self.conn.execute(
+                "SELECT path, mtime_ns, is_dataset, subdirs FROM crawl_dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                (search_path, len(search_path) + 1, search_path + "/"),
+            )
+        }
+        found, updates, visited = [], [], set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(_visit_crawl_dir, search_path, cached.get(search_path))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, mtime_ns, is_dataset, subdirs, rescanned = future.result()
+                    if mtime_ns is None:
+                        continue
+                    visited.add(path)
+                    if rescanned:
+                        updates.append((path, mtime_ns, int(is_dataset), json.dumps(subdirs)))
+                    if is_dataset:
+                        found.append(Path(path))
+                    for name in subdirs:
+                        child = f"{path}/{name}"
+                        pending.add(executor.submit(_visit_crawl_dir, child, cached.get(child)))
+        self.conn.executemany("INSERT OR REPLACE INTO crawl_dirs VALUES (?, ?, ?, ?)", updates)
+        # 本次没有走到的目录（已删除、不可读，或已不在某个变化目录的子目录中）
+        self.conn.executemany("DELETE FROM crawl_dirs WHERE path = ?", [(p,) for p in cached if p not in visited])
+        self.conn.commit()
+        return sorted(found), len(updates)
+
+    def refresh(self, src_base_path, search_dirs="*", max_workers=DEFAULT_MAX_WORKERS, verbose=True):
+        """
+        在搜索目录中增量发现数据集（见 discover）并增量刷新；搜索范围内已不存在的数据集会从目录中移除。
+        返回本次发现的数据集路径列表（按路径排序）。
+        """
+        found = []
+        parsed = rescanned = crawled = 0
+        discovered = {}  # 搜索目录可能重叠，同一个数据集只刷新一次
+        for search_path in iter_search_paths(src_base_path, search_dirs):
+            paths, n_dirs = self.discover(search_path, max_workers=max_workers)
+            crawled += n_dirs
+            discovered.update(dict.fromkeys(paths))
+        for dataset_path in discovered:
+            _, meta_changed, n_dirs = self.refresh_dataset(dataset_path)
+            parsed += int(meta_changed)
+            rescanned += n_dirs
+            found.append(dataset_path)
+        found_roots = {str(p) for p in found}
+        for search_path in iter_search_paths(src_base_path, search_dirs):
+            for root in self.roots(prefix=str(search_path)):
+                if root not in found_roots:
+                    self.forget_dataset(root)
+        if verbose:
+            print(
+                f"📒 目录刷新完成: {len(found)} 个数据集，重新解析元数据 {parsed} 个，"
+                f"重新列举目录 {rescanned} 个（发现阶段 {crawled} 个）。"
+            )
+        return sorted(found)
+
+    # --- 查询 ---
+
+    def roots(self, prefix=None):
+        if prefix is None:
+            rows = self.conn.execute("SELECT root FROM datasets ORDER BY root")
+        else:
+            prefix = str(prefix).rstrip("/")
+            rows = self.conn.execute(
+                "SELECT root FROM datasets WHERE root = ? OR substr(root, 1, ?) = ? ORDER BY root",
+                (prefix, len(prefix) + 1, prefix + "/"),
+            )
+        return [r[0] for r in rows]
+
+    def get(self, root):
+        row = self.conn.execute(
+            "SELECT root, num_episodes, num_frames, fps, robot_type, cameras, tasks, virtual FROM datasets WHERE root = ?",
+            (str(root),),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "root": row[0], "num_episodes": row[1], "num_frames": row[2], "fps": row[3],
+            "robot_type": row[4], "cameras": json.loads(row[5]), "tasks": json.loads(row[6]), "virtual": bool(row[7]),
+        }
+
+    def records(self, prefix=None):
+        return [self.get(root) for root in self.roots(prefix)]
+
+    def files(self, root, subdir=None):
+        """返回 [(relpath, size, mtime_ns)]，subdir 例如 'videos/chunk-000/observation.images.front'。"""
+        if subdir is None:
+            rows = self.conn.execute("SELECT relpath, size, mtime_ns FROM files WHERE root = ? ORDER BY relpath", (str(root),))
+        else:
+            rows = self.conn.execute(
+                "SELECT relpath, size, mtime_ns FROM files WHERE root = ? AND dir = ? ORDER BY relpath", (str(root), subdir)
+            )
+        return rows.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="维护本地的 LeRobot 数据集目录（SQLite），并基于目录快速统计 episode 和帧数。",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--catalog", type=str, default=str(DEFAULT_CATALOG_PATH),
+        help=f"目录数据库路径。默认: {DEFAULT_CATALOG_PATH}"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_refresh = subparsers.add_parser("refresh", help="发现数据集并增量刷新目录。")
+    parser_refresh.add_argument("--src_base_path", type=str, required=True, help="要开始搜索的源根目录路径。")
+    parser_refresh.add_argument("--search_dirs", type=str, default="*", help="逗号分隔的子目录，支持通配符。默认 '*'。")
+    parser_refresh.add_argument("--max_workers", type=int, default=DEFAULT_MAX_WORKERS, help="并发列举目录的线程数。")
+
+    parser_summary = subparsers.add_parser("summary", help="只读取目录数据库，统计 episode 和帧数（不访问 PFS）。")
+    parser_summary.add_argument("--prefix", type=str, default=None, help="只统计该路径下的数据集。")
+    parser_summary.add_argument("--include_merged", action="store_true", help="统计时包含合并得到的数据集（路径中带 'merged' 或虚拟合并）。")
+
+    args = parser.parse_args()
+
+    with DatasetCatalog(args.catalog) as catalog:
+        if args.command == "refresh":
+            catalog.refresh(args.src_base_path, args.search_dirs, max_workers=args.max_workers)
+        elif args.command == "summary":
+            records = [
+                r for r in catalog.records(args.prefix)
+                if args.include_merged or not ('merged' in r["root"] or r["virtual"])
+            ]
+            for r in records:
+                print(f"  {r['root']}: {r['num_episodes']} episodes, {r['num_frames']} frames")
+            print("="*80)
+            print(f"   - 数据集数量: {len(records)}")
+            print(f"   - 总 Episode 数量: {sum(r['num_episodes'] for r in records)}")
+            print(f"   - 总帧数 (Total Frames): {sum(r['num_frames'] for r in records)}")
+            print("="*80)
+
+
+if __name__ == "__main__":
+    main()
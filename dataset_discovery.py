@@ -0,0 +1,131 @@
+# dataset_discovery.py
+
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+# 一个“数据集文件夹”被定义为同时包含这三个子文件夹的目录
+REQUIRED_SUBDIRS = frozenset({'videos', 'meta', 'data'})
+# PFS 上目录列举的主要开销是元数据往返延迟，线程数可以远大于 CPU 核数
+DEFAULT_MAX_WORKERS = 32
+
+
+def _list_subdirs(path):
+    """
+    用 os.scandir 列出 path 下的子目录，返回 (是否为数据集根目录, 需要继续下探的子目录列表)。
+    与 os.walk 一致：符号链接指向的目录参与数据集判定，但不会沿符号链接继续下探。
+    """
+    names = set()
+    descend = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if not entry.is_dir():
+                        continue
+                    names.add(entry.name)
+                    if not entry.is_symlink():
+                        descend.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"  [⚠️ 跳过] 无法读取目录 {path}: {e}")
+        return False, []
+    if REQUIRED_SUBDIRS.issubset(names):
+        # 找到数据集根目录后不再下探，避免 stat 其中成千上万个 mp4/parquet
+        return True, []
+    return False, descend
+
+
+def iter_dataset_folders(base_path, max_workers=DEFAULT_MAX_WORKERS, verbose=True):
+    """
+    在 base_path 下并发查找数据集文件夹，以生成器的形式边找边返回 Path。
+    目录列举被分发到线程池中执行，以掩盖 PFS 的元数据延迟；返回顺序不保证稳定。
+    """
+    base_path = Path(base_path)
+    if verbose:
+        print(f"\n🔍 开始在 '{os.path.abspath(base_path)}' 中搜索数据集...\n")
+    if not base_path.is_dir():
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_list_subdirs, str(base_path)): str(base_path)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root = pending.pop(future)
+                is_dataset, subdirs = future.result()
+                if is_dataset:
+                    if verbose:
+                        print(f"  [✅ 找到!] -> {root}")
+                    yield Path(root)
+                for subdir in subdirs:
+                    pending[executor.submit(_list_subdirs, subdir)] = subdir
+
+
+def find_dataset_folders(base_path, max_workers=DEFAULT_MAX_WORKERS, verbose=True):
+    """
+    在指定的基础路径下递归查找所有的数据集文件夹，返回按路径排序的列表。
+    一个“数据集文件夹”被定义为同时包含 'videos', 'meta', 和 'data' 这三个子文件夹的目录。
+    """
+    return sorted(iter_dataset_folders(base_path, max_workers=max_workers, verbose=verbose))
+
+
+def iter_search_paths(src_base_path, search_dirs):
+    """
+    将逗号分隔的 search_dirs（支持通配符 '*' 和 '?'）展开为 src_base_path 下实际存在的目录。
+    """
+    for directory in [d.strip() for d in search_dirs.split(',') if d.strip()]:
+        if '*' not in directory and '?' not in directory:
+            search_path = Path(src_base_path) / directory
+            if search_path.is_dir():
+                yield search_path
+        else:
+            for matching_dir in sorted(Path(src_base_path).glob(directory)):
+                if matching_dir.is_dir():
+                    yield matching_dir
+
+
+def iter_datasets_in_search_dirs(src_base_path, search_dirs, max_workers=DEFAULT_MAX_WORKERS, verbose=True):
+    """
+    依次在每个搜索目录中流式查找数据集，同一个数据集只返回一次。
+    """
+    seen = set()
+    for search_path in iter_search_paths(src_base_path, search_dirs):
+        for dataset_path in iter_dataset_folders(search_path, max_workers=max_workers, verbose=verbose):
+            if dataset_path not in seen:
+                seen.add(dataset_path)
+                yield dataset_path
+
+
+def find_datasets_in_search_dirs(src_base_path, search_dirs, max_workers=DEFAULT_MAX_WORKERS, verbose=True):
+    """
+    iter_datasets_in_search_dirs 的列表版本，结果按路径排序，保证多次运行的处理顺序一致。
+    """
+    return sorted(iter_datasets_in_search_dirs(src_base_path, search_dirs, max_workers=max_workers, verbose=verbose))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="并发查找 LeRobot 数据集文件夹（包含 videos/meta/data 的目录）。",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--src_base_path", type=str, required=True,
+        help="要开始搜索的源根目录路径。\n例如: /pfs/pfs-ahGxdf/data/collect_data/so101"
+    )
+    parser.add_argument(
+        "--search_dirs", type=str, default="*",
+        help="在 src_base_path 下要搜索的子目录，用逗号分隔。\n支持通配符 '*'。默认为 '*' (搜索所有子目录)。\n例如: blk0,blk3"
+    )
+    parser.add_argument(
+        "--max_workers", type=int, default=DEFAULT_MAX_WORKERS,
+        help=f"并发列举目录的线程数。默认: {DEFAULT_MAX_WORKERS}"
+    )
+    args = parser.parse_args()
+
+    found = 0
+    for _ in iter_datasets_in_search_dirs(args.src_base_path, args.search_dirs, max_workers=args.max_workers):
+        found += 1
+    print(f"\n✨ 总共找到 {found} 个数据集。")
@@ -0,0 +1,220 @@
+# episode_stats.py
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from lerobot_layout import DatasetLayout
+
+EPISODES_STATS_FILE = "episodes_stats.jsonl"
+# 这些 dtype 的特征不在 parquet 中（或不是数值），统计值沿用已有的 episodes_stats.jsonl，或由 image_stats 从视频计算
+NON_NUMERIC_DTYPES = {"video", "image", "string"}
+DEFAULT_STATS_WORKERS = min(16, os.cpu_count() or 1)
+
+
+def column_to_2d(column):
+    """
+    把 parquet 的一列转换为 (帧数, 维度) 的二维 NumPy 数组：
+    标量列为 (n, 1)，list / fixed_size_list 列（如 action、observation.state）为 (n, d)。
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    n = len(column)
+    if pa.types.is_list(column.type) or pa.types.is_large_list(column.type) or pa.types.is_fixed_size_list(column.type):
+        lengths = pc.list_value_length(column).to_numpy(zero_copy_only=False)
+        if n and (lengths != lengths[0]).any():
+            raise ValueError("list 列的每一行长度不一致，无法计算统计值")
+        values = pc.list_flatten(column).to_numpy(zero_copy_only=False)
+        return values.reshape(n, -1)
+    return column.to_numpy(zero_copy_only=False).reshape(n, 1)
+
+
+def feature_stats(array):
+    """对 (n, d) 数组按帧求 min/max/mean/std/count，格式与 LeRobot 的 episodes_stats 一致。"""
+    if array.dtype == np.bool_:
+        array = array.astype(np.int64)
+    return {
+        "min": array.min(axis=0).tolist(),
+        "max": array.max(axis=0).tolist(),
+        "mean": array.mean(axis=0, dtype=np.float64).tolist(),
+        "std": array.std(axis=0, dtype=np.float64).tolist(),
+        "count": [int(array.shape[0])],
+    }
+
+
+def numeric_feature_names(info, schema):
+    """info.json 中声明、且在 parquet 里以数值（或数值 list）列存在的特征，保持 info.json 中的顺序。"""
+    names = []
+    features = info.get("features") or {name: {} for name in schema.names}
+    for name, feature in features.items():
+        if feature.get("dtype") in NON_NUMERIC_DTYPES or schema.get_field_index(name) < 0:
+            continue
+        field_type = schema.field(name).type
+        while pa.types.is_list(field_type) or pa.types.is_large_list(field_type) or pa.types.is_fixed_size_list(field_type):
+            field_type = field_type.value_type
+        if pa.types.is_integer(field_type) or pa.types.is_floating(field_type) or pa.types.is_boolean(field_type):
+            names.append(name)
+    return names
+
+
+def compute_episode_stats(parquet_path, feature_names):
+    """只读取 feature_names 中的列，返回 {特征名: 统计值}。"""
+    table = pq.read_table(parquet_path, columns=feature_names)
+    if table.num_rows == 0:
+        return {}
+    return {name: feature_stats(column_to_2d(table.column(name))) for name in feature_names}
+
+
+def _stats_task(task):
+    """进程池任务：("data", ep, parquet, 特征名) 或 ("video", ep, video_key, mp4, 采样帧数)，返回 (ep, {特征名: 统计值})。"""
+    kind, episode_index = task[0], task[1]
+    if kind == "data":
+        return episode_index, compute_episode_stats(task[2], task[3])
+    from image_stats import compute_video_stats
+
+    _, _, video_key, video_path, num_samples = task
+    try:
+        stats = compute_video_stats(video_path, num_samples)
+    except Exception as e:
+        print(f"    - ⚠️ 警告: 无法计算 {video_path} 的图像统计值: {e}")
+        stats = None
+    return episode_index, {video_key: stats} if stats else {}
+
+
+def compute_dataset_episodes_stats(dataset_path: Path, max_workers=DEFAULT_STATS_WORKERS, image_stats=False,
+                                   image_samples=None, episodes=None):
+    """
+    对数据集中的每个 episode 从 parquet 重新计算数值特征的统计值，多进程并行。
+    image_stats 为 True 时，同一个进程池里还会对每个相机的视频采样解码，计算图像特征的统计值
+    （image_samples 为每个视频的采样帧数，默认与 LeRobot 一致）。
+    episodes 为 [(episode_index, parquet 路径)] 时只计算这些 episode，不再扫描 data/ 目录树。
+    返回 ({episode_index: {特征名: 统计值}}, 特征名列表)。
+    """
+    dataset_path = Path(dataset_path)
+    info_path = dataset_path / "meta" / "info.json"
+    info = json.loads(info_path.read_text()) if info_path.exists() else {}
+    layout = DatasetLayout.from_info(dataset_path, info)
+    episodes = layout.iter_data_files() if episodes is None else [(ep, Path(path)) for ep, path in episodes]
+    if not episodes:
+        return {}, []
+    feature_names = numeric_feature_names(info, pq.read_schema(episodes[0][1]))
+
+    tasks = [("data", ep, str(path), feature_names) for ep, path in episodes]
+    if image_stats:
+        for video_key in layout.discovered_video_keys():
+            for ep, _ in episodes:
+                video_path = layout.video_file(ep, video_key)
+                if video_path.exists():
+                    tasks.append(("video", ep, video_key, str(video_path), image_samples))
+
+    computed = {}
+    if max_workers <= 1 or len(tasks) == 1:
+        results = map(_stats_task, tasks)
+        for ep, stats in results:
+            computed.setdefault(ep, {}).update(stats)
+        return computed, feature_names
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        results = executor.map(_stats_task, tasks, chunksize=max(1, len(tasks) // (max_workers * 4)))
+        for ep, stats in results:
+            computed.setdefault(ep, {}).update(stats)
+    return computed, feature_names
+
+
+def _stats_records(dataset_path: Path, computed, feature_names, carried):
+    """
+    按 episode_index 升序生成 episodes_stats 记录：新计算的统计值优先，其余特征（如未重算的视频特征）
+    从 carried（{episode_index: 原有 stats}）沿用。特征顺序与 info.json 一致。
+    """
+    info_path = Path(dataset_path) / "meta" / "info.json"
+    info = json.loads(info_path.read_text()) if info_path.exists() else {}
+    order = list(info.get("features", {})) or feature_names
+    records = []
+    for episode_index in sorted(computed):
+        old = carried.get(episode_index, {})
+        new = computed[episode_index]
+        stats = {}
+        for name in order + [k for k in old if k not in order]:
+            if name in new:
+                stats[name] = new[name]
+            elif name in old:
+                stats[name] = old[name]
+        records.append({"episode_index": episode_index, "stats": stats})
+    return records
+
+
+def write_episodes_stats(dataset_path: Path, max_workers=DEFAULT_STATS_WORKERS, image_stats=False, image_samples=None):
+    """
+    重新生成 meta/episodes_stats.jsonl：数值特征的统计值全部从 parquet 重新计算；
+    视频 / 图像特征在 image_stats 为 True 时从采样的视频帧重新计算，否则从已有文件中按 episode_index 沿用。
+    特征顺序与 info.json 一致。返回写入的 episode 数。
+    """
+    dataset_path = Path(dataset_path)
+    stats_path = dataset_path / "meta" / EPISODES_STATS_FILE
+    computed, feature_names = compute_dataset_episodes_stats(dataset_path, max_workers, image_stats, image_samples)
+    if not computed:
+        return 0
+
+    existing = {}
+    if stats_path.exists():
+        with open(stats_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    existing[record["episode_index"]] = record.get("stats", {})
+
+    tmp_path = stats_path.with_name(f".{stats_path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        for record in _stats_records(dataset_path, computed, feature_names, existing):
+            f.write(json.dumps(record) + "\n")
+    tmp_path.replace(stats_path)
+    return len(computed)
+
+
+def append_episodes_stats(dataset_path: Path, episodes, carried=None, max_workers=DEFAULT_STATS_WORKERS,
+                          image_stats=False, image_samples=None):
+    """
+    只为新写入的 episodes（[(episode_index, parquet 路径)]，如追加合并时的计划）计算统计值，
+    并追加到 meta/episodes_stats.jsonl 末尾，既不扫描 data/ 目录树，也不重写已有记录。
+    carried 为这些 episode 原有的 stats（{episode_index: stats}），用于沿用视频 / 图像特征。
+    返回追加的记录列表，可直接交给 aggregate_stats.update_stats_json。
+    """
+    dataset_path = Path(dataset_path)
+    computed, feature_names = compute_dataset_episodes_stats(
+        dataset_path, max_workers, image_stats, image_samples, episodes
+    )
+    if not computed:
+        return []
+    records = _stats_records(dataset_path, computed, feature_names, carried or {})
+    with open(dataset_path / "meta" / EPISODES_STATS_FILE, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="从 parquet（以及可选地从采样的视频帧）重新计算 LeRobot 数据集每个 episode 的统计值，并重写 meta/episodes_stats.jsonl。",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--dataset_dir", type=str, nargs="+", required=True, help="一个或多个数据集根目录（包含 data/meta）。")
+    parser.add_argument("--workers", type=int, default=DEFAULT_STATS_WORKERS, help=f"并行计算的进程数。默认: {DEFAULT_STATS_WORKERS}")
+    parser.add_argument("--image_stats", action="store_true", help="同时从采样的视频帧重新计算 observation.images.* 的统计值（需要 PyAV）。")
+    parser.add_argument(
+        "--image_samples", type=int, default=None,
+        help="每个视频采样的帧数。默认与 LeRobot 一致: 帧数的 0.75 次方，限制在 [100, 10000] 内（短视频全部采样）。"
+    )
+    args = parser.parse_args()
+
+    for dataset_dir in args.dataset_dir:
+        count = write_episodes_stats(Path(dataset_dir), args.workers, args.image_stats, args.image_samples)
+        if count:
+            print(f"✔️ {dataset_dir}: 已重新计算 {count} 个 episodes 的统计值。")
+        else:
+            print(f"⚠️ {dataset_dir}: 没有找到 parquet 文件，跳过。")
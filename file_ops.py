@@ -0,0 +1,246 @@
+# file_ops.py
+
+import errno
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# copy:     完整复制（默认，与旧行为一致）
+# hardlink: 硬链接，源与目标不在同一文件系统时回退为复制
+# reflink:  写时复制克隆（FICLONE，需 btrfs/xfs 等支持），不支持时回退为复制
+# symlink:  指向源文件绝对路径的符号链接，源文件被删除或移动后会失效
+# auto:     依次尝试 reflink、hardlink，都不行时复制
+LINK_MODES = ("copy", "hardlink", "reflink", "symlink", "auto")
+DEFAULT_LINK_MODE = "copy"
+LINK_MODE_HELP = (
+    "视频等不需要修改的文件的落盘方式: copy / hardlink / reflink / symlink / auto。\n"
+    "hardlink、reflink 在跨文件系统时自动回退为复制；auto 依次尝试 reflink、hardlink、copy。\n"
+    "注意: hardlink 与源文件共享同一份数据，原地修改任一方都会影响另一方。默认: copy"
+)
+
+# 并发复制的线程数；PFS 上单个流很难跑满带宽，多个文件同时复制才能把吞吐拉上去
+DEFAULT_COPY_WORKERS = 8
+# copy_file_range / sendfile 单次调用传输的最大字节数，以及普通读写回退时的缓冲区大小
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# 这些错误表示“此处无法链接/克隆”，应回退为复制，而不是报错
+_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP,
+    errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.ENOSYS,
+}
+
+
+def _advise_sequential(fd):
+    """提示内核按顺序预读整个文件。"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _copy_range_loop(copy_fn, fsrc, fdst, size):
+    """反复调用 copy_fn(in_fd, out_fd, offset, count) 直到复制完 size 字节，返回已复制的字节数。"""
+    copied = 0
+    while copied < size:
+        n = copy_fn(fsrc.fileno(), fdst.fileno(), copied, min(COPY_BLOCK_SIZE, size - copied))
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _copy_file_range(in_fd, out_fd, offset, count):
+    return os.copy_file_range(in_fd, out_fd, count, offset, offset)
+
+
+def _sendfile(in_fd, out_fd, offset, count):
+    return os.sendfile(out_fd, in_fd, offset, count)
+
+
+def copy_file(src, dst):
+    """
+    复制单个文件（含权限与时间戳，等价于 shutil.copy2），返回复制的字节数。
+    依次尝试内核内的零拷贝 os.copy_file_range、os.sendfile，都不可用时回退为大块读写。
+    """
+    src, dst = os.fspath(src), os.fspath(dst)
+    size = os.path.getsize(src)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        _advise_sequential(fsrc.fileno())
+        copied = 0
+        for name, copy_fn in (("copy_file_range", _copy_file_range), ("sendfile", _sendfile)):
+            if not hasattr(os, name):
+                continue
+            try:
+                copied = _copy_range_loop(copy_fn, fsrc, fdst, size)
+                break
+            except OSError as e:
+                if e.errno not in _FALLBACK_ERRNOS or copied:
+                    raise
+        if copied < size:
+            # 零拷贝不可用，或文件在复制过程中变大：从当前位置继续用缓冲读写
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            buf = bytearray(COPY_BLOCK_SIZE)
+            view = memoryview(buf)
+            while True:
+                n = fsrc.readinto(buf)
+                if not n:
+                    break
+                fdst.write(view[:n])
+                copied += n
+    shutil.copystat(src, dst)
+    return copied
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def _remove_existing(dst):
+    if os.path.lexists(dst) and not os.path.isdir(dst):
+        os.unlink(dst)
+
+
+def link_or_copy(src, dst, mode=DEFAULT_LINK_MODE):
+    """
+    按 mode 把 src 放到 dst，返回实际使用的方式（'copy' / 'hardlink' / 'reflink' / 'symlink'）。
+    dst 已存在时会被覆盖。
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"未知的 link mode: {mode}，可选: {', '.join(LINK_MODES)}")
+    src, dst = os.fspath(src), os.fspath(dst)
+    if os.path.exists(dst) and not os.path.islink(dst) and os.path.samefile(src, dst):
+        # dst 已经是 src 的硬链接（例如重复运行），不能先删除再链接
+        if mode in ("hardlink", "auto"):
+            return "hardlink"
+        raise shutil.SameFileError(f"{src} 和 {dst} 是同一个文件")
+
+    if mode == "symlink":
+        _remove_existing(dst)
+        os.symlink(os.path.abspath(src), dst)
+        return "symlink"
+
+    attempts = {"reflink": ["reflink"], "hardlink": ["hardlink"], "auto": ["reflink", "hardlink"]}.get(mode, [])
+    for method in attempts:
+        try:
+            _remove_existing(dst)
+            if method == "reflink":
+                _reflink(src, dst)
+            else:
+                os.link(src, dst)
+            return method
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+
+    # dst 可能是指向 src 的符号链接（例如物化虚拟合并数据集），直接以写方式打开会截断源文件
+    _remove_existing(dst)
+    copy_file(src, dst)
+    return "copy"
+
+
+class BulkCopier:
+    """
+    有界线程池批量复制/链接文件，并统计每个任务的文件数、字节数与吞吐。
+    用法:
+        with BulkCopier(max_workers=8, link_mode="auto", desc="videos") as copier:
+            copier.submit(src, dst)
+        # 退出 with 时等待所有任务完成并打印统计；任一文件失败时抛出第一个异常
+    """
+
+    def __init__(self, max_workers=DEFAULT_COPY_WORKERS, link_mode=DEFAULT_LINK_MODE, desc="copy", verbose=True):
+        self.link_mode = link_mode
+        self.desc = desc
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 限制排队中的任务数量，避免一次性提交几十万个文件时占用过多内存
+        self._slots = threading.BoundedSemaphore(max_workers * 4)
+        self._lock = threading.Lock()
+        self._futures = []
+        self.files = 0
+        self.bytes = 0
+        self.methods = Counter()
+        self.errors = []
+        self.started = time.monotonic()
+
+    def _run(self, src, dst):
+        try:
+            method = link_or_copy(src, dst, self.link_mode)
+            size = os.path.getsize(src) if method == "copy" else 0
+            with self._lock:
+                self.files += 1
+                self.bytes += size
+                self.methods[method] += 1
+        except Exception as e:
+            with self._lock:
+                self.errors.append((src, dst, e))
+        finally:
+            self._slots.release()
+
+    def submit(self, src, dst):
+        self._slots.acquire()
+        self._futures.append(self.executor.submit(self._run, src, dst))
+        return dst
+
+    def copy_function(self, src, dst):
+        """可以传给 shutil.copytree(copy_function=...)，文件被放入线程池异步复制。"""
+        return self.submit(src, dst)
+
+    def stats(self):
+        seconds = time.monotonic() - self.started
+        return {
+            "desc": self.desc,
+            "files": self.files,
+            "bytes": self.bytes,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(self.bytes / seconds / 1e6, 1) if seconds > 0 else 0.0,
+            "methods": dict(self.methods),
+            "errors": len(self.errors),
+        }
+
+    def wait(self):
+        """等待所有已提交的任务完成，返回统计信息。"""
+        for future in self._futures:
+            future.result()
+        self._futures.clear()
+        stats = self.stats()
+        if self.verbose and (stats["files"] or stats["errors"]):
+            methods = ", ".join(f"{k}={v}" for k, v in sorted(stats["methods"].items()))
+            failed = f", 失败 {stats['errors']} 个" if stats["errors"] else ""
+            print(f"    - [{self.desc}] {stats['files']} 个文件 ({methods}){failed}, "
+                  f"复制 {stats['bytes'] / 2**30:.2f} GiB, 用时 {stats['seconds']:.1f}s, {stats['mb_per_s']} MB/s")
+        return stats
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown()
+        if self.errors:
+            src, dst, e = self.errors[0]
+            raise OSError(f"{len(self.errors)} 个文件复制失败，第一个: {src} -> {dst}: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.executor.shutdown(cancel_futures=True)
+            return False
+        self.close()
+        return False
@@ -6,7 +6,14 @@ import argparse
 from pathlib import Path
 import json
 import shutil
-import pandas as pd
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parquet_utils import reindex_parquet  # noqa: E402
+from lerobot_layout import DatasetLayout, camera_video_key  # noqa: E402
+from episode_stats import write_episodes_stats  # noqa: E402
+from aggregate_stats import write_stats_json  # noqa: E402
+from file_ops import DEFAULT_LINK_MODE, LINK_MODES, LINK_MODE_HELP, link_or_copy  # noqa: E402
 
 
 def load_jsonl(path):
@@ -27,19 +34,14 @@ def main(args):
     remove_txt = Path(args.remove_txt)
     cam_list = [cam.strip() for cam in args.cams.split(",") if cam.strip()]
 
-    # 源路径
-    src_data = src_root / "data/chunk-000"
-    src_videos = {cam: src_root / f"videos/chunk-000/observation.images.{cam}" for cam in cam_list}
+    # 源/目标路径：按 info.json 的 chunks_size 和路径模板计算，目标按新编号重新分配 chunk
+    src_layout = DatasetLayout.from_info(src_root)
+    dst_layout = src_layout.with_root(dst_root)
     src_meta = src_root / "meta"
-
-    # 目标路径
-    dst_data = dst_root / "data/chunk-000"
-    dst_videos = {cam: dst_root / f"videos/chunk-000/observation.images.{cam}" for cam in cam_list}
     dst_meta = dst_root / "meta"
 
     # 创建目标目录
-    for p in [dst_data, dst_meta] + list(dst_videos.values()):
-        p.mkdir(parents=True, exist_ok=True)
+    dst_meta.mkdir(parents=True, exist_ok=True)
 
     # 加载需要删除的 episode id 列表
     with open(remove_txt, "r") as f:
@@ -57,33 +59,29 @@ def main(args):
 
     # 按顺序处理剩下的 episode
     for new_idx, (ep, st) in enumerate(filtered):
-        old_idx_str = f"{ep['episode_index']:06d}"
-        new_idx_str = f"{new_idx:06d}"
+        old_idx = ep["episode_index"]
 
         # 更新 JSON 中的 episode_index 字段
         ep["episode_index"] = new_idx
         st["episode_index"] = new_idx
 
         # === 修改 parquet 中的 episode_index 字段 ===
-        old_parquet = src_data / f"episode_{old_idx_str}.parquet"
-        new_parquet = dst_data / f"episode_{new_idx_str}.parquet"
+        old_parquet = src_layout.data_file(old_idx)
+        new_parquet = dst_layout.data_file(new_idx)
+        new_parquet.parent.mkdir(parents=True, exist_ok=True)
         if old_parquet.exists():
-            df = pd.read_parquet(old_parquet)
-            if "episode_index" in df.columns:
-                df["episode_index"] = new_idx
-            else:
+            _, missing = reindex_parquet(old_parquet, new_parquet, set_columns={"episode_index": new_idx})
+            if missing:
                 print(f"⚠️ Warning: 'episode_index' not found in {old_parquet.name}")
-            df.to_parquet(new_parquet)
             print(f"✔️ Saved {new_parquet.name} with updated episode_index = {new_idx}")
 
         # === 拷贝对应视频文件（不做修改） ===
         for cam in cam_list:
-            cam_src = src_videos[cam]
-            cam_dst = dst_videos[cam]
-            old_mp4 = cam_src / f"episode_{old_idx_str}.mp4"
-            new_mp4 = cam_dst / f"episode_{new_idx_str}.mp4"
+            old_mp4 = src_layout.video_file(old_idx, camera_video_key(cam))
+            new_mp4 = dst_layout.video_file(new_idx, camera_video_key(cam))
             if old_mp4.exists():
-                shutil.copy2(old_mp4, new_mp4)
+                new_mp4.parent.mkdir(parents=True, exist_ok=True)
+                link_or_copy(old_mp4, new_mp4, args.link_mode)
 
     # === 保存更新后的 meta 文件 ===
     save_jsonl(dst_meta / "episodes.jsonl", [ep for ep, _ in filtered])
@@ -104,9 +102,14 @@ def main(args):
     info["total_episodes"] = len(filtered)
     info["total_videos"] = len(cam_list) * len(filtered)
     info["splits"]["train"] = "0:" + str(len(filtered))
+    dst_layout.update_info(info, len(filtered))
     with open(info_path_dst, 'w') as f:
         json.dump(info, f, indent=2)
 
+    # === episode_index 已重新编号，从 parquet 重新计算 episodes_stats.jsonl，并合并得到 stats.json ===
+    write_episodes_stats(dst_root)
+    write_stats_json(dst_root)
+
     print(f"\n✅ 清理和复制完成！共保留 {len(filtered)} 个 episodes，编号从 000000 开始。")
     print(f"📁 输出保存路径: {dst_root}")
     print("请再次检查删除后tasks.jsonl的映射是否正确")
@@ -119,6 +122,7 @@ if __name__ == "__main__":
     parser.add_argument("--remove_txt", type=str, required=True, help="Path to txt file containing episode IDs to remove")
     parser.add_argument("--cams", type=str, required=True, help="Comma-separated list of camera suffixes, e.g. 'front,wrist,side'")
     parser.add_argument("--modality_file_path", type=str, required=True, help="Path to modality.json file")
+    parser.add_argument("--link_mode", type=str, choices=LINK_MODES, default=DEFAULT_LINK_MODE, help=LINK_MODE_HELP)
     args = parser.parse_args()
     main(args)
 
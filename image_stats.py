@@ -0,0 +1,98 @@
+# image_stats.py
+
+import numpy as np
+
+from aggregate_stats import combine_moments
+
+# 与 LeRobot 的 compute_episode_stats 一致：每个 episode 采样 100~10000 帧（帧数的 0.75 次方），
+# 图像按整数步长降采样到长边约 150 像素，像素值归一化到 [0, 1]
+MIN_IMAGE_SAMPLES = 100
+MAX_IMAGE_SAMPLES = 10_000
+IMAGE_SAMPLES_POWER = 0.75
+IMAGE_STATS_SIZE = 150
+
+
+def estimate_num_samples(num_frames, max_samples=MAX_IMAGE_SAMPLES):
+    """帧数较少时全部采样，否则采样 num_frames ** 0.75 帧，限制在 [100, max_samples] 内。"""
+    min_samples = min(MIN_IMAGE_SAMPLES, num_frames)
+    return max(min_samples, min(int(num_frames ** IMAGE_SAMPLES_POWER), max_samples))
+
+
+def sample_frame_indices(num_frames, num_samples=None):
+    """在 [0, num_frames) 中均匀取 num_samples 个帧号（默认按 estimate_num_samples），返回升序去重后的数组。"""
+    if num_frames <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if num_samples is None:
+        num_samples = estimate_num_samples(num_frames)
+    num_samples = max(1, min(num_samples, num_frames))
+    return np.unique(np.round(np.linspace(0, num_frames - 1, num_samples)).astype(np.int64))
+
+
+class ChannelMoments:
+    """
+    按通道累积像素的 (样本数, 均值, M2) 以及最小 / 最大值。每帧先在帧内求矩，
+    再用 Chan 合并公式并入累计值，内存只与通道数有关。
+    """
+
+    def __init__(self, channels=3):
+        self.n = np.zeros(channels)
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+        self.min = np.full(channels, np.inf)
+        self.max = np.full(channels, -np.inf)
+        self.frames = 0
+
+    def update(self, image):
+        """image: (h, w, c)，取值 [0, 1]。"""
+        pixels = image.reshape(-1, image.shape[-1])
+        frame_mean = pixels.mean(axis=0)
+        frame_m2 = ((pixels - frame_mean) ** 2).sum(axis=0)
+        self.n, self.mean, self.m2 = combine_moments(
+            self.n, self.mean, self.m2, np.full_like(self.n, len(pixels)), frame_mean, frame_m2
+        )
+        self.min = np.minimum(self.min, pixels.min(axis=0))
+        self.max = np.maximum(self.max, pixels.max(axis=0))
+        self.frames += 1
+
+    def summary(self):
+        """episodes_stats.jsonl 中图像特征的格式：每个统计量形状为 (c, 1, 1)，count 为采样帧数。"""
+        if not self.frames:
+            return None
+        nested = lambda values: [[[float(v)]] for v in values]  # noqa: E731
+        return {
+            "min": nested(self.min),
+            "max": nested(self.max),
+            "mean": nested(self.mean),
+            "std": nested(np.sqrt(self.m2 / self.n)),
+            "count": [self.frames],
+        }
+
+
+def compute_video_stats(video_path, num_samples=None):
+    """
+    顺序解码视频，只对采样到的帧做 RGB 转换和统计，采到最后一个样本后立即停止解码。
+    返回 ChannelMoments.summary() 的结果；视频中没有帧时返回 None。
+    """
+    import av
+
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        num_frames = stream.frames
+        if not num_frames:
+            num_frames = sum(1 for packet in container.demux(stream) if packet.size)
+            container.seek(0)
+        indices = sample_frame_indices(num_frames, num_samples)
+        if not len(indices):
+            return None
+        wanted = set(indices.tolist())
+        last = int(indices[-1])
+        moments = ChannelMoments()
+        for frame_index, frame in enumerate(container.decode(stream)):
+            if frame_index in wanted:
+                image = frame.to_ndarray(format="rgb24")
+                step = max(1, max(image.shape[:2]) // IMAGE_STATS_SIZE)
+                moments.update(image[::step, ::step].astype(np.float64) / 255.0)
+            if frame_index >= last:
+                break
+    return moments.summary()
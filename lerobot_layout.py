@@ -0,0 +1,128 @@
+# lerobot_layout.py
+
+import json
+import math
+import re
+from pathlib import Path
+
+# 与 LeRobot v2.1 的默认值一致
+DEFAULT_CHUNKS_SIZE = 1000
+DEFAULT_DATA_PATH = "data/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.parquet"
+DEFAULT_VIDEO_PATH = "videos/chunk-{episode_chunk:03d}/{video_key}/episode_{episode_index:06d}.mp4"
+
+_FIELD_RE = re.compile(r"\{(\w+)(?::[^}]*)?\}")
+_FIELD_PATTERNS = {"episode_chunk": r"\d+", "episode_index": r"\d+", "video_key": r"[^/]+"}
+
+
+def camera_video_key(cam: str) -> str:
+    """'front' -> 'observation.images.front'；已经是完整 key 的保持不变。"""
+    return cam if cam.startswith("observation.") else f"observation.images.{cam}"
+
+
+def _template_glob(template: str) -> str:
+    """把路径模板中的每个占位符替换为 '*'，用于 glob。"""
+    return _FIELD_RE.sub("*", template)
+
+
+def _template_regex(template: str):
+    """把路径模板编译为带命名分组的正则，用于从相对路径中解析 episode_index / video_key。"""
+    pattern, pos = "", 0
+    for m in _FIELD_RE.finditer(template):
+        pattern += re.escape(template[pos:m.start()])
+        pattern += f"(?P<{m.group(1)}>{_FIELD_PATTERNS.get(m.group(1), '[^/]+')})"
+        pos = m.end()
+    pattern += re.escape(template[pos:])
+    return re.compile(pattern + "$")
+
+
+class DatasetLayout:
+    """
+    LeRobot 数据集的文件布局：按 info.json 中的 chunks_size、data_path、video_path 计算每个
+    episode 的 parquet / 视频路径。episode 被分配到 chunk-{episode_index // chunks_size}。
+    """
+
+    def __init__(self, root, chunks_size=DEFAULT_CHUNKS_SIZE, data_path=DEFAULT_DATA_PATH,
+                 video_path=DEFAULT_VIDEO_PATH, video_keys=None):
+        self.root = Path(root)
+        self.chunks_size = int(chunks_size) if chunks_size else DEFAULT_CHUNKS_SIZE
+        self.data_path = data_path or DEFAULT_DATA_PATH
+        self.video_path = video_path or DEFAULT_VIDEO_PATH
+        self.video_keys = list(video_keys or [])
+        self._data_re = _template_regex(self.data_path)
+        self._video_re = _template_regex(self.video_path)
+
+    @classmethod
+    def from_info(cls, root, info=None):
+        """从 root/meta/info.json（或已加载的 info dict）构建布局，缺失的字段使用 LeRobot 默认值。"""
+        root = Path(root)
+        if info is None:
+            info_path = root / "meta" / "info.json"
+            info = json.loads(info_path.read_text()) if info_path.exists() else {}
+        video_keys = [k for k, v in info.get("features", {}).items() if isinstance(v, dict) and v.get("dtype") == "video"]
+        return cls(root, info.get("chunks_size"), info.get("data_path"), info.get("video_path"), video_keys)
+
+    def with_root(self, root, chunks_size=None):
+        """同样的布局参数（可选地换一个 chunks_size），换一个根目录（例如复制/过滤后的目标数据集）。"""
+        return DatasetLayout(root, chunks_size or self.chunks_size, self.data_path, self.video_path, self.video_keys)
+
+    def episode_chunk(self, episode_index: int) -> int:
+        return episode_index // self.chunks_size
+
+    def total_chunks(self, total_episodes: int) -> int:
+        return math.ceil(total_episodes / self.chunks_size) if total_episodes > 0 else 0
+
+    def data_file(self, episode_index: int) -> Path:
+        return self.root / self.data_path.format(
+            episode_chunk=self.episode_chunk(episode_index), episode_index=episode_index
+        )
+
+    def video_file(self, episode_index: int, video_key: str) -> Path:
+        return self.root / self.video_path.format(
+            episode_chunk=self.episode_chunk(episode_index), episode_index=episode_index, video_key=video_key
+        )
+
+    def _iter_matches(self, template, regex):
+        for path in self.root.glob(_template_glob(template)):
+            m = regex.match(path.relative_to(self.root).as_posix())
+            if m:
+                yield m, path
+
+    def iter_data_files(self):
+        """按 episode_index 升序返回 [(episode_index, parquet 路径)]，覆盖所有 chunk。"""
+        files = [(int(m.group("episode_index")), path) for m, path in self._iter_matches(self.data_path, self._data_re)]
+        return sorted(files)
+
+    def iter_video_files(self, video_key=None):
+        """按 (episode_index, video_key) 升序返回 [(episode_index, video_key, 视频路径)]，覆盖所有 chunk。"""
+        files = []
+        for m, path in self._iter_matches(self.video_path, self._video_re):
+            key = m.groupdict().get("video_key")
+            if video_key is None or key == video_key:
+                files.append((int(m.group("episode_index")), key, path))
+        return sorted(files)
+
+    def discovered_video_keys(self):
+        """info.json 中声明的视频 key；没有声明时从磁盘上的视频目录推断。"""
+        if self.video_keys:
+            return list(self.video_keys)
+        return sorted({key for _, key, _ in self.iter_video_files() if key is not None})
+
+    def update_info(self, info: dict, total_episodes: int) -> dict:
+        """把布局参数和 total_chunks 写回 info dict（原地修改并返回）。"""
+        info["chunks_size"] = self.chunks_size
+        info["data_path"] = self.data_path
+        info["video_path"] = self.video_path
+        info["total_chunks"] = self.total_chunks(total_episodes)
+        return info
+
+    def remove_empty_chunk_dirs(self):
+        """删除重新编号后留下的空 chunk 目录（只删空目录）。"""
+        for template in (self.data_path, self.video_path):
+            # 从文件所在目录开始逐级向上，直到模板中第一个不含占位符的目录
+            parts = Path(template).parent.parts
+            for depth in range(len(parts), 0, -1):
+                if "{" not in "".join(parts[:depth]):
+                    break
+                for directory in sorted(self.root.glob(_template_glob("/".join(parts[:depth]))), reverse=True):
+                    if directory.is_dir() and not any(directory.iterdir()):
+                        directory.rmdir()
@@ -8,17 +8,39 @@
 import json
 import re
 import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from fractions import Fraction
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional
 
-import pandas as pd  # type: ignore
+import pyarrow as pa  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parquet_utils import (  # noqa: E402
+    DEFAULT_FOOTER_WORKERS, concat_parquet, count_parquet_rows, read_parquet_column_max, read_parquet_num_rows,
+    reindex_parquet, split_parquet,
+)
+from file_ops import DEFAULT_COPY_WORKERS, DEFAULT_LINK_MODE, BulkCopier, link_or_copy  # noqa: E402
+from lerobot_layout import DatasetLayout  # noqa: E402
+from video_remux import concat_videos, split_video  # noqa: E402
+from episode_stats import append_episodes_stats, write_episodes_stats  # noqa: E402
+from aggregate_stats import update_stats_json, write_stats_json  # noqa: E402
+from virtual_dataset import VIRTUAL_MANIFEST_FILE, load_virtual_manifest, task_remap_for_entry  # noqa: E402
 
 # --- Constants ---
 PAD = 6  # Padding for episode numbers (e.g., 000032)
-CHUNK_NAME_DEFAULT = "chunk-000"  # Default chunk name, primarily for CLI convenience
-MERGE_NUM_KEYS = ["total_episodes", "total_frames", "total_videos"]  # For merge_info
+MERGE_NUM_KEYS = ["total_episodes", "total_frames", "total_videos"]  # For merge_info, filled from the merge plan
 DELETE_STEM_RE = re.compile(r"^episode_(\d{6})$")
 DELETE_PATCH_KEYS = {"episode_index", "index"}  # For delete _patch
+DEFAULT_PARQUET_WORKERS = 8  # Threads rewriting Parquet files during merge
+# Consolidated layout: many episodes per Parquet file / per-camera mp4, located through the offset table
+CONSOLIDATED_DATA_PATH = "data/file-{file_index:03d}.parquet"
+CONSOLIDATED_VIDEO_PATH = "videos/{video_key}/file-{file_index:03d}.mp4"
+EPISODE_OFFSETS_FILE = "episode_offsets.jsonl"  # In meta/
+DEFAULT_EPISODES_PER_FILE = 500
 
 
 class DatasetManager:
@@ -62,15 +84,12 @@ class DatasetManager:
 
     # --- Utilities for MERGE ---
     @staticmethod
-    def _shift_any_positive_recursive(obj: Any, offset: int) -> Any:
-        """Recursively shifts integer values in a JSON-like object by a positive offset (for merging)."""
-        if isinstance(obj, int):
-            return obj + offset
-        if isinstance(obj, list):
-            return [DatasetManager._shift_any_positive_recursive(x, offset) for x in obj]
-        if isinstance(obj, dict):
-            return {k: DatasetManager._shift_any_positive_recursive(v, offset) for k, v in obj.items()}
-        return obj
+    def _warn_chunk_name_deprecated(chunk_name: Optional[str]) -> None:
+        if chunk_name is not None:
+            print(
+                f"Note: chunk_name='{chunk_name}' is deprecated and ignored; chunk directories are derived from "
+                "chunks_size/data_path/video_path in meta/info.json."
+            )
 
     # --- Utilities for DELETE ---
     @staticmethod
@@ -105,125 +124,136 @@ class DatasetManager:
     # ─────────────────────────────────── MERGE Operation ─────────────────────────────────── #
 
     def merge_datasets(
-        self, dataset_paths_str: str, output_dir: Path, chunk_name: str, verbose: bool = False
+        self,
+        dataset_paths_str: str,
+        output_dir: Path,
+        chunk_name: Optional[str] = None,
+        verbose: bool = False,
+        link_mode: str = DEFAULT_LINK_MODE,
+        copy_workers: int = DEFAULT_COPY_WORKERS,
+        chunks_size: Optional[int] = None,
+        parquet_workers: int = DEFAULT_PARQUET_WORKERS,
+        append: bool = False,
     ):
         """
         Merges multiple Lerobot datasets into a new output directory.
+        With `append`, `output_dir` must be an existing merged dataset: its info.json, episodes.jsonl
+        and tasks.jsonl give the starting episode/frame offsets and task table, only the new datasets'
+        episodes are written, and the metadata is updated in place (its layout and chunks_size are kept).
+        A planning pass first fixes every source's episode and frame offsets from Parquet footers
+        (cross-checked against episodes.jsonl), so the Parquet rewrites (`parquet_workers` threads)
+        and video copies of all datasets then run concurrently; the output is identical to a serial merge.
+        Source files are found in every chunk via each source's info.json; the output
+        uses the first source's path templates and `chunks_size` (or the first source's),
+        so renumbered episodes are re-assigned to chunk-{episode_index // chunks_size}.
+        Videos are placed with `link_mode` (see file_ops.link_or_copy), so a
+        hardlink/reflink merge on the same filesystem does not duplicate video bytes;
+        `copy_workers` threads transfer them concurrently.
+        `chunk_name` is deprecated and ignored.
         """
         dataset_paths = [Path(p.strip()) for p in dataset_paths_str.strip().split() if p.strip()]
         if not dataset_paths:
             print("No dataset paths provided for merging.")
             return
+        self._warn_chunk_name_deprecated(chunk_name)
 
         if verbose:
             print(f"Starting merge operation. Output directory: {output_dir}")
 
-        data_dst_dir = output_dir / "data" / chunk_name
+        src_layouts = [DatasetLayout.from_info(p) for p in dataset_paths]
         meta_dst_dir = output_dir / "meta"
-        video_dst_chunk_root = output_dir / "videos" / chunk_name
-
-        self.safe_mkdir(data_dst_dir)
+        base_info, existing_tasks = None, []
+        base_episode_offset, base_frame_offset = 0, 0
+        if append:
+            base = self._load_append_base(output_dir, dataset_paths, chunks_size)
+            if base is None:
+                return
+            base_info, existing_tasks, base_episode_offset, base_frame_offset = base
+            dst_layout = DatasetLayout.from_info(output_dir, base_info)
+            if verbose:
+                print(
+                    f"Appending after {base_episode_offset} episodes / {base_frame_offset} frames "
+                    f"({len(existing_tasks)} existing tasks)."
+                )
+        else:
+            dst_layout = src_layouts[0].with_root(output_dir, chunks_size)
         self.safe_mkdir(meta_dst_dir)
-        self.safe_mkdir(video_dst_chunk_root.parent)
-        self.safe_mkdir(video_dst_chunk_root)
+        if verbose:
+            print(f"Output chunks_size: {dst_layout.chunks_size}")
 
-        cumulative_episode_offset_parquets = 0
-        cumulative_frame_offset_parquets = 0
-        total_parquets_processed_overall = 0
-        actual_episode_counts_per_dataset = []
+        if verbose:
+            print("--- Building Global Task Table ---")
+        tasks, task_remaps = self._build_task_table_for_merge(dataset_paths, verbose, existing_tasks)
+        if verbose:
+            print(f"  {len(tasks)} distinct tasks across {len(dataset_paths)} datasets.")
 
         if verbose:
-            print("--- Processing Parquet Files and Determining Episode Counts ---")
-        for i, dataset_path in enumerate(dataset_paths):
-            if verbose:
-                print(f"Processing dataset {i + 1}/{len(dataset_paths)}: {dataset_path}")
-            current_dataset_frames = 0
-            info_path = dataset_path / "meta" / "info.json"
-            if info_path.exists():
-                try:
-                    info_data = json.loads(info_path.read_text())
-                    current_dataset_frames = info_data.get("total_frames", 0)
-                    if not isinstance(current_dataset_frames, int):
-                        current_dataset_frames = 0
-                except json.JSONDecodeError:
-                    current_dataset_frames = 0
-
-            processed_eps = self._copy_parquet_and_update_indices_for_merge(
-                dataset_path,
-                data_dst_dir,
-                chunk_name,
-                cumulative_episode_offset_parquets,
-                cumulative_frame_offset_parquets,
-                verbose,
-            )
-            if verbose:
-                print(f"  Processed {processed_eps} Parquet episode files from {dataset_path}.")
-            total_parquets_processed_overall += processed_eps
-            actual_episode_counts_per_dataset.append(processed_eps)
-            cumulative_episode_offset_parquets += processed_eps
-            cumulative_frame_offset_parquets += current_dataset_frames
+            print("--- Planning Episode and Frame Offsets ---")
+        plans = self._plan_merge(src_layouts, verbose, base_episode_offset, base_frame_offset)
+        actual_episode_counts_per_dataset = [len(plan["files"]) for plan in plans]
+        total_parquets_processed_overall = sum(actual_episode_counts_per_dataset)
 
         if verbose:
-            print("\n--- Processing Metadata Files ---")
-        self._merge_all_meta_files(dataset_paths, meta_dst_dir, actual_episode_counts_per_dataset, verbose)
+            print("\n--- Processing Parquet and Video Files ---")
+        with ThreadPoolExecutor(max_workers=max(1, parquet_workers)) as executor:
+            parquet_futures = [
+                executor.submit(
+                    self._rewrite_parquet_for_merge,
+                    src_file_path,
+                    dst_layout.data_file(original_episode_idx + plan["episode_offset"]),
+                    original_episode_idx + plan["episode_offset"],
+                    plan["frame_offset"],
+                    task_remaps[i],
+                    original_episode_idx,
+                )
+                for i, plan in enumerate(plans)
+                for original_episode_idx, src_file_path, _ in plan["files"]
+            ]
+            # Video submission blocks once the copier's queue is full; the Parquet rewrites keep running meanwhile
+            videos_placed = self._copy_all_videos_for_merge(
+                src_layouts, dst_layout, actual_episode_counts_per_dataset, verbose, link_mode, copy_workers,
+                base_episode_offset,
+            )
+            failed = sum(1 for future in parquet_futures if not future.result())
+        if verbose:
+            print(f"  Rewrote {total_parquets_processed_overall - failed}/{total_parquets_processed_overall} Parquet files.")
 
         if verbose:
-            print("\n--- Processing Video Files ---")
-        self._copy_all_videos_for_merge(
-            dataset_paths, video_dst_chunk_root, chunk_name, actual_episode_counts_per_dataset, verbose
+            print("\n--- Processing Metadata Files ---")
+        # Totals come from the plan (footer row counts) and the videos actually placed, not from source info.json
+        totals = {
+            "total_episodes": base_episode_offset + total_parquets_processed_overall,
+            "total_frames": base_frame_offset + sum(n for plan in plans for _, _, n in plan["files"]),
+            "total_videos": (base_info or {}).get("total_videos", 0) + videos_placed,
+        }
+        carried_stats = self._merge_all_meta_files(
+            dataset_paths, meta_dst_dir, actual_episode_counts_per_dataset, tasks, totals, verbose,
+            base_episode_offset, base_info,
         )
 
         final_info_path = meta_dst_dir / "info.json"
-        final_total_episodes = "N/A"
-
-        #===xzy modified for editing task index in parquet file 
-        
-        def load_jsonl(path):
-            with open(path, 'r') as f:
-                return [json.loads(l) for l in f if l.strip()]
-        taskname2taskid = {}
-        with open(meta_dst_dir / "tasks.jsonl", "r"):
-            tasks = load_jsonl(meta_dst_dir / "tasks.jsonl")
-            for task in tasks:
-                taskname2taskid[task["task"]] = task["task_index"]
-
-        with open(meta_dst_dir / "episodes.jsonl", "r"):
-            episodes = load_jsonl(meta_dst_dir / "episodes.jsonl") 
-        # import pdb; pdb.set_trace()
-        # episode2taskid = {ep["episode_index"]: taskname2taskid[ep["tasks"][0]] for ep in episodes}
-        episode2taskid = {}
-        for ep in episodes:
-            try:
-                episode2taskid[ep["episode_index"]] = taskname2taskid[ep["tasks"][0]]
-            except Exception as e:
-                print(e)
-                import pdb; pdb.set_trace()
-
-            
-        assert chunk_name == "chunk-000" 
-        src_chunk_dir = output_dir / "data" / chunk_name
-        assert src_chunk_dir.exists()
+        if final_info_path.exists():
+            merged_info = json.loads(final_info_path.read_text())
+            total_eps = merged_info.get("total_episodes", total_parquets_processed_overall)
+            dst_layout.update_info(merged_info, total_eps)
+            final_info_path.write_text(json.dumps(merged_info, indent=2))
 
-        src_files = self._natural_sort_paths(src_chunk_dir.glob("episode_*.parquet"))
-        if not src_files:
-            if verbose:
-                print(f"No Parquet files found in {src_chunk_dir}")
-            return 0
-        count_processed = 0
-        for src_file_path in src_files:
-            episode_idx = self._extract_idx_from_name(src_file_path.name)
+        final_total_episodes = "N/A"
 
-            try:
-                
-                df = pd.read_parquet(src_file_path)
-                df["task_index"] = episode2taskid[episode_idx]
+        if verbose:
+            print("\n--- Recomputing episodes_stats.jsonl and stats.json ---")
+        if append:
+            # Only the planned new episodes are computed; their records are appended and folded into stats.json
+            new_episodes = [
+                (ep + plan["episode_offset"], dst_layout.data_file(ep + plan["episode_offset"]))
+                for plan in plans for ep, _, _ in plan["files"]
+            ]
+            new_records = append_episodes_stats(output_dir, new_episodes, carried_stats)
+            update_stats_json(output_dir, new_records)
+        else:
+            write_episodes_stats(output_dir)
+            write_stats_json(output_dir)
 
-                df.to_parquet(src_file_path)
-                count_processed += 1
-            except Exception as e:
-                print(f"Error processing Parquet {src_file_path}: {e}")
-                
-        #===
         if final_info_path.exists():
             try:
                 final_info = json.loads(final_info_path.read_text())
@@ -239,226 +269,674 @@ class DatasetManager:
             f"  • Output directory: {output_dir}"
         )
 
-    def _copy_parquet_and_update_indices_for_merge(
-        self,
-        src_root: Path,
-        dst_data_dir: Path,
-        chunk_name: str,
-        episode_idx_offset: int,
-        frame_idx_offset: int,
-        verbose: bool,
-    ) -> int:
-        src_chunk_dir = src_root / "data" / chunk_name
-        if not src_chunk_dir.exists():
-            if verbose:
-                print(f"Source chunk directory not found: {src_chunk_dir}")
-            return 0
-        src_files = self._natural_sort_paths(src_chunk_dir.glob("episode_*.parquet"))
-        if not src_files:
-            if verbose:
-                print(f"No Parquet files found in {src_chunk_dir}")
-            return 0
-
-        count_processed = 0
-        for src_file_path in src_files:
-            original_episode_idx = self._extract_idx_from_name(src_file_path.name)
-            new_episode_global_idx = original_episode_idx + episode_idx_offset
-            dst_file_path = dst_data_dir / f"episode_{new_episode_global_idx:0{PAD}d}.parquet"
+    def _load_append_base(self, output_dir: Path, dataset_paths: List[Path], chunks_size: Optional[int]):
+        """
+        Reads the existing merged dataset that `merge --append` extends.
+        Returns (info, tasks, episode_offset, frame_offset), or None (after printing why) if it cannot be appended to.
+        """
+        info_path = output_dir / "meta" / "info.json"
+        if not info_path.exists():
+            print(f"Error: {info_path} not found; --append needs an existing merged dataset.")
+            return None
+        if any(p.resolve() == output_dir.resolve() for p in dataset_paths):
+            print("Error: the merged dataset cannot also be one of the datasets to append.")
+            return None
+        info = json.loads(info_path.read_text())
+        if "consolidated" in info:
+            print(f"Error: {output_dir} is consolidated; expand it before appending.")
+            return None
+        if chunks_size and chunks_size != info.get("chunks_size"):
+            print(f"Note: chunks_size={chunks_size} is ignored when appending; keeping {info.get('chunks_size')}.")
+        episodes = self.read_jsonl(output_dir / "meta" / "episodes.jsonl")
+        if episodes:
+            episode_offset = max(ep["episode_index"] for ep in episodes) + 1
+        else:
+            episode_offset = info.get("total_episodes", 0)
+        # The frame offset is the global index right after the last existing frame, read from the data itself
+        frame_offset = 0
+        if episode_offset:
+            last_file = DatasetLayout.from_info(output_dir, info).data_file(episode_offset - 1)
             try:
-                df = pd.read_parquet(src_file_path)
-                if "episode_index" in df.columns:
-                    df["episode_index"] = new_episode_global_idx
-                if "index" in df.columns:
-                    df["index"] = df["index"] + frame_idx_offset
-                if "frame_index" in df.columns:
-                    df["frame_index"] = df["frame_index"] + frame_idx_offset
-                df.to_parquet(dst_file_path)
-                count_processed += 1
+                last_index = read_parquet_column_max(last_file, "index")
             except Exception as e:
-                print(f"Error processing Parquet {src_file_path} to {dst_file_path}: {e}")
-                if dst_file_path.exists():
-                    dst_file_path.unlink(missing_ok=True)
-        return count_processed
+                print(f"Error: cannot read the global index of the last episode from {last_file}: {e}")
+                return None
+            frame_offset = last_index + 1 if last_index is not None else 0
+        if episodes:
+            expected = sum(ep.get("length", 0) for ep in episodes)
+            if expected != frame_offset:
+                print(
+                    f"Error: episodes.jsonl lists {expected} frames but the data ends at index {frame_offset - 1}; "
+                    f"refusing to append to an inconsistent dataset."
+                )
+                return None
+        return info, self.read_jsonl(output_dir / "meta" / "tasks.jsonl"), episode_offset, frame_offset
 
-    def _merge_all_meta_files(
-        self, dataset_paths: List[Path], meta_dst_dir: Path, actual_episode_counts: List[int], verbose: bool
+    def _build_task_table_for_merge(
+        self, dataset_paths: List[Path], verbose: bool, existing_tasks: Optional[List[Dict]] = None
     ):
-        current_meta_episode_offset = 0
-        ep_stats_out = meta_dst_dir / "episodes_stats.jsonl"
-        ep_out = meta_dst_dir / "episodes.jsonl"
-        tasks_out = meta_dst_dir / "tasks.jsonl"
-        info_out = meta_dst_dir / "info.json"
+        """
+        Builds the merged tasks.jsonl table and, for every source dataset, how its task_index
+        values map into it, from the meta/ files alone (no Parquet is read).
+        `existing_tasks` (when appending) keep their indices; other tasks are numbered in order of
+        first appearance (datasets in order, tasks.jsonl rows in order, then any task named only in episodes.jsonl).
+        Returns (tasks, remaps), where each remap is {"episodes": {src_episode_index: global_task_index},
+        "local": {src_task_index: global_task_index}}. "episodes" only holds episodes that name exactly one
+        task; the rows of multi-task episodes and of episodes without a `tasks` field are mapped through "local".
+        """
+        task_to_global: Dict[str, int] = {r["task"]: r["task_index"] for r in existing_tasks or []}
+        next_index = max(task_to_global.values(), default=-1) + 1
+
+        def global_index(name: str) -> int:
+            nonlocal next_index
+            if name not in task_to_global:
+                task_to_global[name] = next_index
+                next_index += 1
+            return task_to_global[name]
+
+        remaps = []
+        for dataset_path in dataset_paths:
+            src_meta_dir = dataset_path / "meta"
+            local_tasks = self.read_jsonl(src_meta_dir / "tasks.jsonl")
+            local = {r["task_index"]: global_index(r["task"]) for r in local_tasks}
+            local_names = {r["task"] for r in local_tasks}
+            single_task = local_tasks[0]["task"] if len(local_tasks) == 1 else None
+            episodes = {}
+            for ep in self.read_jsonl(src_meta_dir / "episodes.jsonl"):
+                names = ep.get("tasks") or ([single_task] if single_task is not None else [])
+                global_indices = [global_index(name) for name in names]
+                if len(global_indices) == 1:
+                    episodes[ep["episode_index"]] = global_indices[0]
+                elif len(global_indices) > 1:
+                    missing = [name for name in names if name not in local_names]
+                    if missing and verbose:
+                        print(
+                            f"  Warning: episode {ep['episode_index']} in {dataset_path} names tasks {missing} "
+                            "missing from its tasks.jsonl; their rows keep the source task_index."
+                        )
+                elif verbose:
+                    print(
+                        f"  Warning: episode {ep['episode_index']} in {dataset_path} names no task; "
+                        "its task_index is remapped through tasks.jsonl."
+                    )
+            remaps.append({"episodes": episodes, "local": local})
+        tasks = sorted(({"task": name, "task_index": idx} for name, idx in task_to_global.items()), key=lambda x: x["task_index"])
+        return tasks, remaps
 
-        for p in [ep_stats_out, ep_out, tasks_out, info_out]:
-            p.unlink(missing_ok=True)
+    def _plan_merge(
+        self, src_layouts: List[DatasetLayout], verbose: bool, episode_offset: int = 0, frame_offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Computes, before anything is written, each source's Parquet files and its exact episode and
+        frame offsets in the merged dataset. Frame counts come from Parquet footers (read concurrently),
+        not from info.json `total_frames`, which may be stale; episodes.jsonl `length` is only used
+        as a cross-check and as a fallback for unreadable files.
+        Returns one {"files": [(src_episode_index, path, num_rows)], "episode_offset", "frame_offset"} per source.
+        """
+        src_files = [layout.iter_data_files() for layout in src_layouts]
+        rows, _, errors = count_parquet_rows(
+            (path for files in src_files for _, path in files), max_workers=DEFAULT_FOOTER_WORKERS
+        )
 
-        for i, dataset_path in enumerate(dataset_paths):
-            src_meta_dir = dataset_path / "meta"
-            eps_in_this_ds_for_meta = actual_episode_counts[i]
-            if not src_meta_dir.exists():
-                if verbose:
-                    print(f"  Warning: Meta dir {src_meta_dir} not found.")
-                current_meta_episode_offset += eps_in_this_ds_for_meta
-                continue
+        plans = []
+        for layout, files in zip(src_layouts, src_files):
+            lengths = {ep["episode_index"]: ep.get("length") for ep in self.read_jsonl(layout.root / "meta" / "episodes.jsonl")}
+            planned = []
+            for ep_idx, path in files:
+                num_rows = rows.get(path)
+                if num_rows is None:
+                    num_rows = lengths.get(ep_idx) or 0
+                    print(f"  Warning: cannot read {path} ({errors.get(path)}); using episodes.jsonl length {num_rows}.")
+                elif ep_idx in lengths and lengths[ep_idx] != num_rows:
+                    print(f"  Warning: {path} has {num_rows} rows but episodes.jsonl says length={lengths[ep_idx]}.")
+                planned.append((ep_idx, path, num_rows))
+            if not files and verbose:
+                print(f"  No Parquet files found in {layout.root / 'data'}")
+            plans.append({"files": planned, "episode_offset": episode_offset, "frame_offset": frame_offset})
+            if verbose:
+                print(
+                    f"  {layout.root}: {len(planned)} episodes, episode offset {episode_offset}, frame offset {frame_offset}"
+                )
+            episode_offset += len(planned)
+            frame_offset += sum(num_rows for _, _, num_rows in planned)
+        return plans
 
-            # Merge episodes_stats.jsonl
-            src_ep_stats = src_meta_dir / "episodes_stats.jsonl"
-            if src_ep_stats.exists():
-                base_data = self.read_jsonl(ep_stats_out) if ep_stats_out.exists() else []
-                new_data = self.read_jsonl(src_ep_stats)
-                for r_new in new_data:
-                    r_new["episode_index"] += current_meta_episode_offset
-                    if "index" in r_new:  # often frame indices
-                        idx_val = r_new["index"]
-                        r_new["index"] = (
-                            [x + current_meta_episode_offset for x in idx_val]
-                            if isinstance(idx_val, list)
-                            else idx_val + current_meta_episode_offset
-                        )
-                    if "stats" in r_new:  # Shift indices inside stats dictionary
-                        r_new["stats"] = self._shift_any_positive_recursive(
-                            r_new["stats"], current_meta_episode_offset
-                        )
-                self.write_jsonl(base_data + new_data, ep_stats_out)
-
-            # Merge episodes.jsonl
-            src_ep = src_meta_dir / "episodes.jsonl"
-            if src_ep.exists():
-                base_data = self.read_jsonl(ep_out) if ep_out.exists() else []
-                new_data = self.read_jsonl(src_ep)
-                for r_new in new_data:  # Similar shifting as episodes_stats
-                    r_new["episode_index"] += current_meta_episode_offset
-                    if "index" in r_new:
-                        idx_val = r_new["index"]
-                        r_new["index"] = (
-                            [x + current_meta_episode_offset for x in idx_val]
-                            if isinstance(idx_val, list)
-                            else idx_val + current_meta_episode_offset
-                        )
-                self.write_jsonl(base_data + new_data, ep_out)
-
-            # Merge tasks.jsonl
-            src_tasks = src_meta_dir / "tasks.jsonl"
-            if src_tasks.exists():
-                base_tasks = self.read_jsonl(tasks_out) if tasks_out.exists() else []
-                new_tasks = self.read_jsonl(src_tasks)
-                existing_task_names = {r["task"]: r["task_index"] for r in base_tasks}
-                next_idx = max(existing_task_names.values()) + 1 if existing_task_names else 0
-                for r_new in new_tasks:
-                    if r_new["task"] not in existing_task_names:
-                        base_tasks.append({"task": r_new["task"], "task_index": next_idx})
-                        existing_task_names[r_new["task"]] = next_idx
-                        next_idx += 1
-                self.write_jsonl(sorted(base_tasks, key=lambda x: x["task_index"]), tasks_out)
-
-            # Merge info.json
-            src_info = src_meta_dir / "info.json"
-            if src_info.exists():
-                d_base = json.loads(info_out.read_text()) if info_out.exists() else {}
-                d_new = json.loads(src_info.read_text())
-                merged_info = d_base.copy()
-                for k in MERGE_NUM_KEYS:
-                    merged_info[k] = merged_info.get(k, 0) + d_new.get(k, 0)
-                for k, v in d_new.items():
-                    if k not in MERGE_NUM_KEYS and k != "splits" or k == "splits" and not d_base:
-                        merged_info[k] = v
+    def _rewrite_parquet_for_merge(
+        self,
+        src_file_path: Path,
+        dst_file_path: Path,
+        new_episode_global_idx: int,
+        frame_idx_offset: int,
+        task_remap: Dict[str, Dict[int, int]],
+        original_episode_idx: int,
+    ) -> bool:
+        """
+        Writes one source episode to its merged location exactly once, with episode_index,
+        index and task_index (via `task_remap`, see _build_task_table_for_merge) already correct.
+        """
+        try:
+            self.safe_mkdir(dst_file_path.parent)
+            set_columns = {"episode_index": new_episode_global_idx}
+            map_columns = {}
+            if original_episode_idx in task_remap["episodes"]:
+                set_columns["task_index"] = task_remap["episodes"][original_episode_idx]
+            else:
+                map_columns["task_index"] = task_remap["local"]
+            # frame_index is episode-local (0..n-1) and must not be shifted; only the global index is.
+            reindex_parquet(
+                src_file_path,
+                dst_file_path,
+                set_columns=set_columns,
+                shift_columns={"index": frame_idx_offset},
+                map_columns=map_columns,
+            )
+            return True
+        except Exception as e:
+            print(f"Error processing Parquet {src_file_path} to {dst_file_path}: {e}")
+            dst_file_path.unlink(missing_ok=True)
+            return False
+
+    @staticmethod
+    def _shift_meta_record_for_merge(record: Dict, off: int) -> Dict:
+        """Shifts episode_index (and a top-level `index`, if any) of an episodes/episodes_stats record."""
+        record["episode_index"] += off
+        if "index" in record:
+            idx_val = record["index"]
+            record["index"] = [x + off for x in idx_val] if isinstance(idx_val, list) else idx_val + off
+        return record
+
+    def _merge_all_meta_files(
+        self,
+        dataset_paths: List[Path],
+        meta_dst_dir: Path,
+        actual_episode_counts: List[int],
+        tasks: List[Dict],
+        totals: Dict[str, int],
+        verbose: bool,
+        episode_offset: int = 0,
+        base_info: Optional[Dict] = None,
+    ):
+        """
+        Streams every source's episodes.jsonl / episodes_stats.jsonl once, line by line, into
+        append-only temporary files; only info.json and the task table are held in memory.
+        All four outputs are moved into place together at the end, so an interrupted merge never
+        leaves a partially merged meta/ behind. Cost is linear in the total metadata size.
+        With `base_info` (append mode) the new episodes.jsonl records are appended to the existing file in
+        place instead (truncated back on failure), and episodes_stats.jsonl is left untouched: the shifted
+        source stats records are returned as {episode_index: stats} so that only the new episodes' stats
+        get appended once they are recomputed (see episode_stats.append_episodes_stats).
+        """
+        outputs = {
+            name: (meta_dst_dir / name, meta_dst_dir / f".{name}.tmp")
+            for name in ("episodes_stats.jsonl", "episodes.jsonl", "tasks.jsonl", "info.json")
+        }
+        appended_sizes = {}
+        carried_stats: Dict[int, Dict] = {}
+        if base_info is not None:
+            del outputs["episodes_stats.jsonl"]
+            final_path = outputs["episodes.jsonl"][0]
+            appended_sizes[final_path] = final_path.stat().st_size if final_path.exists() else 0
+            outputs["episodes.jsonl"] = (final_path, final_path)
+        merged_info: Dict[str, Any] = dict(base_info or {})
+        current_meta_episode_offset = episode_offset
+
+        mode = "a" if base_info is not None else "w"
+        try:
+            with ExitStack() as stack:
+                ep_f = stack.enter_context(outputs["episodes.jsonl"][1].open(mode))
+                ep_stats_f = None
+                if "episodes_stats.jsonl" in outputs:
+                    ep_stats_f = stack.enter_context(outputs["episodes_stats.jsonl"][1].open("w"))
+                for i, dataset_path in enumerate(dataset_paths):
+                    src_meta_dir = dataset_path / "meta"
+                    eps_in_this_ds_for_meta = actual_episode_counts[i]
+                    if not src_meta_dir.exists():
+                        if verbose:
+                            print(f"  Warning: Meta dir {src_meta_dir} not found.")
+                        current_meta_episode_offset += eps_in_this_ds_for_meta
+                        continue
+
+                    # episodes_stats.jsonl: numeric feature stats are recomputed from the merged
+                    # Parquet files at the end of the merge; only indices are shifted here.
+                    # episodes.jsonl gets the same shifting.
+                    for src_name, out_f in (("episodes_stats.jsonl", ep_stats_f), ("episodes.jsonl", ep_f)):
+                        src_path = src_meta_dir / src_name
+                        if not src_path.exists():
+                            continue
+                        with src_path.open() as src_f:
+                            for line in src_f:
+                                if line.strip():
+                                    record = self._shift_meta_record_for_merge(json.loads(line), current_meta_episode_offset)
+                                    if out_f is None:
+                                        carried_stats[record["episode_index"]] = record.get("stats", {})
+                                    else:
+                                        out_f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+                    # info.json: other keys are taken from the latest source; the counters come from `totals`
+                    src_info = src_meta_dir / "info.json"
+                    if src_info.exists():
+                        d_new = json.loads(src_info.read_text())
+                        is_first = not merged_info
+                        for k in MERGE_NUM_KEYS:
+                            merged_info[k] = totals[k]
+                        for k, v in d_new.items():
+                            if k not in MERGE_NUM_KEYS and k != "splits" or k == "splits" and is_first:
+                                merged_info[k] = v
+
+                    current_meta_episode_offset += eps_in_this_ds_for_meta
+
+            # The task table was built up front (see _build_task_table_for_merge)
+            self.write_jsonl(tasks, outputs["tasks.jsonl"][1])
+            if merged_info:
+                if "total_tasks" in merged_info:
+                    merged_info["total_tasks"] = len(tasks)
                 total_eps = merged_info.get("total_episodes", 0)
                 merged_info.setdefault("splits", {})["train"] = f"0:{total_eps - 1 if total_eps > 0 else 0}"
-                info_out.write_text(json.dumps(merged_info, indent=2))
-
-            current_meta_episode_offset += eps_in_this_ds_for_meta
+                outputs["info.json"][1].write_text(json.dumps(merged_info, indent=2))
+        except BaseException:
+            for final_path, tmp_path in outputs.values():
+                if final_path in appended_sizes:
+                    with final_path.open("r+b") as f:
+                        f.truncate(appended_sizes[final_path])
+                else:
+                    tmp_path.unlink(missing_ok=True)
+            raise
+
+        for final_path, tmp_path in outputs.values():
+            if final_path in appended_sizes:
+                continue
+            if tmp_path.exists():
+                tmp_path.replace(final_path)
+            else:
+                final_path.unlink(missing_ok=True)
+        return carried_stats
 
     def _copy_all_videos_for_merge(
         self,
-        dataset_paths: List[Path],
-        video_dst_chunk_root: Path,
-        chunk_name: str,
+        src_layouts: List[DatasetLayout],
+        dst_layout: DatasetLayout,
+        actual_episode_counts: List[int],
+        verbose: bool,
+        link_mode: str = DEFAULT_LINK_MODE,
+        copy_workers: int = DEFAULT_COPY_WORKERS,
+        episode_offset: int = 0,
+    ) -> int:
+        """Returns the number of videos placed (any failure raises when the copier exits)."""
+        with BulkCopier(copy_workers, link_mode, desc="merge videos") as copier:
+            return self._submit_all_videos_for_merge(
+                copier, src_layouts, dst_layout, actual_episode_counts, verbose, episode_offset,
+            )
+
+    def _submit_all_videos_for_merge(
+        self,
+        copier: BulkCopier,
+        src_layouts: List[DatasetLayout],
+        dst_layout: DatasetLayout,
         actual_episode_counts: List[int],
         verbose: bool,
+        episode_offset: int = 0,
     ):
-        current_video_start_idx = 0
-        for i, dataset_path in enumerate(dataset_paths):
-            src_video_root = dataset_path / "videos" / chunk_name
+        current_video_start_idx = episode_offset
+        created_dirs = set()
+        submitted = 0
+        for i, src_layout in enumerate(src_layouts):
             eps_in_this_ds = actual_episode_counts[i]
-            if not src_video_root.exists():
+            src_videos = src_layout.iter_video_files()
+            if not src_videos:
                 if verbose:
-                    print(f"  Video source dir not found: {src_video_root}")
+                    print(f"  No videos found in {src_layout.root / 'videos'}")
                 current_video_start_idx += eps_in_this_ds
                 continue
 
-            cam_dirs = sorted(p for p in src_video_root.iterdir() if p.is_dir())
-            if not cam_dirs:  # Videos directly under chunk root
-                vids_in_chunk = self._natural_sort_paths(src_video_root.glob("episode_*.mp4"))
-                for src_vid in vids_in_chunk:
-                    dst_idx = self._extract_idx_from_name(src_vid.name) + current_video_start_idx
-                    shutil.copy2(src_vid, video_dst_chunk_root / f"episode_{dst_idx:0{PAD}d}.mp4")
-            else:  # Videos in camera subdirectories
-                for cam_dir_path in cam_dirs:
-                    dst_cam_path = video_dst_chunk_root / cam_dir_path.name
-                    self.safe_mkdir(dst_cam_path)
-                    vids = self._natural_sort_paths(cam_dir_path.glob("episode_*.mp4"))
-                    for src_vid_path in vids:
-                        dst_idx = self._extract_idx_from_name(src_vid_path.name) + current_video_start_idx
-                        shutil.copy2(src_vid_path, dst_cam_path / f"episode_{dst_idx:0{PAD}d}.mp4")
+            for src_ep_idx, video_key, src_vid_path in src_videos:
+                dst_vid_path = dst_layout.video_file(src_ep_idx + current_video_start_idx, video_key)
+                if dst_vid_path.parent not in created_dirs:
+                    self.safe_mkdir(dst_vid_path.parent)
+                    created_dirs.add(dst_vid_path.parent)
+                copier.submit(src_vid_path, dst_vid_path)
+                submitted += 1
             if verbose:
-                print(f"  Copied videos from {dataset_path} with offset {current_video_start_idx}")
+                print(f"  Queued videos from {src_layout.root} with offset {current_video_start_idx}")
             current_video_start_idx += eps_in_this_ds
+        return submitted
+
+    # ─────────────────────────────────── VIRTUAL MERGE ──────────────────────────────────── #
+
+    def virtual_merge_datasets(
+        self,
+        dataset_paths_str: str,
+        output_dir: Path,
+        verbose: bool = False,
+        chunks_size: Optional[int] = None,
+    ):
+        """
+        Creates a "virtual merged dataset" without copying or rewriting any data: meta/ holds the
+        merged episodes.jsonl / episodes_stats.jsonl / tasks.jsonl / info.json (with "virtual": true),
+        meta/virtual_manifest.jsonl maps every global episode to its source files and offsets, and
+        data/ and videos/ are symlinks to the source files laid out as in a physical merge.
+        Videos can be used as-is; Parquet indices are only correct when read through
+        virtual_dataset.read_virtual_episode. materialize_dataset turns it into a physical copy.
+        Only metadata and Parquet footers are read, so creation takes seconds.
+        """
+        dataset_paths = [Path(p.strip()) for p in dataset_paths_str.strip().split() if p.strip()]
+        if not dataset_paths:
+            print("No dataset paths provided for merging.")
+            return
+        meta_dst_dir = output_dir / "meta"
+        if (meta_dst_dir / "info.json").exists():
+            print(f"Error: {output_dir} already contains a dataset.")
+            return
+
+        src_layouts = [DatasetLayout.from_info(p) for p in dataset_paths]
+        dst_layout = src_layouts[0].with_root(output_dir, chunks_size)
+        self.safe_mkdir(meta_dst_dir)
+        tasks, task_remaps = self._build_task_table_for_merge(dataset_paths, verbose)
+        plans = self._plan_merge(src_layouts, verbose)
+        counts = [len(plan["files"]) for plan in plans]
+
+        manifest = []
+        created_dirs = set()
+        for src_layout, plan, task_remap in zip(src_layouts, plans, task_remaps):
+            videos_by_episode: Dict[int, Dict[str, str]] = {}
+            for src_ep_idx, video_key, src_vid_path in src_layout.iter_video_files():
+                videos_by_episode.setdefault(src_ep_idx, {})[video_key] = str(src_vid_path.resolve())
+            for src_ep_idx, src_file_path, _ in plan["files"]:
+                ep_idx = src_ep_idx + plan["episode_offset"]
+                entry = {
+                    "episode_index": ep_idx,
+                    "root": str(src_layout.root.resolve()),
+                    "src_episode_index": src_ep_idx,
+                    "frame_offset": plan["frame_offset"],
+                    "data": str(src_file_path.resolve()),
+                    "videos": videos_by_episode.get(src_ep_idx, {}),
+                }
+                if src_ep_idx in task_remap["episodes"]:
+                    entry["task_index"] = task_remap["episodes"][src_ep_idx]
+                else:
+                    entry["task_index_map"] = task_remap["local"]
+                manifest.append(entry)
+
+                links = [(entry["data"], dst_layout.data_file(ep_idx))]
+                links += [(src, dst_layout.video_file(ep_idx, key)) for key, src in entry["videos"].items()]
+                for src, dst in links:
+                    if dst.parent not in created_dirs:
+                        self.safe_mkdir(dst.parent)
+                        created_dirs.add(dst.parent)
+                    link_or_copy(src, dst, "symlink")
+
+        totals = {
+            "total_episodes": len(manifest),
+            "total_frames": sum(n for plan in plans for _, _, n in plan["files"]),
+            "total_videos": sum(len(entry["videos"]) for entry in manifest),
+        }
+        self._merge_all_meta_files(dataset_paths, meta_dst_dir, counts, tasks, totals, verbose)
+        self.write_jsonl(manifest, meta_dst_dir / VIRTUAL_MANIFEST_FILE)
+        info_path = meta_dst_dir / "info.json"
+        merged_info = json.loads(info_path.read_text()) if info_path.exists() else {}
+        dst_layout.update_info(merged_info, merged_info.get("total_episodes", len(manifest)))
+        merged_info["virtual"] = True
+        info_path.write_text(json.dumps(merged_info, indent=2))
+        # Aggregated from the sources' episodes_stats; index columns are refreshed on materialize
+        write_stats_json(output_dir)
+
+        print(
+            "\n✅ Virtual merge finished!\n"
+            f"  • Episodes: {len(manifest)} from {len(dataset_paths)} datasets\n"
+            f"  • Manifest: {meta_dst_dir / VIRTUAL_MANIFEST_FILE}\n"
+            f"  • Output directory: {output_dir}"
+        )
+
+    def materialize_dataset(
+        self,
+        dataset_dir: Path,
+        verbose: bool = False,
+        link_mode: str = DEFAULT_LINK_MODE,
+        copy_workers: int = DEFAULT_COPY_WORKERS,
+        parquet_workers: int = DEFAULT_PARQUET_WORKERS,
+    ):
+        """
+        Turns a virtual merged dataset into a physical one in place: every Parquet symlink is
+        replaced by a rewritten file with merged indices, every video symlink by a file placed
+        with `link_mode`, and stats are recomputed. The "virtual" flag and the manifest are removed
+        only once everything succeeded, so a failed run can simply be repeated.
+        """
+        info_path = dataset_dir / "meta" / "info.json"
+        info = json.loads(info_path.read_text()) if info_path.exists() else {}
+        if not info.get("virtual"):
+            print(f"Error: {dataset_dir} is not a virtual merged dataset.")
+            return
+        manifest = load_virtual_manifest(dataset_dir)
+        layout = DatasetLayout.from_info(dataset_dir, info)
+
+        with ThreadPoolExecutor(max_workers=max(1, parquet_workers)) as executor:
+            parquet_futures = []
+            for ep_idx, entry in sorted(manifest.items()):
+                dst_file_path = layout.data_file(ep_idx)
+                dst_file_path.unlink(missing_ok=True)  # the symlink, never the source
+                parquet_futures.append(executor.submit(
+                    self._rewrite_parquet_for_merge,
+                    Path(entry["data"]),
+                    dst_file_path,
+                    ep_idx,
+                    entry["frame_offset"],
+                    task_remap_for_entry(entry),
+                    entry["src_episode_index"],
+                ))
+            with BulkCopier(copy_workers, link_mode, desc="materialize videos") as copier:
+                for ep_idx, entry in sorted(manifest.items()):
+                    for video_key, src in entry["videos"].items():
+                        copier.submit(src, layout.video_file(ep_idx, video_key))
+            failed = sum(1 for future in parquet_futures if not future.result())
+        if failed:
+            print(f"Error: {failed} Parquet files failed; {dataset_dir} is still virtual. Rerun materialize.")
+            return
+
+        if verbose:
+            print("\n--- Recomputing episodes_stats.jsonl and stats.json ---")
+        write_episodes_stats(dataset_dir)
+        write_stats_json(dataset_dir)
+        info = json.loads(info_path.read_text())
+        info.pop("virtual", None)
+        info_path.write_text(json.dumps(info, indent=2))
+        (dataset_dir / "meta" / VIRTUAL_MANIFEST_FILE).unlink(missing_ok=True)
+        print(f"\n✅ Materialized {len(manifest)} episodes in {dataset_dir}")
+
+    # ───────────────────────────────── CONSOLIDATE / EXPAND ───────────────────────────────── #
+
+    def consolidate_dataset(
+        self,
+        src_dir: Path,
+        output_dir: Path,
+        episodes_per_file: int = DEFAULT_EPISODES_PER_FILE,
+        verbose: bool = False,
+    ):
+        """
+        Packs a per-episode dataset into few large files: every `episodes_per_file`
+        episodes become one Parquet file and one mp4 per camera (stream copy, no
+        re-encoding). meta/episode_offsets.jsonl records, per episode, its row range in
+        the data file and its pts range in each video file; info.json gets a
+        "consolidated" section. Files are streamed one row group / packet at a time.
+        """
+        src_dir, output_dir = src_dir.resolve(), output_dir.resolve()
+        if src_dir == output_dir:
+            print("Error: output_dir must differ from the source dataset.")
+            return
+        info = json.loads((src_dir / "meta" / "info.json").read_text())
+        if "consolidated" in info:
+            print(f"Error: {src_dir} is already consolidated.")
+            return
+        layout = DatasetLayout.from_info(src_dir, info)
+        episodes = layout.iter_data_files()
+        if not episodes:
+            print(f"No Parquet files found in {src_dir / 'data'}")
+            return
+        video_keys = layout.discovered_video_keys()
+        meta_dst_dir = output_dir / "meta"
+        self.safe_mkdir(meta_dst_dir)
+
+        offsets = []
+        num_files = 0
+        for file_index, start in enumerate(range(0, len(episodes), episodes_per_file)):
+            group = episodes[start:start + episodes_per_file]
+            data_dst = output_dir / CONSOLIDATED_DATA_PATH.format(file_index=file_index)
+            self.safe_mkdir(data_dst.parent)
+            rows = concat_parquet([path for _, path in group], data_dst)
+
+            entries, row_start = [], 0
+            for (ep_idx, _), num_rows in zip(group, rows):
+                entries.append({
+                    "episode_index": ep_idx,
+                    "data": {"file_index": file_index, "row_start": row_start, "row_end": row_start + num_rows},
+                    "videos": {},
+                })
+                row_start += num_rows
+
+            for video_key in video_keys:
+                present = [(entry, layout.video_file(entry["episode_index"], video_key)) for entry in entries]
+                missing = [entry["episode_index"] for entry, path in present if not path.exists()]
+                if missing:
+                    print(f"  Warning: {video_key} has no video for episodes {missing}")
+                present = [(entry, path) for entry, path in present if path.exists()]
+                if not present:
+                    continue
+                video_dst = output_dir / CONSOLIDATED_VIDEO_PATH.format(file_index=file_index, video_key=video_key)
+                self.safe_mkdir(video_dst.parent)
+                segments = concat_videos([path for _, path in present], video_dst)
+                for (entry, _), segment in zip(present, segments):
+                    time_base = Fraction(segment["time_base"])
+                    entry["videos"][video_key] = {
+                        "file_index": file_index,
+                        **segment,
+                        "from_timestamp": float(segment["pts_start"] * time_base),
+                        "to_timestamp": float(segment["pts_end"] * time_base),
+                    }
+                num_files += 1
+
+            offsets.extend(entries)
+            num_files += 1
+            if verbose:
+                print(f"  File {file_index}: episodes {group[0][0]}..{group[-1][0]}, {row_start} rows")
+
+        self.write_jsonl(offsets, meta_dst_dir / EPISODE_OFFSETS_FILE)
+        for meta_file in (src_dir / "meta").iterdir():
+            if meta_file.is_file() and meta_file.name not in ("info.json", EPISODE_OFFSETS_FILE):
+                shutil.copy2(meta_file, meta_dst_dir / meta_file.name)
+        info["consolidated"] = {
+            "data_path": CONSOLIDATED_DATA_PATH,
+            "video_path": CONSOLIDATED_VIDEO_PATH,
+            "episode_offsets_path": f"meta/{EPISODE_OFFSETS_FILE}",
+            "episodes_per_file": episodes_per_file,
+            "total_files": file_index + 1,
+        }
+        (meta_dst_dir / "info.json").write_text(json.dumps(info, indent=2))
+
+        num_src_files = len(episodes) + len(layout.iter_video_files())
+        print(
+            "\n✅ Consolidation finished!\n"
+            f"  • Episodes: {len(episodes)} in {file_index + 1} data file(s)\n"
+            f"  • Data/video files: {num_src_files} -> {num_files}\n"
+            f"  • Output directory: {output_dir}"
+        )
+
+    def expand_dataset(self, src_dir: Path, output_dir: Path, verbose: bool = False):
+        """
+        Reverse of consolidate_dataset: restores one Parquet file and one mp4 per camera
+        per episode, laid out by the original chunks_size/data_path/video_path, with the
+        original packet timestamps. Each consolidated file is read sequentially once.
+        """
+        src_dir, output_dir = src_dir.resolve(), output_dir.resolve()
+        if src_dir == output_dir:
+            print("Error: output_dir must differ from the source dataset.")
+            return
+        info = json.loads((src_dir / "meta" / "info.json").read_text())
+        consolidated = info.pop("consolidated", None)
+        if not consolidated:
+            print(f"Error: {src_dir} is not a consolidated dataset (no 'consolidated' section in info.json).")
+            return
+        offsets = self.read_jsonl(src_dir / consolidated["episode_offsets_path"])
+        layout = DatasetLayout.from_info(output_dir, info)
+        meta_dst_dir = output_dir / "meta"
+        self.safe_mkdir(meta_dst_dir)
+
+        data_ranges: Dict[int, List] = {}
+        video_segments: Dict[tuple, List] = {}
+        for entry in offsets:
+            ep_idx, data = entry["episode_index"], entry["data"]
+            data_ranges.setdefault(data["file_index"], []).append(
+                (layout.data_file(ep_idx), data["row_start"], data["row_end"])
+            )
+            for video_key, video in entry.get("videos", {}).items():
+                video_segments.setdefault((video_key, video["file_index"]), []).append((
+                    layout.video_file(ep_idx, video_key),
+                    video["pts_start"], video["pts_end"], video["pts_shift"], video["time_base"],
+                ))
+
+        for file_index, ranges in sorted(data_ranges.items()):
+            if verbose:
+                print(f"  Splitting data file {file_index} into {len(ranges)} episodes")
+            split_parquet(src_dir / consolidated["data_path"].format(file_index=file_index), ranges)
+        for (video_key, file_index), segments in sorted(video_segments.items()):
+            if verbose:
+                print(f"  Splitting {video_key} file {file_index} into {len(segments)} episodes")
+            split_video(
+                src_dir / consolidated["video_path"].format(file_index=file_index, video_key=video_key), segments
+            )
+
+        for meta_file in (src_dir / "meta").iterdir():
+            if meta_file.is_file() and meta_file.name not in ("info.json", EPISODE_OFFSETS_FILE):
+                shutil.copy2(meta_file, meta_dst_dir / meta_file.name)
+        (meta_dst_dir / "info.json").write_text(json.dumps(info, indent=2))
+        print(
+            "\n✅ Expansion finished!\n"
+            f"  • Episodes restored: {len(offsets)}\n"
+            f"  • Output directory: {output_dir}"
+        )
 
     # ─────────────────────────────────── DELETE Operation ─────────────────────────────────── #
 
     def delete_episode_from_dataset(
-        self, ds_dir: Path, ep_id_to_delete: int, chunk_name: str, verbose: bool = False
+        self, ds_dir: Path, ep_id_to_delete: int, chunk_name: Optional[str] = None, verbose: bool = False
     ):
         """
         Deletes a specific episode from a dataset and renumbers subsequent episodes.
-        Modifies the dataset in-place.
+        Modifies the dataset in-place. Files are located in every chunk via the
+        templates in meta/info.json; renumbered episodes that cross a chunk boundary
+        move to the previous chunk. `chunk_name` is deprecated and ignored.
         """
         ds_dir = ds_dir.resolve()
         if not ds_dir.is_dir():
             print(f"Error: Dataset directory not found: {ds_dir}")
             return
+        self._warn_chunk_name_deprecated(chunk_name)
+        layout = DatasetLayout.from_info(ds_dir)
 
         if verbose:
             print(f"Starting delete operation for episode {ep_id_to_delete} in dataset: {ds_dir}")
-            print(f"Target chunk: {chunk_name}")
 
         tgt_stem_to_delete = f"episode_{ep_id_to_delete:0{PAD}d}"
         frames_removed_count = 0
         videos_removed_count = 0  # This will count 1 if any video for the episode is deleted.
 
         # --- 1. Delete physical files of the target episode ---
-        data_chunk_dir = ds_dir / "data" / chunk_name
-        tgt_parquet = data_chunk_dir / f"{tgt_stem_to_delete}.parquet"
+        tgt_parquet = layout.data_file(ep_id_to_delete)
         if tgt_parquet.exists():
             if verbose:
                 print(f"  Deleting Parquet: {tgt_parquet}")
             try:
-                df = pd.read_parquet(tgt_parquet)
-                frames_removed_count = len(df)
+                frames_removed_count, _ = read_parquet_num_rows(tgt_parquet)
             except Exception as e:
                 if verbose:
                     print(f"    Could not read parquet {tgt_parquet} to count frames: {e}")
             tgt_parquet.unlink()
 
-        video_chunk_dir = ds_dir / "videos" / chunk_name
         deleted_any_video_for_ep = False
-        if video_chunk_dir.exists():
-            camera_subdirs = [d for d in video_chunk_dir.iterdir() if d.is_dir()]
-            if camera_subdirs:
-                for cam_subdir in camera_subdirs:
-                    tgt_video_file = cam_subdir / f"{tgt_stem_to_delete}.mp4"
-                    if tgt_video_file.exists():
-                        if verbose:
-                            print(f"  Deleting video: {tgt_video_file}")
-                        tgt_video_file.unlink()
-                        deleted_any_video_for_ep = True
-            else:
-                tgt_video_file = video_chunk_dir / f"{tgt_stem_to_delete}.mp4"
-                if tgt_video_file.exists():
-                    if verbose:
-                        print(f"  Deleting video: {tgt_video_file}")
-                    tgt_video_file.unlink()
-                    deleted_any_video_for_ep = True
+        for video_key in layout.discovered_video_keys():
+            tgt_video_file = layout.video_file(ep_id_to_delete, video_key)
+            if tgt_video_file.exists():
+                if verbose:
+                    print(f"  Deleting video: {tgt_video_file}")
+                tgt_video_file.unlink()
+                deleted_any_video_for_ep = True
         if deleted_any_video_for_ep:
             videos_removed_count = 1  # Count as 1 episode's worth of videos removed
 
@@ -473,48 +951,24 @@ class DatasetManager:
                         shutil.rmtree(tgt_image_dir)
 
         # --- 2. Shift higher episode files and directories, and patch their content ---
-        if data_chunk_dir.exists():
-            all_parquets = sorted(
-                [
-                    p
-                    for p in data_chunk_dir.glob("episode_*.parquet")
-                    if self._ep_id_from_stem(p.stem) is not None
-                ],
-                key=lambda p: self._ep_id_from_stem(p.stem),  # type: ignore
-            )
-            for p_file in all_parquets:
-                ep_idx = self._ep_id_from_stem(p_file.stem)
-                if ep_idx is not None and ep_idx > ep_id_to_delete:
-                    new_idx = ep_idx - 1
-                    new_stem = f"episode_{new_idx:0{PAD}d}"
-                    new_file_path = p_file.with_name(new_stem + p_file.suffix)
-                    if verbose:
-                        print(f"  Renaming data {p_file.name} -> {new_file_path.name}")
-                    shutil.move(str(p_file), new_file_path)
-                    self._patch_parquet_for_delete(new_file_path, -1, verbose)
-
-        if video_chunk_dir.exists():
-            video_paths_to_process = []
-            camera_subdirs_for_rename = [d for d in video_chunk_dir.iterdir() if d.is_dir()]  # Re-check
-            if camera_subdirs_for_rename:
-                for cam_subdir in camera_subdirs_for_rename:
-                    video_paths_to_process.extend(list(cam_subdir.glob("episode_*.mp4")))
-            else:
-                video_paths_to_process.extend(list(video_chunk_dir.glob("episode_*.mp4")))
-
-            sorted_video_paths = sorted(
-                [p for p in video_paths_to_process if self._ep_id_from_stem(p.stem) is not None],
-                key=lambda p: self._ep_id_from_stem(p.stem),  # type: ignore
-            )
-            for v_file in sorted_video_paths:
-                ep_idx = self._ep_id_from_stem(v_file.stem)
-                if ep_idx is not None and ep_idx > ep_id_to_delete:
-                    new_idx = ep_idx - 1
-                    new_stem = f"episode_{new_idx:0{PAD}d}"
-                    new_file_path = v_file.with_name(new_stem + v_file.suffix)
-                    if verbose:
-                        print(f"  Renaming video {v_file.name} -> {new_file_path.name} in {v_file.parent}")
-                    shutil.move(str(v_file), new_file_path)
+        # Ascending order: the slot ep_idx - 1 has always been vacated before it is reused.
+        for ep_idx, p_file in layout.iter_data_files():
+            if ep_idx > ep_id_to_delete:
+                new_file_path = layout.data_file(ep_idx - 1)
+                self.safe_mkdir(new_file_path.parent)
+                if verbose:
+                    print(f"  Renaming data {p_file.relative_to(ds_dir)} -> {new_file_path.relative_to(ds_dir)}")
+                shutil.move(str(p_file), new_file_path)
+                self._patch_parquet_for_delete(new_file_path, -1, verbose)
+
+        for ep_idx, video_key, v_file in layout.iter_video_files():
+            if ep_idx > ep_id_to_delete:
+                new_file_path = layout.video_file(ep_idx - 1, video_key)
+                self.safe_mkdir(new_file_path.parent)
+                if verbose:
+                    print(f"  Renaming video {v_file.relative_to(ds_dir)} -> {new_file_path.relative_to(ds_dir)}")
+                shutil.move(str(v_file), new_file_path)
+        layout.remove_empty_chunk_dirs()
 
         if images_root_dir.exists():
             for cam_obs_dir in images_root_dir.iterdir():
@@ -578,6 +1032,8 @@ class DatasetManager:
 
                     except ValueError:
                         pass
+                if isinstance(meta_info.get("total_episodes"), int):
+                    layout.update_info(meta_info, meta_info["total_episodes"])
                 info_path.write_text(json.dumps(meta_info, indent=2))
             except Exception as e:
                 print(f"    Error updating {info_path.name}: {e}")
@@ -587,11 +1043,11 @@ class DatasetManager:
     def _patch_parquet_for_delete(self, path: Path, off: int, verbose: bool) -> int:
         """Patches 'episode_index' in a Parquet file by an offset."""
         try:
-            df = pd.read_parquet(path)
-            nrows = len(df)
-            if "episode_index" in df.columns and pd.api.types.is_integer_dtype(df["episode_index"]):
-                df["episode_index"] += off  # e.g., off = -1
-                df.to_parquet(path, index=False)
+            schema = pq.read_schema(path)
+            if "episode_index" in schema.names and pa.types.is_integer(schema.field("episode_index").type):
+                nrows, _ = reindex_parquet(path, shift_columns={"episode_index": off})  # e.g., off = -1
+            else:
+                nrows, _ = read_parquet_num_rows(path)
             return nrows
         except Exception as e:
             if verbose:
@@ -12,17 +12,37 @@ Example usage:
       --datasets "/path/to/datasetA /path/to/datasetB" \\
       --output_dir /path/to/merged_dataset
 
+  python dataset_tool_cli.py merge --append \\
+      --datasets "/path/to/datasetC" \\
+      --output_dir /path/to/merged_dataset
+
+  python dataset_tool_cli.py merge --virtual \\
+      --datasets "/path/to/datasetA /path/to/datasetB" \\
+      --output_dir /path/to/virtual_merged_dataset
+
+  python dataset_tool_cli.py materialize \\
+      --dataset_dir /path/to/virtual_merged_dataset
+
   python dataset_tool_cli.py delete \\
       --dataset_dir /path/to/dataset_to_modify \\
       --episode_id 32 \\
       --verbose
+
+  python dataset_tool_cli.py consolidate \\
+      --dataset_dir /path/to/dataset \\
+      --output_dir /path/to/consolidated_dataset
+
+  python dataset_tool_cli.py expand \\
+      --dataset_dir /path/to/consolidated_dataset \\
+      --output_dir /path/to/restored_dataset
 """
 
 import argparse
 from pathlib import Path
 
 # Import the manager class from the other file
-from dataset_manager import CHUNK_NAME_DEFAULT, DatasetManager
+from dataset_manager import DEFAULT_EPISODES_PER_FILE, DEFAULT_PARQUET_WORKERS, DatasetManager
+from file_ops import DEFAULT_COPY_WORKERS, DEFAULT_LINK_MODE, LINK_MODES
 
 
 def main_cli():
@@ -53,11 +73,56 @@ def main_cli():
     parser_merge.add_argument(
         "--output_dir", type=Path, required=True, help="Directory where the merged dataset will be saved."
     )
+    parser_merge.add_argument(
+        "--chunks_size",
+        type=int,
+        default=None,
+        help="Episodes per chunk directory in the output (default: chunks_size of the first dataset's info.json).",
+    )
     parser_merge.add_argument(
         "--chunk_name",
         type=str,
-        default=CHUNK_NAME_DEFAULT,
-        help=f"Name of the data chunk (default: {CHUNK_NAME_DEFAULT}).",
+        default=None,
+        help="Deprecated and ignored: chunk directories follow chunks_size/data_path/video_path in info.json.",
+    )
+    parser_merge.add_argument(
+        "--link_mode",
+        type=str,
+        choices=LINK_MODES,
+        default=DEFAULT_LINK_MODE,
+        help=(
+            f"How videos are placed in the output (default: {DEFAULT_LINK_MODE}). \n"
+            "hardlink/reflink fall back to copying across filesystems; auto tries reflink, then hardlink, then copy; \n"
+            "symlink points at the source files, which must then stay in place."
+        ),
+    )
+    parser_merge.add_argument(
+        "--copy_workers",
+        type=int,
+        default=DEFAULT_COPY_WORKERS,
+        help=f"Number of threads copying videos concurrently (default: {DEFAULT_COPY_WORKERS}).",
+    )
+    parser_merge.add_argument(
+        "--parquet_workers",
+        type=int,
+        default=DEFAULT_PARQUET_WORKERS,
+        help=f"Number of threads rewriting Parquet files concurrently (default: {DEFAULT_PARQUET_WORKERS}).",
+    )
+    parser_merge.add_argument(
+        "--append",
+        action="store_true",
+        help=(
+            "Append the datasets to the existing merged dataset in --output_dir: only the new episodes are written \n"
+            "and its metadata is updated in place (its chunks_size and path templates are kept)."
+        ),
+    )
+    parser_merge.add_argument(
+        "--virtual",
+        action="store_true",
+        help=(
+            "Create a virtual merged dataset: merged meta/, a manifest and symlinks to the source files, \n"
+            "without copying or rewriting data. Turn it into a physical copy with the materialize command."
+        ),
     )
     parser_merge.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output.")
 
@@ -80,18 +145,97 @@ def main_cli():
     parser_delete.add_argument(
         "--chunk_name",
         type=str,
-        default=CHUNK_NAME_DEFAULT,
-        help=f"Name of the data chunk (default: {CHUNK_NAME_DEFAULT}).",
+        default=None,
+        help="Deprecated and ignored: chunk directories follow chunks_size/data_path/video_path in info.json.",
     )
     parser_delete.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output.")
 
+    # --- Consolidate command ---
+    parser_consolidate = subparsers.add_parser(
+        "consolidate",
+        help="Pack episodes into a few large Parquet/mp4 files.",
+        description=(
+            "Packs many episodes into large Parquet files and per-camera mp4s (stream copy, no re-encoding), \n"
+            "and writes meta/episode_offsets.jsonl with each episode's row range and video pts range."
+        ),
+    )
+    parser_consolidate.add_argument("--dataset_dir", type=Path, required=True, help="Per-episode dataset to pack.")
+    parser_consolidate.add_argument(
+        "--output_dir", type=Path, required=True, help="Directory where the consolidated dataset will be saved."
+    )
+    parser_consolidate.add_argument(
+        "--episodes_per_file",
+        type=int,
+        default=DEFAULT_EPISODES_PER_FILE,
+        help=f"Episodes packed into each data file and each video file (default: {DEFAULT_EPISODES_PER_FILE}).",
+    )
+    parser_consolidate.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output.")
+
+    # --- Expand command ---
+    parser_expand = subparsers.add_parser(
+        "expand",
+        help="Restore the per-episode layout of a consolidated dataset.",
+        description="Splits a consolidated dataset back into one Parquet file and one mp4 per camera per episode.",
+    )
+    parser_expand.add_argument("--dataset_dir", type=Path, required=True, help="Consolidated dataset to expand.")
+    parser_expand.add_argument(
+        "--output_dir", type=Path, required=True, help="Directory where the per-episode dataset will be saved."
+    )
+    parser_expand.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output.")
+
+    # --- Materialize command ---
+    parser_materialize = subparsers.add_parser(
+        "materialize",
+        help="Turn a virtual merged dataset into a physical one.",
+        description=(
+            "Replaces the symlinks of a virtual merged dataset (merge --virtual) with real files, in place.\n"
+            "Parquet files are rewritten with merged indices; videos are placed with --link_mode."
+        ),
+    )
+    parser_materialize.add_argument("--dataset_dir", type=Path, required=True, help="Virtual merged dataset.")
+    parser_materialize.add_argument(
+        "--link_mode",
+        type=str,
+        choices=LINK_MODES,
+        default=DEFAULT_LINK_MODE,
+        help=f"How videos are placed (default: {DEFAULT_LINK_MODE}).",
+    )
+    parser_materialize.add_argument(
+        "--copy_workers",
+        type=int,
+        default=DEFAULT_COPY_WORKERS,
+        help=f"Number of threads copying videos concurrently (default: {DEFAULT_COPY_WORKERS}).",
+    )
+    parser_materialize.add_argument(
+        "--parquet_workers",
+        type=int,
+        default=DEFAULT_PARQUET_WORKERS,
+        help=f"Number of threads rewriting Parquet files concurrently (default: {DEFAULT_PARQUET_WORKERS}).",
+    )
+    parser_materialize.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output.")
+
     args = parser.parse_args()
     manager = DatasetManager()
 
-    if args.command == "merge":
-        manager.merge_datasets(args.datasets, args.output_dir, args.chunk_name, args.verbose)
+    if args.command == "merge" and args.virtual:
+        if args.append:
+            parser.error("--virtual cannot be combined with --append")
+        manager.virtual_merge_datasets(args.datasets, args.output_dir, args.verbose, args.chunks_size)
+    elif args.command == "merge":
+        manager.merge_datasets(
+            args.datasets, args.output_dir, args.chunk_name, args.verbose, args.link_mode, args.copy_workers,
+            args.chunks_size, args.parquet_workers, args.append,
+        )
     elif args.command == "delete":
         manager.delete_episode_from_dataset(args.dataset_dir, args.episode_id, args.chunk_name, args.verbose)
+    elif args.command == "materialize":
+        manager.materialize_dataset(
+            args.dataset_dir, args.verbose, args.link_mode, args.copy_workers, args.parquet_workers,
+        )
+    elif args.command == "consolidate":
+        manager.consolidate_dataset(args.dataset_dir, args.output_dir, args.episodes_per_file, args.verbose)
+    elif args.command == "expand":
+        manager.expand_dataset(args.dataset_dir, args.output_dir, args.verbose)
     else:
         parser.print_help()  # Should not be reached due to `required=True` on subparsers
 
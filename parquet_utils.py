@@ -0,0 +1,278 @@
+# parquet_utils.py
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+# 读取 footer 只是少量小 IO，主要开销是存储延迟，线程数可以大于 CPU 核数
+DEFAULT_FOOTER_WORKERS = 16
+
+
+def read_parquet_num_rows(parquet_path: Path):
+    """
+    只读取 Parquet footer 中的 num_rows，不解码任何列数据。
+    footer 无法解析时才回退为完整读取。返回 (行数, 是否使用了完整读取)。
+    """
+    try:
+        return pq.read_metadata(parquet_path).num_rows, False
+    except Exception:
+        import pandas as pd
+        return len(pd.read_parquet(parquet_path)), True
+
+
+def count_parquet_rows(parquet_paths, max_workers=DEFAULT_FOOTER_WORKERS):
+    """
+    用线程池并发读取多个 Parquet 文件的行数。
+    返回 (rows, fallbacks, errors)：rows 为 {path: 行数}，fallbacks 为回退到完整读取的路径列表，
+    errors 为 {path: 异常}（footer 与完整读取都失败的文件）。
+    """
+    parquet_paths = list(parquet_paths)
+    rows, fallbacks, errors = {}, [], {}
+    if not parquet_paths:
+        return rows, fallbacks, errors
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(parquet_paths))) as executor:
+        futures = {path: executor.submit(read_parquet_num_rows, path) for path in parquet_paths}
+        for path, future in futures.items():
+            try:
+                rows[path], used_fallback = future.result()
+                if used_fallback:
+                    fallbacks.append(path)
+            except Exception as e:
+                errors[path] = e
+    return rows, fallbacks, errors
+
+
+def read_parquet_column_max(parquet_path: Path, column: str):
+    """
+    优先用 footer 中各 row group 的列统计信息求某列（顶层标量列）的最大值，不解码数据；
+    任一 row group 缺少统计信息时才回退为只读取这一列。文件为空时返回 None。
+    """
+    parquet_file = pq.ParquetFile(parquet_path)
+    metadata = parquet_file.metadata
+    maxima = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        if row_group.num_rows == 0:
+            continue
+        stats = next(
+            (row_group.column(j).statistics for j in range(row_group.num_columns)
+             if row_group.column(j).path_in_schema == column),
+            None,
+        )
+        if stats is None or not stats.has_min_max:
+            import pyarrow.compute as pc
+            return pc.max(parquet_file.read(columns=[column]).column(0)).as_py()
+        maxima.append(stats.max)
+    return max(maxima) if maxima else None
+
+
+def remap_column(column, mapping):
+    """
+    按 {旧值: 新值} 向量化地逐值替换一列（pc.index_in + take），映射表中没有的值保持不变，类型与原列一致。
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not mapping:
+        return column
+    keys = pa.array(list(mapping.keys()), type=column.type)
+    values = pa.array(list(mapping.values()), type=column.type)
+    positions = pc.index_in(column, value_set=keys)
+    return pc.coalesce(pc.take(values, positions), column)
+
+
+def _column_compression(parquet_file):
+    """按叶子列路径还原源文件每一列的压缩方式，供 ParquetWriter 原样写回。"""
+    metadata = parquet_file.metadata
+    if metadata.num_row_groups == 0:
+        return "snappy"
+    row_group = metadata.row_group(0)
+    compression = {}
+    for i in range(row_group.num_columns):
+        column = row_group.column(i)
+        codec = column.compression.lower()
+        compression[column.path_in_schema] = "none" if codec == "uncompressed" else codec
+    return compression
+
+
+def reindex_parquet(src_path: Path, dst_path: Path = None, set_columns=None, shift_columns=None, map_columns=None):
+    """
+    按 row group 流式改写 Parquet 中的标量索引列，不经过 pandas。
+    - set_columns: {列名: 值}，整列替换为常量（如 episode_index、task_index）
+    - shift_columns: {列名: 偏移}，整列加上偏移（如 index）
+    - map_columns: {列名: {旧值: 新值}}，按映射表逐值替换（如把本数据集的 task_index 映射为全局编号），不在表中的值保持不变
+    其余列（action、observation.state 等 list 列）的 Arrow buffer 原样写回；
+    schema（含 pandas/huggingface 元数据）、每列的压缩方式和 row group 划分都与源文件保持一致。
+    dst_path 为空或与 src_path 相同时原地改写（先写临时文件再替换）。
+    返回 (行数, 源文件中不存在而被忽略的列名列表)。
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    src_path = Path(src_path)
+    dst_path = Path(dst_path) if dst_path is not None else src_path
+    set_columns = set_columns or {}
+    shift_columns = shift_columns or {}
+    map_columns = map_columns or {}
+
+    parquet_file = pq.ParquetFile(src_path)
+    schema = parquet_file.schema_arrow
+    missing = [name for name in list(set_columns) + list(shift_columns) + list(map_columns) if schema.get_field_index(name) < 0]
+
+    in_place = dst_path.resolve() == src_path.resolve()
+    out_path = dst_path.with_name(f".{dst_path.name}.tmp") if in_place else dst_path
+    num_rows = 0
+    try:
+        with pq.ParquetWriter(
+            out_path, schema,
+            compression=_column_compression(parquet_file),
+            version=parquet_file.metadata.format_version,
+        ) as writer:
+            for i in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(i)
+                for name, value in set_columns.items():
+                    idx = schema.get_field_index(name)
+                    if idx >= 0:
+                        field = schema.field(idx)
+                        values = np.full(table.num_rows, value, dtype=field.type.to_pandas_dtype())
+                        table = table.set_column(idx, field, pa.array(values, type=field.type))
+                for name, offset in shift_columns.items():
+                    idx = schema.get_field_index(name)
+                    if idx >= 0 and offset:
+                        field = schema.field(idx)
+                        shifted = pc.add(table.column(idx), pa.scalar(offset, type=field.type))
+                        table = table.set_column(idx, field, shifted)
+                for name, mapping in map_columns.items():
+                    idx = schema.get_field_index(name)
+                    if idx >= 0 and mapping:
+                        field = schema.field(idx)
+                        table = table.set_column(idx, field, remap_column(table.column(idx), mapping))
+                writer.write_table(table, row_group_size=max(table.num_rows, 1))
+                num_rows += table.num_rows
+        if in_place:
+            out_path.replace(dst_path)
+    except BaseException:
+        out_path.unlink(missing_ok=True)
+        raise
+    return num_rows, missing
+
+
+def _open_writer_like(parquet_file, dst_path: Path, schema=None):
+    """以 parquet_file 的 schema、每列压缩方式和格式版本新建一个 ParquetWriter。"""
+    return pq.ParquetWriter(
+        dst_path, schema if schema is not None else parquet_file.schema_arrow,
+        compression=_column_compression(parquet_file),
+        version=parquet_file.metadata.format_version,
+    )
+
+
+def _schema_for_rows(schema, num_rows):
+    """
+    schema 中的 pandas 元数据记录了写入时的 RangeIndex（如 stop=20），拼接或切分后已不再成立：
+    RangeIndex 按输出文件的行数重新生成；无法识别的 pandas 元数据直接去掉。其余元数据原样保留。
+    """
+    import json
+
+    metadata = dict(schema.metadata or {})
+    if b"pandas" not in metadata:
+        return schema
+    try:
+        pandas_meta = json.loads(metadata[b"pandas"])
+        for index in pandas_meta.get("index_columns", []):
+            if isinstance(index, dict) and index.get("kind") == "range":
+                index["stop"] = index.get("start", 0) + num_rows * index.get("step", 1)
+        metadata[b"pandas"] = json.dumps(pandas_meta).encode()
+    except (ValueError, TypeError, AttributeError):
+        del metadata[b"pandas"]
+    return schema.with_metadata(metadata)
+
+
+def concat_parquet(src_paths, dst_path: Path):
+    """
+    按 row group 流式地把多个 Parquet 文件首尾相接写成一个文件，不经过 pandas。
+    schema 与压缩方式取自第一个文件（pandas 的 RangeIndex 按总行数重新生成）；每个源 row group
+    原样成为一个输出 row group，因此任何 row group 都不会跨越两个源文件。返回每个源文件的行数列表。
+    """
+    import pyarrow as pa
+
+    src_paths = [Path(p) for p in src_paths]
+    if not src_paths:
+        raise ValueError("concat_parquet: 没有输入文件")
+    first = pq.ParquetFile(src_paths[0])
+    schema = first.schema_arrow
+    if schema.metadata and b"pandas" in schema.metadata:
+        total_rows = first.metadata.num_rows + sum(pq.read_metadata(p).num_rows for p in src_paths[1:])
+        schema = _schema_for_rows(schema, total_rows)
+    dst_path = Path(dst_path)
+    tmp_path = dst_path.with_name(f".{dst_path.name}.tmp")
+    rows = []
+    try:
+        with _open_writer_like(first, tmp_path, schema) as writer:
+            for src_path in src_paths:
+                parquet_file = first if src_path == src_paths[0] else pq.ParquetFile(src_path)
+                num_rows = 0
+                for i in range(parquet_file.num_row_groups):
+                    table = parquet_file.read_row_group(i)
+                    if not table.schema.equals(schema, check_metadata=False):
+                        table = table.cast(pa.schema(schema, metadata=table.schema.metadata))
+                    writer.write_table(table, row_group_size=max(table.num_rows, 1))
+                    num_rows += table.num_rows
+                rows.append(num_rows)
+        tmp_path.replace(dst_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return rows
+
+
+def split_parquet(src_path: Path, ranges):
+    """
+    concat_parquet 的逆操作：按 row group 顺序流式读取 src_path，把行区间切分到各自的文件。
+    ranges: [(dst_path, row_start, row_end)]，按 row_start 升序且互不重叠（左闭右开）。
+    同一时刻只保留一个 row group 和一个打开的 writer；pandas 的 RangeIndex 按每个区间的行数重新生成。
+    """
+    parquet_file = pq.ParquetFile(src_path)
+    ranges = sorted(ranges, key=lambda r: r[1])
+    writers = {}
+
+    def writer_for(index):
+        if index not in writers:
+            dst_path = Path(ranges[index][0])
+            dst_path.parent.mkdir(parents=True, exist_ok=True)
+            _, row_start, row_end = ranges[index]
+            schema = _schema_for_rows(parquet_file.schema_arrow, row_end - row_start)
+            writers[index] = _open_writer_like(parquet_file, dst_path, schema)
+        return writers[index]
+
+    def finish(index):
+        # 空区间也会产生一个只有 schema 的文件
+        writer_for(index).close()
+        del writers[index]
+
+    current, offset = 0, 0
+    try:
+        for i in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(i)
+            group_start, group_end = offset, offset + table.num_rows
+            offset = group_end
+            while current < len(ranges):
+                _, row_start, row_end = ranges[current]
+                lo, hi = max(row_start, group_start), min(row_end, group_end)
+                if lo < hi:
+                    part = table.slice(lo - group_start, hi - lo)
+                    writer_for(current).write_table(part, row_group_size=max(part.num_rows, 1))
+                if row_end > group_end:
+                    break  # 当前区间延续到下一个 row group
+                finish(current)
+                current += 1
+        for index in range(current, len(ranges)):
+            _, row_start, row_end = ranges[index]
+            if row_end > offset:
+                raise ValueError(f"{src_path} 只有 {offset} 行，不足以覆盖区间 {row_start}:{row_end}")
+            finish(index)
+    finally:
+        for writer in writers.values():
+            writer.close()
@@ -1,13 +1,20 @@
 # process_datasets_recursively.py
 
-import os
 import shutil
 import json
 import numpy as np
 import pandas as pd
 import argparse
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from dataset_discovery import find_datasets_in_search_dirs  # noqa: E402
+from lerobot_layout import DatasetLayout  # noqa: E402
+from episode_stats import write_episodes_stats  # noqa: E402
+from aggregate_stats import write_stats_json  # noqa: E402
+from file_ops import DEFAULT_COPY_WORKERS, DEFAULT_LINK_MODE, LINK_MODES, LINK_MODE_HELP, BulkCopier  # noqa: E402
+
 # ==============================================================================
 # --- 帮助函数 (来自 process.py) ---
 # ==============================================================================
@@ -33,17 +40,6 @@ def calc_terminated_flag(actions, threshold=5.0):
             break
     return flags
 
-def update_action_stats(stats, terminated_flags):
-    """
-    更新action统计信息，为新添加的终止标志维度添加统计数据。
-    """
-    arr = np.array(terminated_flags)
-    stats['min'].append(int(arr.min()) if arr.size > 0 else 0)
-    stats['max'].append(int(arr.max()) if arr.size > 0 else 0)
-    stats['mean'].append(float(arr.mean()) if arr.size > 0 else 0.0)
-    stats['std'].append(float(arr.std()) if arr.size > 0 else 0.0)
-    return stats
-
 def process_parquet_file(src, dst, threshold=5.0):
     """
     读取parquet文件，为action添加终止标志维度，并保存到新路径。
@@ -74,17 +70,6 @@ def process_parquet_file(src, dst, threshold=5.0):
     
     return terminated_flags
 
-def process_stats_line(line, terminated_flags):
-    """
-    处理单行episodes_stats.jsonl数据。
-    """
-    data = json.loads(line)
-    if 'action' in data.get('stats', {}):
-        stats = data['stats']['action']
-        if len(stats['min']) == 6:
-            update_action_stats(stats, terminated_flags)
-    return json.dumps(data, ensure_ascii=False)
-
 def update_info_json(src_file, dst_file):
     """
     读取info.json，更新action的shape和names，并保存到新路径。
@@ -131,27 +116,11 @@ def update_modality_json(src_file, dst_file):
 # --- 核心逻辑函数 (合并后的) ---
 # ==============================================================================
 
-def find_dataset_folders(base_path):
-    """
-    在指定的基础路径下递归查找所有的数据集文件夹。
-    一个“数据集文件夹”被定义为同时包含 'videos', 'meta', 和 'data' 这三个子文件夹的目录。
-    """
-    required_subdirs = {'videos', 'meta', 'data'}
-    dataset_paths = []
-    print(f"\n🔍 开始在 '{os.path.abspath(base_path)}' 中搜索数据集...\n")
-    for root, dirs, _ in os.walk(base_path):
-        dir_set = set(dirs)
-        if required_subdirs.issubset(dir_set):
-            dataset_path = Path(root)
-            dataset_paths.append(dataset_path)
-            print(f"  [✅ 找到!] -> {dataset_path}")
-            # 防止重复查找子目录中的数据集
-            dirs[:] = [d for d in dirs if d not in required_subdirs]
-    return dataset_paths
-
-def process_single_dataset(src_path: Path, dst_path: Path, threshold: float):
+def process_single_dataset(src_path: Path, dst_path: Path, threshold: float, link_mode: str = DEFAULT_LINK_MODE,
+                           copy_workers: int = DEFAULT_COPY_WORKERS):
     """
     对单个源数据集进行处理，并将结果保存到目标路径。
+    videos 文件夹不做修改，按 link_mode 复制或链接（见 file_ops.link_or_copy），由 copy_workers 个线程并发完成。
     """
     if not src_path.is_dir():
         print(f"    - ❌ 错误: 输入路径 {src_path} 不是一个有效的目录。")
@@ -160,22 +129,23 @@ def process_single_dataset(src_path: Path, dst_path: Path, threshold: float):
     # 1. 复制 videos 文件夹
     src_videos = src_path / 'videos'
     if src_videos.is_dir():
-        shutil.copytree(src_videos, dst_path / 'videos', dirs_exist_ok=True)
-        print("    - 'videos' 文件夹已复制。")
+        with BulkCopier(copy_workers, link_mode, desc="videos") as copier:
+            shutil.copytree(src_videos, dst_path / 'videos', dirs_exist_ok=True, copy_function=copier.copy_function)
+        print(f"    - 'videos' 文件夹已复制 (link mode: {link_mode})。")
 
-    # 2. 处理 data 文件夹
-    src_chunk_dir = src_path / 'data' / 'chunk-000'
-    dst_chunk_dir = dst_path / 'data' / 'chunk-000'
-    dst_chunk_dir.mkdir(parents=True, exist_ok=True)
+    # 2. 处理 data 文件夹（所有 chunk，episode 编号不变，因此目标路径与源路径的相对位置相同）
+    src_layout = DatasetLayout.from_info(src_path)
+    dst_layout = src_layout.with_root(dst_path)
     
     episode_flags = {}
-    if src_chunk_dir.is_dir():
+    data_files = src_layout.iter_data_files()
+    if data_files:
         print("    - 正在处理 parquet 文件...")
-        for parquet_file in sorted(src_chunk_dir.glob('episode_*.parquet')):
-            dst_file = dst_chunk_dir / parquet_file.name
+        for ep_idx, parquet_file in data_files:
+            dst_file = dst_layout.data_file(ep_idx)
+            dst_file.parent.mkdir(parents=True, exist_ok=True)
             flags = process_parquet_file(parquet_file, dst_file, threshold)
             if flags:
-                ep_idx = int(parquet_file.stem.split('_')[1])
                 episode_flags[ep_idx] = flags
         print("    - Parquet 文件处理完成。")
 
@@ -194,20 +164,15 @@ def process_single_dataset(src_path: Path, dst_path: Path, threshold: float):
         update_info_json(src_meta_dir / 'info.json', dst_meta_dir / 'info.json')
         update_modality_json(src_meta_dir / 'modality.json', dst_meta_dir / 'modality.json')
         
+        # 更新 episodes_stats.jsonl：action 多了一维，数值特征的统计值全部从新的 parquet 重新计算，
+        # 视频特征的统计值沿用源文件
         src_stats_file = src_meta_dir / 'episodes_stats.jsonl'
-        dst_stats_file = dst_meta_dir / 'episodes_stats.jsonl'
         if src_stats_file.exists():
             print("    - 正在更新 episodes_stats.jsonl...")
-            with open(src_stats_file, 'r', encoding='utf-8') as fin, open(dst_stats_file, 'w', encoding='utf-8') as fout:
-                for line in fin:
-                    data = json.loads(line)
-                    ep_idx = data.get('episode_index')
-                    if ep_idx is not None and ep_idx in episode_flags:
-                        new_line = process_stats_line(line, episode_flags[ep_idx])
-                        fout.write(new_line + '\n')
-                    else:
-                        fout.write(line)
-            print("    - episodes_stats.jsonl 更新完成。")
+            shutil.copy2(src_stats_file, dst_meta_dir / 'episodes_stats.jsonl')
+            write_episodes_stats(dst_path)
+            write_stats_json(dst_path)
+            print(f"    - episodes_stats.jsonl 更新完成（{len(episode_flags)} 个 episodes 添加了终止标志）。")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -230,21 +195,19 @@ def main():
         "--threshold", type=float, default=3.0,
         help="用于判断终止的 action 差异阈值。默认: 3.0"
     )
+    parser.add_argument(
+        "--link_mode", type=str, choices=LINK_MODES, default=DEFAULT_LINK_MODE,
+        help=LINK_MODE_HELP
+    )
+    parser.add_argument(
+        "--copy_workers", type=int, default=DEFAULT_COPY_WORKERS,
+        help=f"并发复制视频文件的线程数。默认: {DEFAULT_COPY_WORKERS}"
+    )
     
     args = parser.parse_args()
 
     # 查找所有数据集
-    search_dirs = [d.strip() for d in args.search_dirs.split(',')]
-    all_found_datasets = []
-    for directory in search_dirs:
-        search_path_pattern = Path(args.src_base_path) / directory
-        if '*' not in directory and '?' not in directory:
-            if search_path_pattern.is_dir():
-                all_found_datasets.extend(find_dataset_folders(search_path_pattern))
-        else:
-            for matching_dir in Path(args.src_base_path).glob(directory):
-                if matching_dir.is_dir():
-                    all_found_datasets.extend(find_dataset_folders(matching_dir))
+    all_found_datasets = find_datasets_in_search_dirs(args.src_base_path, args.search_dirs)
     
     if not all_found_datasets:
         print("\n❌ 未找到任何符合条件的数据集文件夹。请检查 --src_base_path 和 --search_dirs 参数。")
@@ -276,7 +239,7 @@ def main():
         print(f"    - [⚙️ 处理中] -> 输出到: {dst_dataset_path}")
         
         try:
-            process_single_dataset(src_dataset_path, dst_dataset_path, args.threshold)
+            process_single_dataset(src_dataset_path, dst_dataset_path, args.threshold, args.link_mode, args.copy_workers)
             processed_count += 1
             print(f"    - [✅ 完成]")
         except Exception as e:
@@ -3,8 +3,14 @@ import shutil
 import json
 import numpy as np
 import pandas as pd
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lerobot_layout import DatasetLayout  # noqa: E402
+from episode_stats import write_episodes_stats  # noqa: E402
+from aggregate_stats import write_stats_json  # noqa: E402
+
 # def calc_terminated_flag(actions, threshold=5.0):
 #     """
 #     从后向前计算终止标志。
@@ -49,17 +55,6 @@ def calc_terminated_flag(actions, threshold=5.0):
             break
     return flags
 
-def update_action_stats(stats, terminated_flags):
-    """
-    更新action统计信息，为新添加的终止标志维度添加统计数据。
-    """
-    arr = np.array(terminated_flags)
-    stats['min'].append(int(arr.min()) if arr.size > 0 else 0)
-    stats['max'].append(int(arr.max()) if arr.size > 0 else 0)
-    stats['mean'].append(float(arr.mean()) if arr.size > 0 else 0.0)
-    stats['std'].append(float(arr.std()) if arr.size > 0 else 0.0)
-    return stats
-
 def process_parquet_file(src, dst, threshold=5.0):
     """
     读取parquet文件，为action添加终止标志维度，并保存到新路径。
@@ -90,17 +85,6 @@ def process_parquet_file(src, dst, threshold=5.0):
     
     return terminated_flags
 
-def process_stats_line(line, terminated_flags):
-    """
-    处理单行episodes_stats.jsonl数据。
-    """
-    data = json.loads(line)
-    if 'action' in data.get('stats', {}):
-        stats = data['stats']['action']
-        if len(stats['min']) == 6:
-            update_action_stats(stats, terminated_flags)
-    return json.dumps(data, ensure_ascii=False)
-
 def update_info_json(src_file, dst_file):
     """
     读取info.json，更新action的shape和names，并保存到新路径。
@@ -167,19 +151,19 @@ def main(src_root, dst_root, threshold=5.0):
         shutil.copytree(src_videos, dst_path / 'videos', dirs_exist_ok=True)
         print("已复制 'videos' 文件夹。")
 
-    # 2. 处理 data/chunk-000
-    src_chunk_dir = src_path / 'data' / 'chunk-000'
-    dst_chunk_dir = dst_path / 'data' / 'chunk-000'
-    dst_chunk_dir.mkdir(parents=True, exist_ok=True)
+    # 2. 处理 data 下的所有 chunk
+    src_layout = DatasetLayout.from_info(src_path)
+    dst_layout = src_layout.with_root(dst_path)
     
     episode_flags = {}
-    if src_chunk_dir.is_dir():
+    data_files = src_layout.iter_data_files()
+    if data_files:
         print("正在处理 parquet 文件...")
-        for parquet_file in sorted(src_chunk_dir.glob('episode_*.parquet')):
-            dst_file = dst_chunk_dir / parquet_file.name
+        for ep_idx, parquet_file in data_files:
+            dst_file = dst_layout.data_file(ep_idx)
+            dst_file.parent.mkdir(parents=True, exist_ok=True)
             flags = process_parquet_file(parquet_file, dst_file, threshold)
             if flags:
-                ep_idx = int(parquet_file.stem.split('_')[1])
                 episode_flags[ep_idx] = flags
         print("Parquet 文件处理完成。")
 
@@ -200,21 +184,15 @@ def main(src_root, dst_root, threshold=5.0):
         # 更新 modality.json
         update_modality_json(src_meta_dir / 'modality.json', dst_meta_dir / 'modality.json')
 
-        # 更新 episodes_stats.jsonl
+        # 更新 episodes_stats.jsonl：action 多了一维，数值特征的统计值全部从新的 parquet 重新计算，
+        # 视频特征的统计值沿用源文件
         src_stats_file = src_meta_dir / 'episodes_stats.jsonl'
-        dst_stats_file = dst_meta_dir / 'episodes_stats.jsonl'
         if src_stats_file.exists():
             print("正在更新 episodes_stats.jsonl...")
-            with open(src_stats_file, 'r') as fin, open(dst_stats_file, 'w') as fout:
-                for line in fin:
-                    data = json.loads(line)
-                    ep_idx = data.get('episode_index')
-                    if ep_idx is not None and ep_idx in episode_flags:
-                        new_line = process_stats_line(line, episode_flags[ep_idx])
-                        fout.write(new_line + '\n')
-                    else:
-                        fout.write(line)
-            print("episodes_stats.jsonl 更新完成。")
+            shutil.copy2(src_stats_file, dst_meta_dir / 'episodes_stats.jsonl')
+            write_episodes_stats(dst_path)
+            write_stats_json(dst_path)
+            print(f"episodes_stats.jsonl 更新完成（{len(episode_flags)} 个 episodes 添加了终止标志）。")
 
     print(f"\n处理完成！输出路径：{dst_root}")
 
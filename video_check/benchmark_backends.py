@@ -0,0 +1,88 @@
+import os
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from validate_videos import DECODE_BACKENDS, DEFAULT_EXTENSIONS, current_rss_mb, find_video_files, validate_single_video
+
+# Modules each backend has to import before it can decode anything.
+BACKEND_IMPORTS = {"pyav": "import av", "torchvision": "import av, torch, torchvision"}
+
+STARTUP_SNIPPET = """
+import json, os, time
+t0 = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - t0
+with open("/proc/self/statm") as f:
+    rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+print(json.dumps({{"import_s": elapsed, "rss_mb": rss_mb}}))
+"""
+
+
+def measure_startup(backend, repeats):
+    """Import time and RSS after import, each measured in a fresh interpreter (best of `repeats`)."""
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SNIPPET.format(imports=BACKEND_IMPORTS[backend])],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"}
+        runs.append(json.loads(result.stdout))
+    return {"import_s": min(r["import_s"] for r in runs), "rss_mb": min(r["rss_mb"] for r in runs)}
+
+
+def measure_throughput(backend, video_paths):
+    """Decodes every file once with validate_single_video and reports frames/s and seconds per file."""
+    frames = errors = 0
+    start_rss = current_rss_mb()
+    t0 = time.perf_counter()
+    for video_path in video_paths:
+        _, error, diagnostics = validate_single_video(video_path, backend)
+        frames += diagnostics["frames"]
+        errors += error is not None
+    elapsed = time.perf_counter() - t0
+    return {
+        "files": len(video_paths),
+        "frames": frames,
+        "errors": errors,
+        "seconds": elapsed,
+        "frames_per_s": frames / elapsed if elapsed > 0 else 0.0,
+        "s_per_file": elapsed / len(video_paths) if video_paths else 0.0,
+        "rss_growth_mb": current_rss_mb() - start_rss,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare startup cost and full-decode throughput of the validation backends.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("video_directory", type=str, help="Directory searched recursively for sample videos.")
+    parser.add_argument("--limit", type=int, default=20, help="Number of videos to decode per backend (default: 20).")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh-interpreter runs for the startup measurement (default: 3).")
+    parser.add_argument("--backends", nargs='+', default=sorted(DECODE_BACKENDS), choices=sorted(DECODE_BACKENDS))
+    args = parser.parse_args()
+
+    video_paths = sorted(find_video_files(args.video_directory, DEFAULT_EXTENSIONS))[:args.limit]
+    if not video_paths:
+        print(f"No video files found in {args.video_directory}.")
+        sys.exit(1)
+
+    print(f"Benchmarking {', '.join(args.backends)} on {len(video_paths)} file(s) from {os.path.abspath(args.video_directory)}\n")
+    print(f"{'backend':<12} {'import (s)':>10} {'RSS (MiB)':>10} {'frames/s':>10} {'s/file':>8} {'errors':>7}")
+    for backend in args.backends:
+        startup = measure_startup(backend, args.repeats)
+        if "error" in startup:
+            print(f"{backend:<12} unavailable: {startup['error']}")
+            continue
+        # Warm up once so the first file does not pay one-off codec initialisation.
+        validate_single_video(video_paths[0], backend)
+        throughput = measure_throughput(backend, video_paths)
+        print(
+            f"{backend:<12} {startup['import_s']:>10.2f} {startup['rss_mb']:>10.1f} "
+            f"{throughput['frames_per_s']:>10.1f} {throughput['s_per_file']:>8.3f} {throughput['errors']:>7}"
+        )
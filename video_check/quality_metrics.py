@@ -0,0 +1,101 @@
+import numpy as np
+
+# Frames are block-averaged by an integer factor down to about this width (never upscaled)
+# before any metric is computed, identically for every backend.
+QUALITY_WIDTH = 128
+# A frame whose mean luma (0-255) is below this counts as black.
+BLACK_LUMA = 16.0
+# Mean absolute luma difference to the previous frame below which a frame counts as frozen.
+FROZEN_DIFF = 0.5
+
+# Keys of the threshold dict accepted by flag_quality().
+QUALITY_THRESHOLDS = ("min_mean_luma", "max_black_fraction", "max_frozen_fraction", "min_sharpness")
+
+
+def downsample_gray(gray, width=QUALITY_WIDTH):
+    """
+    Averages `factor` x `factor` blocks, with the integer factor chosen so the result is at least
+    `width` wide; frames already narrower than twice `width` are returned unchanged.
+    """
+    factor = max(1, gray.shape[1] // width)
+    if factor == 1:
+        return gray
+    h, w = gray.shape[0] // factor * factor, gray.shape[1] // factor * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3), dtype=np.float32)
+
+
+def pyav_gray(frame, width=QUALITY_WIDTH):
+    """Downsampled luma plane of a PyAV VideoFrame; only the gray plane is converted, full-size RGB is never built."""
+    return downsample_gray(frame.reformat(format="gray").to_ndarray().astype(np.float32), width)
+
+
+def tensor_gray(data, width=QUALITY_WIDTH):
+    """Downsampled luma of a CHW uint8 RGB tensor as produced by torchvision.io.VideoReader."""
+    rgb = data.numpy().astype(np.float32)
+    return downsample_gray(0.299 * rgb[0] + 0.587 * rgb[1] + 0.114 * rgb[2], width)
+
+
+def laplacian_variance(gray):
+    """Variance of the 4-neighbour Laplacian; low values mean little high-frequency detail (blur)."""
+    lap = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]) - 4.0 * gray[1:-1, 1:-1]
+    return float(lap.var())
+
+
+class QualityAccumulator:
+    """
+    Running per-frame quality metrics fed with downsampled luma frames in
+    decode order. Keeps the previous frame plus three per-frame float lists
+    (mean luma, difference to the previous frame and Laplacian variance).
+    """
+
+    def __init__(self):
+        self.previous = None
+        self.luma = []
+        self.diffs = []
+        self.sharpness = []
+
+    def update(self, gray):
+        self.luma.append(float(gray.mean()))
+        self.sharpness.append(laplacian_variance(gray))
+        if self.previous is not None and self.previous.shape == gray.shape:
+            self.diffs.append(float(np.abs(gray - self.previous).mean()))
+        self.previous = gray
+
+    def summary(self):
+        """Per-video summary that is stored in the diagnostics and the metrics sidecar."""
+        if not self.luma:
+            return None
+        luma = np.asarray(self.luma)
+        diffs = np.asarray(self.diffs)
+        frozen = diffs < FROZEN_DIFF
+        longest_frozen = 0
+        if frozen.any():
+            # Length of the longest run of consecutive frozen frames.
+            edges = np.diff(np.concatenate(([0], frozen.astype(np.int8), [0])))
+            longest_frozen = int((np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)).max())
+        return {
+            "frames": len(luma),
+            "mean_luma": round(float(luma.mean()), 3),
+            "min_luma": round(float(luma.min()), 3),
+            "black_fraction": round(float((luma < BLACK_LUMA).mean()), 4),
+            "mean_frame_diff": round(float(diffs.mean()), 4) if diffs.size else 0.0,
+            "frozen_fraction": round(float(frozen.mean()), 4) if diffs.size else 0.0,
+            "longest_frozen_run": longest_frozen,
+            "median_sharpness": round(float(np.median(self.sharpness)), 3),
+        }
+
+
+def flag_quality(summary, thresholds):
+    """Returns the reasons why a video summary violates `thresholds` (None values are ignored)."""
+    if not summary:
+        return []
+    reasons = []
+    if thresholds.get("min_mean_luma") is not None and summary["mean_luma"] < thresholds["min_mean_luma"]:
+        reasons.append(f"dark: mean luma {summary['mean_luma']} < {thresholds['min_mean_luma']}")
+    if thresholds.get("max_black_fraction") is not None and summary["black_fraction"] > thresholds["max_black_fraction"]:
+        reasons.append(f"black frames: {summary['black_fraction']:.1%} > {thresholds['max_black_fraction']:.1%}")
+    if thresholds.get("max_frozen_fraction") is not None and summary["frozen_fraction"] > thresholds["max_frozen_fraction"]:
+        reasons.append(f"frozen: {summary['frozen_fraction']:.1%} > {thresholds['max_frozen_fraction']:.1%}")
+    if thresholds.get("min_sharpness") is not None and summary["median_sharpness"] < thresholds["min_sharpness"]:
+        reasons.append(f"blurred: median Laplacian variance {summary['median_sharpness']} < {thresholds['min_sharpness']}")
+    return reasons
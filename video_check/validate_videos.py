@@ -1,9 +1,11 @@
 import os
 import argparse
-import torchvision
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import av
 from tqdm import tqdm
-import torch
+
+from validation_cache import DEFAULT_CACHE_PATH, ValidationCache
 
 def find_video_files(directory, extensions):
     """Recursively finds all video files in a directory with given extensions."""
@@ -14,99 +16,381 @@ def find_video_files(directory, extensions):
                 video_files.append(os.path.join(root, file))
     return video_files
 
-def validate_videos_with_seek(directory, extensions):
+# Sample the resident set size every this many decoded frames.
+RSS_SAMPLE_EVERY = 32
+
+# Bump whenever the validation logic changes so cached verdicts are re-checked.
+VALIDATOR_VERSION = "tiered-1"
+
+# Validation tiers, from cheapest to most expensive.
+TIER_PROBE = 0       # container/header probe only
+TIER_SPOT_CHECK = 1  # demux all packets, decode keyframes, seek to start/middle/90%
+TIER_FULL = 2        # decode every frame
+DEFAULT_TIER = TIER_FULL
+# Containers whose top-level box structure must include a 'moov' atom.
+ISO_BMFF_EXTENSIONS = ('.mp4', '.mov', '.m4v')
+# Relative mismatch between packet count and expected frame count that makes a file suspicious.
+FRAME_COUNT_TOLERANCE = 0.02
+DEFAULT_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+# Per-episode quality metrics written next to the dataset
+QUALITY_METRICS_FILE = "video_quality_metrics.jsonl"
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MiB (0.0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        # Non-Linux fallback: lifetime peak, reported in KiB on Linux and bytes on macOS.
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def has_moov_atom(video_path):
+    """Walks the top-level ISO-BMFF boxes and reports whether a 'moov' box is present."""
+    file_size = os.path.getsize(video_path)
+    offset = 0
+    with open(video_path, "rb") as f:
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            box_size = int.from_bytes(header[:4], "big")
+            box_type = header[4:8]
+            if box_type == b"moov":
+                return True
+            if box_size == 1:  # 64-bit largesize follows the type
+                box_size = int.from_bytes(header[8:16], "big")
+            elif box_size == 0:  # box extends to end of file
+                return False
+            if box_size < 8:
+                return False
+            offset += box_size
+    return False
+
+
+def probe_video(video_path):
     """
-    Validates video files by mimicking a seek-and-read pattern, which is more
-    robust for finding corruption related to non-sequential access.
+    Tier 0: checks the container without decoding anything. Returns
+    (error_message, info) where info holds duration (s), fps and the frame
+    count advertised by the stream header.
     """
-    # 1. Set the video backend to be consistent with your training code.
+    if os.path.getsize(video_path) == 0:
+        return "ValueError: File size is 0 bytes.", {}
+    if video_path.lower().endswith(ISO_BMFF_EXTENSIONS) and not has_moov_atom(video_path):
+        return "ValueError: 'moov' atom not found (truncated or unfinalized recording).", {}
     try:
-        torchvision.set_video_backend("pyav")
+        with av.open(video_path) as container:
+            if not container.streams.video:
+                return "ValueError: No video stream found.", {}
+            stream = container.streams.video[0]
+            if stream.duration is not None and stream.time_base is not None:
+                duration = float(stream.duration * stream.time_base)
+            elif container.duration is not None:
+                duration = container.duration / av.time_base
+            else:
+                duration = 0.0
+            info = {
+                "duration": duration,
+                "fps": float(stream.average_rate) if stream.average_rate else None,
+                "frames": stream.frames,
+            }
     except Exception as e:
-        print(f"Warning: Could not set torchvision backend to 'pyav'. It might not be available. Error: {e}")
+        return f"{type(e).__name__}: {e}", {}
+    if info["duration"] <= 0:
+        return "ValueError: Stream duration is missing or not positive.", info
+    return None, info
 
-    print(f"Scanning for video files in: {directory}")
-    print(f"Looking for extensions: {', '.join(extensions)}")
 
-    video_paths = find_video_files(directory, extensions)
-    
-    if not video_paths:
-        print("No video files found. Exiting.")
-        return
+def spot_check_video(video_path, info):
+    """
+    Tier 1: demuxes every packet, decodes keyframes only, then seeks to the
+    start, middle and 90% mark and decodes one frame after each seek. Returns
+    (error_message, suspicious_reason); a suspicious file gets a full decode.
+    """
+    suspicious = None
+    try:
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            stream.codec_context.skip_frame = "NONKEY"
+            packets = keyframes = decoded_keyframes = corrupt = 0
+            last_dts = None
+            for packet in container.demux(stream):
+                if packet.size:
+                    packets += 1
+                    keyframes += int(packet.is_keyframe)
+                    corrupt += int(packet.is_corrupt)
+                    if packet.dts is not None:
+                        if last_dts is not None and packet.dts <= last_dts:
+                            suspicious = suspicious or "Packet DTS is not strictly increasing."
+                        last_dts = packet.dts
+                decoded_keyframes += len(packet.decode())
+            if packets == 0:
+                return "ValueError: No video packets found.", None
+            if keyframes == 0 or decoded_keyframes == 0:
+                return "ValueError: No decodable keyframe found.", None
+            if corrupt:
+                suspicious = suspicious or f"{corrupt} packet(s) flagged as corrupt by the demuxer."
+            expected = info.get("frames") or (
+                round(info["duration"] * info["fps"]) if info.get("fps") else 0
+            )
+            if expected and abs(packets - expected) > max(1, FRAME_COUNT_TOLERANCE * expected):
+                suspicious = suspicious or f"Packet count {packets} does not match the expected {expected} frames."
 
-    print(f"Found {len(video_paths)} video files. Starting advanced validation (spot-checking with seek)...")
+            stream.codec_context.skip_frame = "DEFAULT"
+            duration = info["duration"]
+            checkpoints = [0.0]
+            if duration > 1.0:
+                checkpoints.append(duration / 2.0)
+            if duration > 2.0:
+                checkpoints.append(duration * 0.9)  # 90% mark
+            for seek_time in checkpoints:
+                container.seek(int(seek_time / stream.time_base), stream=stream, backward=True)
+                stream.codec_context.flush_buffers()
+                if next(container.decode(stream), None) is None:
+                    return f"RuntimeError: Failed to read a valid frame after seeking to {seek_time:.2f}s.", None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+    return None, suspicious
+
+
+def validate_single_video_tiered(video_path, tier=DEFAULT_TIER, backend="pyav", quality=False):
+    """
+    Runs the tiers up to `tier` and escalates to a full decode when an earlier
+    tier finds the file suspicious. Returns (video_path, error_message,
+    diagnostics); diagnostics["flagged_tier"] names the tier that rejected it.
+    Quality metrics (`quality`) are only computed when a full decode runs.
+    """
+    diagnostics = {"tier": TIER_PROBE, "flagged_tier": None, "suspicious": None}
+    error, info = probe_video(video_path)
+    if error is None and tier >= TIER_SPOT_CHECK:
+        diagnostics["tier"] = TIER_SPOT_CHECK
+        error, diagnostics["suspicious"] = spot_check_video(video_path, info)
+    if error is not None:
+        diagnostics["flagged_tier"] = diagnostics["tier"]
+        return video_path, error, diagnostics
+    if tier >= TIER_FULL or diagnostics["suspicious"]:
+        diagnostics["tier"] = TIER_FULL
+        _, error, full_diagnostics = validate_single_video(video_path, backend, quality)
+        diagnostics.update(full_diagnostics)
+        if error is not None:
+            diagnostics["flagged_tier"] = TIER_FULL
+    return video_path, error, diagnostics
 
-    problematic_files = {}
 
-    for video_path in tqdm(video_paths, desc="Validating videos"):
-        reader = None
+def _iter_frames_pyav(video_path, quality=False):
+    """
+    Yields (presentation time in s, luma) for every decoded frame. Pixels are
+    only converted, to a downsampled luma plane, when `quality` is set;
+    otherwise luma is None.
+    """
+    if quality:
+        from quality_metrics import pyav_gray
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        for frame in container.decode(stream):
+            yield frame.time, pyav_gray(frame) if quality else None
+
+
+def _iter_frames_torchvision(video_path, quality=False):
+    """
+    Mimics the training loader: decodes through torchvision.io.VideoReader,
+    which converts every frame to a tensor. torch is only imported here.
+    """
+    if quality:
+        from quality_metrics import tensor_gray
+    import torchvision
+    # Set the video backend to be consistent with your training code.
+    torchvision.set_video_backend("pyav")
+    reader = torchvision.io.VideoReader(video_path, "video")
+    try:
+        for frame in reader:
+            yield frame["pts"], tensor_gray(frame["data"]) if quality else None
+    finally:
+        # Explicitly close the container to release resources, matching your code.
+        if hasattr(reader, 'container') and reader.container:
+            try:
+                reader.container.close()
+            except Exception:
+                pass  # Ignore errors on close
+
+
+# Full-decode backends: "pyav" is torch-free; "torchvision" mimics the training loader.
+DECODE_BACKENDS = {"pyav": _iter_frames_pyav, "torchvision": _iter_frames_torchvision}
+DEFAULT_BACKEND = "pyav"
+
+
+def _init_worker(backend):
+    if backend == "torchvision":
         try:
-            # # Check for zero-sized files first, as they are always invalid.
-            # if os.path.getsize(video_path) == 0:
-            #     raise ValueError("File size is 0 bytes.")
-                
-            # # 2. Initialize the VideoReader, just like in your code.
-            # # The 'Cannot allocate memory' error for AV1 happens here.
-            # reader = torchvision.io.VideoReader(video_path, "video")
-            
-            # video_metadata = reader.get_metadata()
-            # duration = video_metadata.get("video", {}).get("duration", [0.0])[0]
-
-            # if duration <= 0:
-            #     # If duration is invalid, just try to read the first frame as a basic check.
-            #     _ = next(reader, None)
-            #     continue
-
-            # # 3. Define checkpoints for spot-checking using seek.
-            # # We check the start, middle, and near the end of the video.
-            # # Timestamps are in seconds.
-            # checkpoints = [0.0]
-            # if duration > 1.0:
-            #      checkpoints.append(duration / 2.0)
-            # if duration > 2.0:
-            #      checkpoints.append(duration * 0.9) # 90% mark
-
-            # for seek_time in checkpoints:
-            #     # 4. Perform the seek operation.
-            #     reader.seek(seek_time)
-                
-            #     # 5. Try to read the next frame after seeking.
-            #     frame_data = next(reader, None)
-                
-            #     # Check if frame reading was successful.
-            #     if frame_data is None or not isinstance(frame_data.get('data'), torch.Tensor):
-            #         raise RuntimeError(f"Failed to read a valid frame after seeking to {seek_time:.2f}s.")
+            import torchvision
             torchvision.set_video_backend("pyav")
-            # set a video stream reader
-            reader = torchvision.io.VideoReader(video_path, "video")
-            loaded_frames = []
-            for frame in reader:
-                current_ts = frame["pts"]
-                loaded_frames.append(frame["data"])
-                
-            reader.container.close()
-            reader = None
-
-        except (av.error.InvalidDataError, RuntimeError, ValueError, TypeError) as e:
-            # This catches corruption errors, seek errors, 0-byte files, etc.
-            error_message = f"{type(e).__name__}: {e}"
-            # No need to print here, tqdm handles newlines well.
-            problematic_files[video_path] = error_message
         except Exception as e:
-            # This will catch other errors, including the 'Cannot allocate memory' one.
-            error_message = f"An unexpected error occurred: {e}"
-            problematic_files[video_path] = error_message
+            print(f"Warning: Could not set torchvision backend to 'pyav'. It might not be available. Error: {e}")
+
+
+def validate_single_video(video_path, backend=DEFAULT_BACKEND, quality=False):
+    """
+    Decodes one video file and returns (video_path, error_message, diagnostics),
+    where error_message is None for a healthy file. Each call owns exactly one
+    container, so it is safe to run from a process pool worker.
+
+    Frames are decoded and dropped immediately: only running counters are kept
+    (frame count, last pts, pts regressions) plus the peak RSS sampled while
+    decoding, so memory stays flat regardless of episode length. With
+    `quality` the same pass also fills diagnostics["quality"] with black /
+    frozen / blur metrics computed on downsampled frames (see quality_metrics).
+    """
+    diagnostics = {"frames": 0, "last_pts": None, "pts_regressions": 0, "peak_rss_mb": current_rss_mb()}
+    accumulator = None
+    if quality:
+        from quality_metrics import QualityAccumulator
+        accumulator = QualityAccumulator()
+    frames = DECODE_BACKENDS[backend](video_path, quality)
+    try:
+        # Container probing and the seek spot-check live in probe_video / spot_check_video.
+        for current_ts, gray in frames:
+            if accumulator is not None:
+                accumulator.update(gray)
+            if current_ts is None or (diagnostics["last_pts"] is not None and current_ts <= diagnostics["last_pts"]):
+                diagnostics["pts_regressions"] += 1
+            else:
+                diagnostics["last_pts"] = current_ts
+            diagnostics["frames"] += 1
+            if diagnostics["frames"] % RSS_SAMPLE_EVERY == 0:
+                diagnostics["peak_rss_mb"] = max(diagnostics["peak_rss_mb"], current_rss_mb())
+
+        if diagnostics["frames"] == 0:
+            raise ValueError("No frame could be decoded.")
+        if diagnostics["pts_regressions"]:
+            raise ValueError(f"PTS is missing or not strictly increasing ({diagnostics['pts_regressions']} frame(s)).")
+        return video_path, None, diagnostics
+
+    except (av.error.InvalidDataError, RuntimeError, ValueError, TypeError) as e:
+        # This catches corruption errors, seek errors, 0-byte files, etc.
+        return video_path, f"{type(e).__name__}: {e}", diagnostics
+    except Exception as e:
+        # This will catch other errors, including the 'Cannot allocate memory' one.
+        return video_path, f"An unexpected error occurred: {e}", diagnostics
+    finally:
+        diagnostics["peak_rss_mb"] = round(max(diagnostics["peak_rss_mb"], current_rss_mb()), 1)
+        if accumulator is not None:
+            diagnostics["quality"] = accumulator.summary()
+        frames.close()
+
+
+def make_worker_pool(workers, backend=DEFAULT_BACKEND):
+    """Process pool whose workers are ready to decode; reuse it across datasets to pay startup once."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend,))
+
+
+def validate_video_files(video_paths, workers=1, tier=DEFAULT_TIER, cache=None, executor=None, backend=DEFAULT_BACKEND,
+                         quality=False):
+    """
+    Validates the given files and returns ({path: error_message} for the
+    problematic ones, {path: diagnostics} for every file). With workers > 1
+    the files are spread across a process pool; progress is reported in a
+    single tqdm bar either way. Files with a valid verdict in `cache` (a
+    ValidationCache) are not decoded again; fresh verdicts are stored in it.
+    A caller-owned `executor` (see make_worker_pool) is reused instead of
+    starting a new pool, so several datasets can share one set of workers.
+    """
+    problematic_files = {}
+    diagnostics = {}
+
+    def record(video_path, error, file_diagnostics):
+        diagnostics[video_path] = file_diagnostics
+        if error is not None:
+            problematic_files[video_path] = error
+        if cache is not None:
+            cache.store(video_path, file_diagnostics["tier"], error, file_diagnostics)
+
+    to_check = []
+    for video_path in video_paths:
+        cached = cache.lookup(video_path, tier) if cache is not None else None
+        if cached is None:
+            to_check.append(video_path)
+        else:
+            error, diagnostics[video_path] = cached
+            diagnostics[video_path]["cached"] = True
+            if error is not None:
+                problematic_files[video_path] = error
+    if cache is not None:
+        print(f"Validation cache: {len(video_paths) - len(to_check)} hit(s), {len(to_check)} file(s) to check.")
+
+    if executor is None and workers <= 1:
+        for video_path in tqdm(to_check, desc="Validating videos"):
+            record(*validate_single_video_tiered(video_path, tier, backend, quality))
+    else:
+        own_executor = executor is None
+        if own_executor:
+            executor = make_worker_pool(workers, backend)
+        desc = f"Validating videos ({workers} workers)" if own_executor else "Validating videos (shared pool)"
+        try:
+            futures = [executor.submit(validate_single_video_tiered, video_path, tier, backend, quality) for video_path in to_check]
+            with tqdm(total=len(futures), desc=desc) as progress:
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # A crashed worker (e.g. killed by the OOM killer) breaks the whole pool.
+                        raise RuntimeError(f"Validation worker failed: {e}") from e
+                    record(*result)
+                    progress.update(1)
         finally:
-            # 6. Explicitly close the container to release resources, matching your code.
-            if reader and hasattr(reader, 'container') and reader.container:
-                try:
-                    reader.container.close()
-                except Exception:
-                    pass  # Ignore errors on close
+            if own_executor:
+                executor.shutdown()
+    if cache is not None:
+        cache.commit()
+    # Keep the report order stable regardless of completion order.
+    return {path: problematic_files[path] for path in video_paths if path in problematic_files}, diagnostics
+
+
+def validate_videos_with_seek(directory, extensions, workers=1, tier=DEFAULT_TIER, report=None, cache=None, executor=None,
+                              backend=DEFAULT_BACKEND, quality=False):
+    """
+    Validates video files by mimicking a seek-and-read pattern, which is more
+    robust for finding corruption related to non-sequential access.
+    `tier` selects how deep every file is checked (see TIER_*); if `report`
+    is a dict it is filled with {path: {"error", "flagged_tier", ...}} for
+    every validated file (error is None for healthy ones).
+    `cache` is an optional ValidationCache used to skip unchanged files and
+    `executor` an optional shared worker pool. `backend` picks the full-decode
+    backend (see DECODE_BACKENDS); `quality` adds per-file quality metrics to
+    the report.
+    """
+    _init_worker(backend)
+
+    print(f"Scanning for video files in: {directory}")
+    print(f"Looking for extensions: {', '.join(extensions)}")
+
+    video_paths = sorted(find_video_files(directory, extensions))
+
+    if not video_paths:
+        print("No video files found. Exiting.")
+        return set()
+
+    print(f"Found {len(video_paths)} video files. Starting advanced validation (spot-checking with seek)...")
+
+    problematic_files, diagnostics = validate_video_files(
+        video_paths, workers=workers, tier=tier, cache=cache, executor=executor, backend=backend, quality=quality
+    )
+    if report is not None:
+        for path in video_paths:
+            report[path] = dict(diagnostics[path], error=problematic_files.get(path))
+    escalated = sum(1 for d in diagnostics.values() if d.get("suspicious") and d["tier"] == TIER_FULL)
+    if tier < TIER_FULL:
+        print(f"{escalated} suspicious file(s) were escalated to a full decode.")
 
     print("\n" + "="*50)
     print("Advanced Validation Complete.")
     print("="*50)
+    decoded = {p: d for p, d in diagnostics.items() if "peak_rss_mb" in d}
+    if decoded:
+        worst_path = max(decoded, key=lambda p: decoded[p]["peak_rss_mb"])
+        print(f"Peak RSS while decoding: {decoded[worst_path]['peak_rss_mb']:.1f} MiB ({worst_path})")
     error_ids = []
     if not problematic_files:
         print(f"\nSuccess! All {len(video_paths)} videos passed the spot-checking validation.")
@@ -115,11 +399,138 @@ def validate_videos_with_seek(directory, extensions):
         
         for i, (path, error) in enumerate(problematic_files.items()):
             print(f"  {i+1}. File: {path}")
-            print(f"     Error: {error}\n")
+            print(f"     Error (tier {diagnostics[path]['flagged_tier']}): {error}")
+            if "frames" in diagnostics[path]:
+                print(f"     Decoded frames: {diagnostics[path]['frames']}, peak RSS: {diagnostics[path]['peak_rss_mb']:.1f} MiB")
+            print()
             error_id = path.split("/")[-1].split(".")[0].split("_")[-1]
             assert error_id.isdigit(), f"Error ID should be a number, but got: {error_id}"
             error_ids.append(error_id) 
     return set(error_ids)
+
+
+def episode_id_from_path(path):
+    """'.../observation.images.front/episode_000012.mp4' -> '000012'."""
+    return os.path.basename(path).split(".")[0].split("_")[-1]
+
+
+def write_quality_sidecar(data_directory, diagnostics, quality_thresholds):
+    """
+    Writes one JSON line per episode with the quality metrics of each camera
+    (plus the threshold violations, if any) and returns the ids of the
+    episodes that violate `quality_thresholds`.
+    """
+    from quality_metrics import flag_quality
+
+    episodes = {}
+    for path, file_diagnostics in sorted(diagnostics.items()):
+        summary = file_diagnostics.get("quality")
+        if summary is None:
+            continue
+        camera = os.path.basename(os.path.dirname(path))
+        record = episodes.setdefault(episode_id_from_path(path), {"cameras": {}, "flags": {}})
+        record["cameras"][camera] = summary
+        reasons = flag_quality(summary, quality_thresholds)
+        if reasons:
+            record["flags"][camera] = reasons
+
+    with open(os.path.join(data_directory, QUALITY_METRICS_FILE), "w") as f:
+        for episode_id, record in sorted(episodes.items()):
+            f.write(json.dumps({"episode_index": int(episode_id), **record}) + "\n")
+
+    flagged_ids = {episode_id for episode_id, record in episodes.items() if record["flags"]}
+    for episode_id in sorted(flagged_ids):
+        for camera, reasons in episodes[episode_id]["flags"].items():
+            print(f"Low quality episode {episode_id} ({camera}): {'; '.join(reasons)}")
+    return flagged_ids
+
+
+def merge_low_quality_ids(low_quality_path, error_ids):
+    """Merges error ids into low_quality.txt: one id per line without leading zeros, existing ids kept, no duplicates."""
+    existing_ids = set()
+    if os.path.exists(low_quality_path):
+        with open(low_quality_path, "r") as f:
+            existing_ids = {int(line.strip()) for line in f if line.strip()}
+    with open(low_quality_path, "w") as f:
+        for error_id in sorted(existing_ids | {int(error_id) for error_id in error_ids}):
+            f.write(str(error_id) + "\n")
+
+
+def validate_dataset(
+    data_directory,
+    extensions=DEFAULT_EXTENSIONS,
+    workers=1,
+    tier=DEFAULT_TIER,
+    cache_path=DEFAULT_CACHE_PATH,
+    use_cache=True,
+    cache_hash=False,
+    cache_clear=False,
+    executor=None,
+    write_outputs=True,
+    backend=DEFAULT_BACKEND,
+    quality=False,
+    quality_thresholds=None,
+):
+    """
+    Importable entry point: validates every video under
+    <data_directory>/videos (all chunk-NNN directories) and returns (error_ids, diagnostics),
+    where error_ids is a set of zero-padded episode ids and diagnostics maps
+    each file to its per-file diagnostics (including "error"). With
+    write_outputs the ids are merged into low_quality.txt and the
+    problematic files are written to video_validation_report.json, exactly
+    like the command line.
+
+    With `quality` (implied by any `quality_thresholds`, see
+    quality_metrics.QUALITY_THRESHOLDS) every file is fully decoded and the
+    per-camera black / frozen / blur metrics are written to
+    video_quality_metrics.jsonl; episodes violating a threshold are added to
+    the returned ids and to low_quality.txt.
+    """
+    data_directory = str(data_directory)
+    normalized_extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in extensions]
+    video_root = os.path.join(data_directory, "videos")
+    if not os.path.exists(video_root):
+        raise FileNotFoundError(video_root)
+
+    quality_thresholds = {k: v for k, v in (quality_thresholds or {}).items() if v is not None}
+    quality = quality or bool(quality_thresholds)
+    if quality and tier < TIER_FULL:
+        print("Quality metrics need every frame: validating at tier 2.")
+        tier = TIER_FULL
+
+    cache = None
+    if use_cache:
+        # Verdicts from different decode backends are cached separately, and
+        # verdicts without quality metrics cannot serve a quality run.
+        version = f"{VALIDATOR_VERSION}/{backend}" + ("+quality" if quality else "")
+        cache = ValidationCache(cache_path, validator_version=version, use_fingerprint=cache_hash)
+        if cache_clear:
+            print(f"Dropped {cache.invalidate(data_directory)} cached verdict(s) for {data_directory}.")
+    diagnostics = {}
+    try:
+        # Validate every camera directory in one pass so the worker pool is shared across cameras.
+        error_ids = validate_videos_with_seek(
+            video_root, normalized_extensions,
+            workers=workers, tier=tier, report=diagnostics, cache=cache, executor=executor, backend=backend,
+            quality=quality,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if quality and write_outputs:
+        # Thresholds are applied to the stored metrics, so changing them never requires a re-decode.
+        error_ids |= write_quality_sidecar(data_directory, diagnostics, quality_thresholds)
+
+    if write_outputs:
+        # Record which tier flagged each file next to low_quality.txt.
+        problematic = {path: d for path, d in diagnostics.items() if d["error"] is not None}
+        with open(os.path.join(data_directory, "video_validation_report.json"), "w") as f:
+            json.dump({"tier": tier, "problematic_files": problematic}, f, indent=2)
+        merge_low_quality_ids(os.path.join(data_directory, "low_quality.txt"), error_ids)
+    return error_ids, diagnostics
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Validate video files by spot-checking with seek operations to mimic training loaders.",
@@ -127,29 +538,56 @@ if __name__ == "__main__":
     )
     # ... (argparse part is the same as before) ...
     parser.add_argument("data_directory", type=str, help="The root directory containing your video files.")
-    parser.add_argument("--extensions", nargs='+', default=['.mp4', '.avi', '.mov', '.mkv', '.webm'], help="List of video file extensions.")
+    parser.add_argument("--extensions", nargs='+', default=DEFAULT_EXTENSIONS, help="List of video file extensions.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes used to decode videos in parallel (default: 1).")
+    parser.add_argument(
+        "--tier", type=int, choices=[TIER_PROBE, TIER_SPOT_CHECK, TIER_FULL], default=DEFAULT_TIER,
+        help=(
+            "Validation depth applied to every file (default: %(default)s):\n"
+            "  0 = container probe (moov atom, stream, duration, size)\n"
+            "  1 = probe + keyframe decode + seeks at start/middle/90%%\n"
+            "  2 = full decode of every frame\n"
+            "Files that look suspicious at tier 0/1 are always escalated to a full decode."
+        ),
+    )
+    parser.add_argument(
+        "--backend", choices=sorted(DECODE_BACKENDS), default=DEFAULT_BACKEND,
+        help="Full-decode backend (default: %(default)s). 'pyav' never imports torch;\n'torchvision' mimics the training loader (VideoReader + tensors).",
+    )
+    parser.add_argument("--cache", type=str, default=str(DEFAULT_CACHE_PATH), help="Path of the validation verdict cache (default: %(default)s).")
+    parser.add_argument("--no_cache", action="store_true", help="Decode every file, ignoring and not updating the cache.")
+    parser.add_argument("--cache_hash", action="store_true", help="Also key cached verdicts on a hash of the first/last 64 KiB of each file.")
+    parser.add_argument("--cache_clear", action="store_true", help="Drop cached verdicts for this dataset before validating.")
+    parser.add_argument(
+        "--quality_metrics", action="store_true",
+        help="Compute black/frozen/blur metrics during the full decode and write them to\n"
+             f"{QUALITY_METRICS_FILE}. Implied by any of the thresholds below.",
+    )
+    parser.add_argument("--min_mean_luma", type=float, default=None, help="Flag episodes whose mean luma (0-255) is below this.")
+    parser.add_argument("--max_black_fraction", type=float, default=None, help="Flag episodes with a larger fraction of black frames.")
+    parser.add_argument("--max_frozen_fraction", type=float, default=None, help="Flag episodes with a larger fraction of frozen (unchanged) frames.")
+    parser.add_argument("--min_sharpness", type=float, default=None, help="Flag episodes whose median Laplacian variance is below this (blur).")
     args = parser.parse_args()
-    normalized_extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in args.extensions]
-    
 
-    # 检查args.data_directory + "videos"下面有chunk-000
-    assert os.path.exists(args.data_directory + "/videos/chunk-000/"), args.data_directory + "videos/chunk-000/"
-    
-    video_dirs = os.listdir(args.data_directory + "/videos/chunk-000/")
+    # 检查args.data_directory下面有videos（其中的 chunk-NNN 目录都会被校验）
+    assert os.path.exists(os.path.join(args.data_directory, "videos")), os.path.join(args.data_directory, "videos")
 
-    all_error_ids = set([])
-    for video_dir in video_dirs:
-        
-        error_ids = validate_videos_with_seek(args.data_directory + "/videos/chunk-000/" +video_dir, normalized_extensions)
-        all_error_ids  = all_error_ids | error_ids
+    all_error_ids, _ = validate_dataset(
+        args.data_directory,
+        extensions=args.extensions,
+        workers=args.workers,
+        tier=args.tier,
+        cache_path=args.cache,
+        use_cache=not args.no_cache,
+        cache_hash=args.cache_hash,
+        cache_clear=args.cache_clear,
+        backend=args.backend,
+        quality=args.quality_metrics,
+        quality_thresholds={
+            "min_mean_luma": args.min_mean_luma,
+            "max_black_fraction": args.max_black_fraction,
+            "max_frozen_fraction": args.max_frozen_fraction,
+            "min_sharpness": args.min_sharpness,
+        },
+    )
     print(f"All error ids: {all_error_ids}")
-    # 将all_error_ids写入到args.data_directory + "low_quality.txt",每个id一行，去除前导0，如果txt文件已存在则追加
-    if not os.path.exists(args.data_directory + "/low_quality.txt"):
-        with open(args.data_directory + "/low_quality.txt", "w") as f:
-            pass
-    with open(args.data_directory + "/low_quality.txt", "a+") as f:
-        for error_id in all_error_ids:
-            f.write(str(int(error_id)) + "\n")
-
-       
-    
\ No newline at end of file
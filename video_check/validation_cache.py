@@ -0,0 +1,116 @@
+import os
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "lerobot_video_validation.sqlite"
+# Bytes hashed from each end of the file when fingerprinting is enabled.
+FINGERPRINT_BYTES = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    fingerprint TEXT,
+    validator_version TEXT NOT NULL,
+    tier INTEGER NOT NULL,
+    error TEXT,
+    diagnostics TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def file_fingerprint(path, num_bytes=FINGERPRINT_BYTES):
+    """Fast content fingerprint: blake2b over the first and last `num_bytes` bytes plus the size."""
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(num_bytes))
+        if size > num_bytes:
+            f.seek(max(num_bytes, size - num_bytes))
+            digest.update(f.read(num_bytes))
+    return digest.hexdigest()
+
+
+class ValidationCache:
+    """
+    Persistent store of video validation verdicts keyed by (path, size, mtime)
+    and, optionally, a head/tail content fingerprint. An entry is only reused
+    when it was produced by the same validator version and at least as deep a
+    tier as requested, so changing the validation logic re-triggers checks.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, validator_version="", use_fingerprint=False):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.validator_version = validator_version
+        self.use_fingerprint = use_fingerprint
+        # Several pipelines may share one cache file; wait for the write lock instead of failing.
+        self.conn = sqlite3.connect(str(self.db_path), timeout=60)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _key(self, path):
+        st = os.stat(path)
+        fingerprint = file_fingerprint(path) if self.use_fingerprint else None
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns, fingerprint
+
+    def lookup(self, path, tier):
+        """Returns (error_message, diagnostics) for a valid cached verdict, or None on a miss."""
+        try:
+            abs_path, size, mtime_ns, fingerprint = self._key(path)
+        except OSError:
+            return None
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, fingerprint, validator_version, tier, error, diagnostics FROM verdicts WHERE path = ?",
+            (abs_path,),
+        ).fetchone()
+        if row is None:
+            return None
+        cached_size, cached_mtime, cached_fingerprint, version, cached_tier, error, diagnostics = row
+        if (cached_size, cached_mtime) != (size, mtime_ns) or version != self.validator_version:
+            return None
+        if self.use_fingerprint and cached_fingerprint != fingerprint:
+            return None
+        # A failure found at a shallow tier stands; a pass only counts if the check was deep enough.
+        if error is None and cached_tier < tier:
+            return None
+        return error, json.loads(diagnostics)
+
+    def store(self, path, tier, error, diagnostics):
+        try:
+            abs_path, size, mtime_ns, fingerprint = self._key(path)
+        except OSError:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (abs_path, size, mtime_ns, fingerprint, self.validator_version, tier, error,
+             json.dumps(diagnostics), time.time()),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def invalidate(self, prefix=None):
+        """Drops every verdict, or only those for files under `prefix`. Returns the number removed."""
+        if prefix is None:
+            cursor = self.conn.execute("DELETE FROM verdicts")
+        else:
+            prefix = os.path.abspath(prefix).rstrip("/") + "/"
+            cursor = self.conn.execute(
+                "DELETE FROM verdicts WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            )
+        self.conn.commit()
+        return cursor.rowcount
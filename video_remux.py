@@ -0,0 +1,134 @@
+# video_remux.py
+
+from fractions import Fraction
+from pathlib import Path
+
+
+def _add_stream_like(container, stream):
+    """在输出容器中新建一个与 stream 编码参数相同的流（只复制码流，不重新编码）。"""
+    if hasattr(container, "add_stream_from_template"):
+        return container.add_stream_from_template(stream)
+    return container.add_stream(template=stream)
+
+
+def _stream_params(stream):
+    codec = stream.codec_context
+    return codec.name, codec.width, codec.height, Fraction(stream.time_base)
+
+
+def _iter_packets(container, stream):
+    # demux 结束时会产生 size 为 0 的 flush packet，需要跳过
+    for packet in container.demux(stream):
+        if packet.size and packet.pts is not None:
+            if packet.dts is None:
+                packet.dts = packet.pts
+            yield packet
+
+
+def concat_videos(src_paths, dst_path: Path):
+    """
+    不重新编码，把多个视频的第一个视频流首尾相接 remux 成一个 mp4。
+    所有输入必须有相同的编码器、分辨率和 time_base（同一次录制/编码得到的视频都满足）。
+    每个输入的 pts/dts 整体平移 pts_shift，保证输出的 dts 单调递增、pts 区间互不重叠。
+    返回每个输入的 {"pts_start", "pts_end", "pts_shift", "time_base"}，pts 以该 time_base 为单位，区间左闭右开。
+    """
+    import av
+
+    src_paths = [Path(p) for p in src_paths]
+    if not src_paths:
+        raise ValueError("concat_videos: 没有输入文件")
+    dst_path = Path(dst_path)
+    tmp_path = dst_path.with_name(f".{dst_path.name}.tmp")
+    segments = []
+    try:
+        with av.open(str(tmp_path), "w", format="mp4") as out:
+            out_stream, reference = None, None
+            prev_end_pts, prev_last_dts = None, None
+            for src_path in src_paths:
+                with av.open(str(src_path)) as inp:
+                    stream = inp.streams.video[0]
+                    params = _stream_params(stream)
+                    if out_stream is None:
+                        out_stream, reference = _add_stream_like(out, stream), params
+                    elif params != reference:
+                        raise ValueError(f"{src_path} 的编码参数 {params} 与第一个视频 {reference} 不一致，无法直接拼接")
+
+                    shift, start, end = None, None, None
+                    for packet in _iter_packets(inp, stream):
+                        if shift is None:
+                            # 解码顺序上的第一个包是关键帧，pts 最小、dts 最小
+                            shift = 0 if prev_end_pts is None else max(
+                                prev_end_pts - packet.pts, prev_last_dts + 1 - packet.dts
+                            )
+                        packet.pts += shift
+                        packet.dts += shift
+                        start = packet.pts if start is None else min(start, packet.pts)
+                        end = max(end or 0, packet.pts + (packet.duration or 1))
+                        prev_last_dts = packet.dts
+                        packet.stream = out_stream
+                        out.mux(packet)
+                if shift is None:
+                    raise ValueError(f"{src_path} 中没有任何视频帧")
+                prev_end_pts = end
+                segments.append({
+                    "pts_start": int(start), "pts_end": int(end), "pts_shift": int(shift), "time_base": str(reference[3]),
+                })
+        tmp_path.replace(dst_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return segments
+
+
+def split_video(src_path: Path, segments):
+    """
+    concat_videos 的逆操作：顺序 demux 一遍 src_path，按 pts 区间把包分发到各自的 mp4，
+    并减去 pts_shift 还原原始时间戳。同一时刻只打开一个输出文件。
+    segments: [(dst_path, pts_start, pts_end, pts_shift, time_base)]，按 pts_start 升序。
+    """
+    import av
+
+    segments = sorted(segments, key=lambda s: s[1])
+    written = [0] * len(segments)
+    out, out_stream, current = None, None, 0
+
+    def close_current():
+        nonlocal out, out_stream
+        if out is not None:
+            out.close()
+        out, out_stream = None, None
+
+    try:
+        with av.open(str(src_path)) as inp:
+            stream = inp.streams.video[0]
+            file_tb = Fraction(stream.time_base)
+            for packet in _iter_packets(inp, stream):
+                while current < len(segments):
+                    time_base = Fraction(segments[current][4])
+                    pts = packet.pts if time_base == file_tb else round(packet.pts * file_tb / time_base)
+                    if pts < segments[current][2]:
+                        break
+                    close_current()
+                    current += 1
+                if current >= len(segments):
+                    break
+                dst_path, pts_start, _, pts_shift, _ = segments[current]
+                if pts < pts_start:
+                    continue
+                if out is None:
+                    Path(dst_path).parent.mkdir(parents=True, exist_ok=True)
+                    out = av.open(str(dst_path), "w", format="mp4")
+                    out_stream = _add_stream_like(out, stream)
+                if time_base != file_tb:
+                    packet.dts = round(packet.dts * file_tb / time_base)
+                    packet.time_base = time_base
+                packet.pts = pts - pts_shift
+                packet.dts -= pts_shift
+                packet.stream = out_stream
+                out.mux(packet)
+                written[current] += 1
+    finally:
+        close_current()
+    missing = [str(segments[i][0]) for i, n in enumerate(written) if n == 0]
+    if missing:
+        raise ValueError(f"{src_path} 中找不到以下视频片段的数据: {', '.join(missing)}")
@@ -0,0 +1,86 @@
+# virtual_dataset.py
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from lerobot_layout import DatasetLayout
+from parquet_utils import remap_column
+
+# 虚拟合并数据集（见 merge/dataset_manager.py 的 virtual_merge_datasets）：meta/ 是合并后的元数据，
+# data/ 和 videos/ 是指向源文件的符号链接，info.json 中带 "virtual": true。
+# 视频可以直接使用；parquet 中的 episode_index / index / task_index 仍是源数据集的值，
+# 必须通过 read_virtual_episode 读取，或先物化（materialize）为真实文件。
+VIRTUAL_MANIFEST_FILE = "virtual_manifest.jsonl"  # 位于 meta/ 下
+
+
+def is_virtual_dataset(dataset_dir) -> bool:
+    info_path = Path(dataset_dir) / "meta" / "info.json"
+    return info_path.exists() and bool(json.loads(info_path.read_text()).get("virtual"))
+
+
+def load_virtual_manifest(dataset_dir):
+    """
+    读取 meta/virtual_manifest.jsonl，返回 {全局 episode_index: 清单记录}。
+    每条记录包含 root、src_episode_index、frame_offset、data（源 parquet）、videos（{video_key: 源视频}），
+    以及 task_index（整个 episode 的全局任务编号）或 task_index_map（{源 task_index: 全局 task_index}）之一。
+    """
+    manifest = {}
+    with open(Path(dataset_dir) / "meta" / VIRTUAL_MANIFEST_FILE, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if "task_index_map" in entry:
+                    # JSON 的键只能是字符串
+                    entry["task_index_map"] = {int(k): v for k, v in entry["task_index_map"].items()}
+                manifest[entry["episode_index"]] = entry
+    return manifest
+
+
+def task_remap_for_entry(entry):
+    """把清单记录中的任务编号转换为合并时 reindex_parquet 使用的 {"episodes", "local"} 形式。"""
+    if entry.get("task_index") is not None:
+        return {"episodes": {entry["src_episode_index"]: entry["task_index"]}, "local": {}}
+    return {"episodes": {}, "local": entry.get("task_index_map", {})}
+
+
+def rewrite_episode_table(table: pa.Table, entry) -> pa.Table:
+    """在内存中把源 episode 的 episode_index / index / task_index 改写为合并后的值（不写盘，全部向量化）。"""
+    def replace(name, make_column):
+        nonlocal table
+        idx = table.schema.get_field_index(name)
+        if idx >= 0:
+            field = table.schema.field(idx)
+            table = table.set_column(idx, field, make_column(table.column(idx)).cast(field.type))
+
+    def constant(value):
+        return lambda column: pa.array(np.full(len(column), value), type=column.type)
+
+    replace("episode_index", constant(entry["episode_index"]))
+    if entry["frame_offset"]:
+        replace("index", lambda column: pc.add(column, pa.scalar(entry["frame_offset"], type=column.type)))
+    if entry.get("task_index") is not None:
+        replace("task_index", constant(entry["task_index"]))
+    else:
+        replace("task_index", lambda column: remap_column(column, entry.get("task_index_map", {})))
+    return table
+
+
+def read_virtual_episode(dataset_dir, episode_index: int, columns=None, manifest=None) -> pa.Table:
+    """
+    读取虚拟合并数据集中一个 episode 的数据，索引列已改写为合并后的值。
+    多次读取时可传入 load_virtual_manifest 的结果，避免重复解析清单。
+    """
+    if manifest is None:
+        manifest = load_virtual_manifest(dataset_dir)
+    entry = manifest[episode_index]
+    return rewrite_episode_table(pq.read_table(entry["data"], columns=columns), entry)
+
+
+def virtual_video_path(dataset_dir, episode_index: int, video_key: str) -> Path:
+    """虚拟数据集中视频的路径（指向源视频的符号链接，可直接解码）。"""
+    return DatasetLayout.from_info(dataset_dir).video_file(episode_index, video_key)